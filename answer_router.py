@@ -0,0 +1,145 @@
+# answer_router.py - 질문마다 추출형(템플릿) 답변과 LLM 생성 중 하나를 선택
+import logging
+import re
+import threading
+
+from context_assembler import count_tokens
+from conversation_memory import topic_terms
+
+logger = logging.getLogger(__name__)
+
+# 단순 계정/접속 정보 조회 질문
+LOOKUP_KEYWORDS = ['비밀번호', '비번', '패스워드', 'password', 'pw', '아이디', 'id', '계정', 'account',
+                   '로그인', 'login', 'ip', '주소', '와이파이', 'wifi', '정보']
+# 설명/문제 해결이 필요한 질문 (LLM이 필요)
+EXPLAIN_KEYWORDS = ['어떻게', '왜', '방법', '설명', '안 되', '안되', '안 돼', '안돼', '문제', '오류', '에러',
+                    '차이', '비교', 'how', 'why', 'explain', 'difference']
+# 계정 레코드 경계: 번호 붙은 섹션 제목 앞, 비밀번호 값 뒤 ("ID: a PW: b 다음서비스 ..."), "메일 / 비번" 값 뒤
+SECTION_START = re.compile(r"(?:^|(?<=\s))(?=\d{1,2}\.\s*[^\d\s.])")
+RECORD_END = re.compile(r"(?i)(?:\b(?:pw|password|비번|비밀번호)\)?\s*[:：]|\s/)\s*\S+")
+# 한 번에 추출형으로 답할 최대 레코드 수 (더 많이 걸리면 LLM이 고르도록)
+MAX_RECORDS = 3
+
+# 1K 토큰당 (입력, 출력) 달러 가격 (비용 추정용)
+PRICING = {
+    'gemini-1.5-flash': (0.000075, 0.0003),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+}
+
+
+def classify_intent(query):
+    """질문 의도 분류: lookup(정보 조회) / explain(설명 필요) / general"""
+    q = query.lower()
+    if any(word in q for word in EXPLAIN_KEYWORDS):
+        return 'explain'
+    if any(re.search(rf"(?<![a-z]){re.escape(word)}(?![a-z])", q) for word in LOOKUP_KEYWORDS):
+        return 'lookup'
+    return 'general'
+
+
+def split_records(text):
+    """청크를 계정 레코드 단위로 분할
+
+    app.py 청크는 줄바꿈이 공백으로 바뀌어 있으므로 줄 대신
+    섹션 제목 앞과 비밀번호 값 뒤를 경계로 나눔
+    """
+    text = ' '.join(line.strip() for line in text.split('\n') if line.strip())
+    cuts = {0, len(text)}
+    cuts.update(match.start() for match in SECTION_START.finditer(text))
+    cuts.update(match.end() for match in RECORD_END.finditer(text))
+    bounds = sorted(cuts)
+    return [text[start:end].strip() for start, end in zip(bounds, bounds[1:]) if text[start:end].strip()]
+
+
+def extractive_answer(query, context_docs):
+    """검색된 청크에서 질문 주제가 들어 있는 계정 레코드만 뽑아 템플릿 답변 구성
+
+    주제어가 없거나 맞는 레코드가 없거나 너무 많으면 None (호출하는 쪽에서 LLM으로 답변)
+    """
+    if not context_docs:
+        return None
+    terms = topic_terms(query)
+    if not terms:
+        return None
+    records = split_records(context_docs[0])
+    picked = [record for record in records if any(term in record.lower() for term in terms)]
+    if not picked or len(picked) > MAX_RECORDS:
+        return None
+    body = '\n'.join(picked)
+
+    return f"""📋 **요청하신 정보**
+
+{body}"""
+
+
+class RouteDecision:
+    def __init__(self, path, intent, reason):
+        self.path = path        # 'extractive' 또는 'llm'
+        self.intent = intent
+        self.reason = reason
+
+
+class AnswerRouter:
+    """검색 신뢰도와 질문 의도로 답변 경로 결정
+
+    - min_score: 조회 질문에서 추출형으로 답할 최소 1위 점수
+    - confident_score / min_margin: 일반 질문도 이 이상으로 확실하면 추출형
+    """
+
+    def __init__(self, min_score=0.45, confident_score=0.65, min_margin=0.05):
+        self.min_score = min_score
+        self.confident_score = confident_score
+        self.min_margin = min_margin
+
+    def decide(self, query, scores):
+        intent = classify_intent(query)
+        top = scores[0] if scores else 0.0
+        margin = top - scores[1] if len(scores) > 1 else top
+
+        if not scores:
+            decision = RouteDecision('llm', intent, 'no retrieval results')
+        elif intent == 'explain':
+            decision = RouteDecision('llm', intent, 'query needs explanation')
+        elif intent == 'lookup' and top >= self.min_score:
+            decision = RouteDecision('extractive', intent, f'lookup with score {top:.2f}')
+        elif top >= self.confident_score and margin >= self.min_margin:
+            decision = RouteDecision('extractive', intent, f'confident match {top:.2f} (margin {margin:.2f})')
+        else:
+            decision = RouteDecision('llm', intent, f'low confidence {top:.2f}')
+
+        logger.info("answer route=%s intent=%s reason=%s query=%r", decision.path, intent, decision.reason, query)
+        return decision
+
+
+def estimate_cost(model, prompt, completion):
+    """LLM 호출 비용 추정 (달러)"""
+    input_price, output_price = PRICING.get(model, (0.0, 0.0))
+    return count_tokens(prompt) / 1000 * input_price + count_tokens(completion) / 1000 * output_price
+
+
+class RouterStats:
+    """경로별 지연 시간과 비용 분포"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = {'extractive': [], 'llm': []}
+
+    def record(self, path, latency, cost=0.0):
+        with self._lock:
+            self.records[path].append((latency, cost))
+
+    def summary(self):
+        with self._lock:
+            result = {}
+            for path, records in self.records.items():
+                latencies = sorted(latency for latency, _ in records)
+                costs = [cost for _, cost in records]
+                n = len(records)
+                result[path] = {
+                    'count': n,
+                    'latency_p50': latencies[n // 2] if n else 0.0,
+                    'latency_p95': latencies[min(n - 1, int(n * 0.95))] if n else 0.0,
+                    'total_cost': sum(costs),
+                    'avg_cost': sum(costs) / n if n else 0.0,
+                }
+            return result
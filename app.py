@@ -1,15 +1,29 @@
 import streamlit as st
-import google.generativeai as genai
 import PyPDF2
 from docx import Document
 import io
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 import requests
 import tempfile
 import os
+import time
+from reranker import CrossEncoderReranker
+from relevance_cutoff import calibrate_threshold, ContextSizeStats
+from semantic_cache import SemanticAnswerCache, corpus_fingerprint
+from response_cache import get_response_cache
+from answer_router import AnswerRouter, RouteDecision, RouterStats, extractive_answer, estimate_cost
+from sharded_retriever import ShardedRetriever
+from rag_pipeline import build_prompt, faq_answer_fn, generate_response, generate_response_stream
+import rag_pipeline
+from faq_precompute import FAQTable, load_questions
+from conversation_memory import ConversationMemory
+from mmap_embeddings import EmbeddingStore, embedding_cache_path, load_or_build
+from encrypted_store import get_sealer
+from chunk_table import ChunkTable, ChunkTableBuilder
+from index_bundle import BundleError, export_bundle, export_delta, load_bundles, model_fingerprint
+from ingest_jobs import JobRunner, FINISHED, DONE, FAILED, CANCELLED, describe, fraction
 
 # 페이지 설정
 st.set_page_config(
@@ -242,53 +256,74 @@ st.markdown("**Enterprise Document Intelligence Platform**")
 st.markdown("---")
 
 # 세션 상태 초기화
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
+# 대화 기록 (최근 메시지만 보관하고 오래된 대화는 요약으로 압축)
+if 'memory' not in st.session_state:
+    st.session_state.memory = ConversationMemory()
 
+# 청크는 열 저장소(ChunkTable)로 보관: 파일명 코드 + 본문 바이트 버퍼 + 오프셋
 if 'documents' not in st.session_state:
-    st.session_state.documents = []
+    st.session_state.documents = ChunkTable.empty(get_sealer())
 
 if 'embeddings' not in st.session_state:
     st.session_state.embeddings = None
 
+# 공유 기본 문서와 그 임베딩 (업로드 문서는 이 위에 오버레이로 추가)
+if 'base_documents' not in st.session_state:
+    st.session_state.base_documents = ChunkTable.empty(get_sealer())
+    st.session_state.base_embeddings = None
+
 if 'encoder' not in st.session_state:
     st.session_state.encoder = None
 
 if 'default_loaded' not in st.session_state:
     st.session_state.default_loaded = False
 
+# 시작할 때 불러온 인덱스 번들 버전 (이 번들 대비 변경분 번들을 내보낼 수 있음)
+if 'index_bundle_version' not in st.session_state:
+    st.session_state.index_bundle_version = None
+
+if 'metadata_index' not in st.session_state:
+    st.session_state.metadata_index = None
+
+if 'chunk_hashes' not in st.session_state:
+    st.session_state.chunk_hashes = frozenset()
+
+if 'corpus_version' not in st.session_state:
+    st.session_state.corpus_version = None
+
+if 'relevance_threshold' not in st.session_state:
+    st.session_state.relevance_threshold = 0.1
+
+if 'context_stats' not in st.session_state:
+    st.session_state.context_stats = ContextSizeStats()
+
 # 문서 처리 함수들
+# 백그라운드 작업에서도 호출되므로 st.* 대신 예외로 오류 전달
 def extract_text_from_pdf(file):
     """PDF에서 텍스트 추출"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        st.error(f"PDF reading error: {e}")
-        return ""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return text
 
 def extract_text_from_docx(file):
     """DOCX에서 텍스트 추출"""
-    try:
-        doc = Document(io.BytesIO(file.read()))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        st.error(f"DOCX reading error: {e}")
-        return ""
+    doc = Document(io.BytesIO(file.read()))
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text
 
 def extract_text_from_txt(file):
     """TXT에서 텍스트 추출"""
-    try:
-        return file.read().decode('utf-8')
-    except Exception as e:
-        st.error(f"TXT reading error: {e}")
-        return ""
+    return file.read().decode('utf-8')
+
+TEXT_EXTRACTORS = {
+    "application/pdf": extract_text_from_pdf,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": extract_text_from_docx,
+    "text/plain": extract_text_from_txt,
+}
 
 def split_text_into_chunks(text, chunk_size=500):
     """텍스트를 청크로 분할"""
@@ -320,40 +355,58 @@ def split_text_into_chunks(text, chunk_size=500):
     
     return [chunk for chunk in chunks if len(chunk.strip()) > 50]
 
-def process_documents(files):
-    """업로드된 문서들 처리"""
-    documents = []
+class UploadedBytes(io.BytesIO):
+    """백그라운드 작업용 업로드 파일 사본 (스크립트 재실행과 무관하게 유지)"""
+    def __init__(self, file):
+        super().__init__(file.getvalue())
+        self.name = file.name
+        self.type = file.type
+
+def process_documents(files, job):
+    """업로드된 문서들을 ChunkTable로 처리 (파일마다 진행 상황 기록, 경고는 작업에 남김)"""
+    builder = ChunkTableBuilder(get_sealer())
     
-    for file in files:
+    for parsed, file in enumerate(files, start=1):
+        job.check_cancelled()
         try:
-            if file.type == "application/pdf":
-                text = extract_text_from_pdf(file)
-            elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                text = extract_text_from_docx(file)
-            elif file.type == "text/plain":
-                text = extract_text_from_txt(file)
-            else:
-                st.warning(f"Unsupported file format: {file.name}")
+            extract = TEXT_EXTRACTORS.get(file.type)
+            if extract is None:
+                job.warn(f"Unsupported file format: {file.name}")
                 continue
+            text = extract(file)
             
             if not text.strip():
-                st.warning(f"No text extracted from: {file.name}")
+                job.warn(f"No text extracted from: {file.name}")
                 continue
             
-            chunks = split_text_into_chunks(text, chunk_size=500)
-            
-            for i, chunk in enumerate(chunks):
-                documents.append({
-                    'id': f"{file.name}_{i}",
-                    'text': chunk,
-                    'filename': file.name,
-                    'chunk_id': i
-                })
+            builder.add_file(file.name, split_text_into_chunks(text, chunk_size=500))
         
         except Exception as e:
-            st.error(f"Error processing {file.name}: {e}")
+            job.warn(f"Error processing {file.name}: {e}")
+        finally:
+            job.progress(files_parsed=parsed, chunks_total=len(builder))
     
-    return documents
+    return builder.build()
+
+def ingest_uploads(job, files, encoder, batch_size=64):
+    """백그라운드 작업: 파싱 → 배치 단위 임베딩 (배치마다 진행 상황 기록, 취소 확인)"""
+    documents = process_documents(files, job)
+    vectors = []
+    for start in range(0, len(documents), batch_size):
+        job.check_cancelled()
+        batch = [documents.text(i) for i in range(start, min(start + batch_size, len(documents)))]
+        vectors.append(encoder.encode(batch))
+        job.progress(chunks_embedded=start + len(batch))
+    embeddings = np.vstack(vectors).astype(np.float32) if vectors else np.empty((0, 0), np.float32)
+    # 청크 테이블은 열 배열 그대로 저장 (본문은 암호화된 버퍼)
+    result = {f"chunks.{key}": value for key, value in documents.to_columns().items()}
+    result['embeddings'] = embeddings
+    return result
+
+def chunk_table_from_result(result):
+    """작업 결과 파일에서 ChunkTable 복원"""
+    columns = {key.split('.', 1)[1]: value for key, value in result.items() if key.startswith('chunks.')}
+    return ChunkTable.from_columns(columns, get_sealer())
 
 @st.cache_resource
 def load_sentence_transformer():
@@ -364,18 +417,78 @@ def load_sentence_transformer():
         st.error(f"SentenceTransformer loading error: {e}")
         return None
 
-def create_embeddings(documents):
-    """문서 임베딩 생성"""
+@st.cache_resource
+def load_reranker():
+    """Cross-Encoder 재정렬기 로드 (프로세스 전체에서 점수 캐시 공유)"""
+    return CrossEncoderReranker(top_n=10, latency_budget_ms=300, skip_margin=0.15)
+
+@st.cache_resource
+def load_answer_cache():
+    """의미 기반 답변 캐시 (모든 세션이 공유)"""
+    return SemanticAnswerCache(load_sentence_transformer(), threshold=0.92, ttl=3600, max_entries=256)
+
+@st.cache_resource
+def load_answer_router():
+    """답변 경로 선택기와 경로별 지연/비용 통계 (모든 세션이 공유)"""
+    return AnswerRouter(), RouterStats()
+
+@st.cache_resource
+def load_job_runner():
+    """문서 처리 작업 큐 (모든 세션이 공유, 진행 상황은 ./ingest_jobs에 저장)"""
+    return JobRunner(max_workers=2)
+
+@st.cache_resource
+def load_index_bundle(sources):
+    """RAG_INDEX_BUNDLE의 인덱스 번들(전체 + 변경분)을 읽어서 모든 세션이 공유 (실패는 캐시하지 않도록 예외로 전달)
+
+    임베딩은 코퍼스 버전별 캐시 파일로 저장해서 메모리 맵으로 사용 (같은 서버의 프로세스끼리 한 벌 공유)
+    """
+    encoder = load_sentence_transformer()
+    if encoder is None:
+        raise BundleError("임베딩 모델을 불러올 수 없습니다")
+    bundle = load_bundles([source.strip() for source in sources.split(',') if source.strip()],
+                          get_sealer(), model_fingerprint(encoder))
+    bundle.embeddings = load_or_build(embedding_cache_path(bundle.version), lambda: bundle.embeddings)
+    return bundle
+
+def index_bundle_data(documents, embeddings, encoder, relevance_threshold, base=None):
+    """다운로드 버튼용 번들 생성 함수 (버튼을 누를 때 별도 스레드에서 실행, base가 있으면 변경분 번들)"""
+    def build():
+        buffer = io.BytesIO()
+        if base is None:
+            export_bundle(buffer, documents, embeddings, model_fingerprint(encoder), relevance_threshold)
+        else:
+            export_delta(buffer, base, documents, embeddings, model_fingerprint(encoder), relevance_threshold)
+        return buffer.getvalue()
+    return build
+
+@st.cache_resource
+def load_faq_table():
+    """미리 생성된 FAQ 답변 표 (모든 세션이 공유)"""
+    return FAQTable(sealer=get_sealer())
+
+def create_embeddings(documents, base=None, cache_version=None):
+    """문서 임베딩 생성 (EmbeddingStore 반환)
+
+    cache_version이 있으면 공유 파일로 저장해서 메모리 맵으로 열고 (모든 세션/프로세스가 한 벌 공유),
+    base가 있으면 새 문서만 인코딩해서 세션 전용 오버레이로 추가
+    """
     if not documents:
-        return None
+        return None, None
     
     try:
         encoder = load_sentence_transformer()
         if encoder is None:
-            return None
+            return None, None
         
-        texts = [doc['text'] for doc in documents]
-        embeddings = encoder.encode(texts)
+        texts = documents.texts  # 암호화된 청크는 임베딩을 새로 만들 때만 복호화
+        if cache_version:
+            path = embedding_cache_path(cache_version)
+            embeddings = EmbeddingStore(load_or_build(path, lambda: encoder.encode(texts())))
+        elif base is not None:
+            embeddings = base.with_overlay(encoder.encode(texts()))
+        else:
+            embeddings = EmbeddingStore(overlay=encoder.encode(texts()))
         
         return embeddings, encoder
     
@@ -383,26 +496,33 @@ def create_embeddings(documents):
         st.error(f"Embedding generation error: {e}")
         return None, None
 
-def search_documents(query, documents, embeddings, encoder, n_results=3):
-    """문서에서 관련 내용 검색"""
+def search_documents(query, documents, embeddings, encoder, with_scores=False, **options):
+    """문서에서 관련 내용 검색 (rag_pipeline.search_documents, 오류는 화면에 표시하고 빈 결과)"""
     try:
-        if not documents or embeddings is None or encoder is None:
-            return []
-        
-        query_embedding = encoder.encode([query])
-        similarities = cosine_similarity(query_embedding, embeddings)[0]
-        top_indices = np.argsort(similarities)[::-1][:n_results]
-        
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.1:
-                results.append(documents[idx]['text'])
-        
-        return results
-    
+        return rag_pipeline.search_documents(query, documents, embeddings, encoder, with_scores=with_scores, **options)
     except Exception as e:
         st.error(f"Document search error: {e}")
-        return []
+        return ([], []) if with_scores else []
+
+def session_retriever():
+    """세션 코퍼스의 파일별 샤드 검색기 (문서나 임베딩이 바뀌면 바뀐 파일의 샤드만 다시 로드)"""
+    documents = st.session_state.get('documents')
+    embeddings = st.session_state.get('embeddings')
+    encoder = st.session_state.get('encoder')
+    if not isinstance(documents, ChunkTable) or not documents or embeddings is None or encoder is None:
+        return None
+    retriever = st.session_state.get('retriever')
+    if retriever is None or retriever.encoder is not encoder:
+        if retriever is not None:
+            retriever.close()
+        retriever = ShardedRetriever(encoder)
+        st.session_state.retriever = retriever
+        st.session_state.retriever_source = None
+    source = st.session_state.get('retriever_source')
+    if source is None or source[0] is not documents or source[1] is not embeddings:
+        retriever.sync_table(documents, embeddings)
+        st.session_state.retriever_source = (documents, embeddings)
+    return retriever
 
 def load_default_document():
     """GitHub에서 기본 문서 로드 (pstorm_pw.docx)"""
@@ -441,18 +561,9 @@ def load_default_document():
             raise Exception(f"GitHub에서 파일을 가져올 수 없습니다. Status: {response.status_code}")
         
         # 텍스트를 청크로 분할
-        chunks = split_text_into_chunks(content, chunk_size=500)
-        
-        documents = []
-        for i, chunk in enumerate(chunks):
-            documents.append({
-                'id': f"pstorm_pw.docx_{i}",
-                'text': chunk,
-                'filename': "pstorm_pw.docx",
-                'chunk_id': i
-            })
-        
-        return documents
+        builder = ChunkTableBuilder(get_sealer())
+        builder.add_file("pstorm_pw.docx", split_text_into_chunks(content, chunk_size=500))
+        return builder.build()
     
     except Exception as e:
         st.error(f"GitHub에서 기본 문서 로드 중 오류: {e}")
@@ -482,55 +593,128 @@ def load_default_document():
 - 방화벽: 기본 설정
 """
         
-        chunks = split_text_into_chunks(default_content, chunk_size=500)
-        documents = []
-        for i, chunk in enumerate(chunks):
-            documents.append({
-                'id': f"pstorm_pw.docx_{i}",
-                'text': chunk,
-                'filename': "pstorm_pw.docx",
-                'chunk_id': i
-            })
-        
-        return documents
+        builder = ChunkTableBuilder(get_sealer())
+        builder.add_file("pstorm_pw.docx", split_text_into_chunks(default_content, chunk_size=500))
+        return builder.build()
 
-def generate_response(query, context_docs, api_key):
-    """Gemini를 사용하여 응답 생성"""
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        if context_docs:
-            context = "\n\n".join(context_docs)
-            prompt = f"""
-Based on the following document content, please answer the question professionally.
-
-Document Content:
-{context}
-
-Question: {query}
-
-Please follow these guidelines:
-1. Answer accurately based on the document content
-2. If information is not in the documents, state "The requested information is not available in the uploaded documents"
-3. Use a professional and helpful tone
-4. Include specific examples or details when possible
-5. Respond in Korean if the question is in Korean
-"""
+def user_bubble_html(content):
+    """사용자 메시지 말풍선 HTML (우측 정렬)"""
+    return f"""
+                <div style="
+                    display: flex;
+                    justify-content: flex-end;
+                    margin: 1rem 0;
+                    padding-right: 1rem;
+                ">
+                    <div style="
+                        background-color: #e3f2fd;
+                        color: #1565c0;
+                        padding: 0.8rem 1.2rem;
+                        border-radius: 18px 18px 4px 18px;
+                        max-width: 70%;
+                        font-size: 0.95rem;
+                        line-height: 1.4;
+                        box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+                        word-wrap: break-word;
+                    ">
+                        {content}
+                    </div>
+                </div>
+                """
+
+def assistant_bubble_html(content):
+    """AI 응답 말풍선 HTML (좌측 정렬)"""
+    # HTML 태그 제거하고 깔끔하게 표시
+    clean_content = content.replace('<div>', '').replace('</div>', '').strip()
+    
+    return f"""
+                <div style="
+                    display: flex;
+                    justify-content: flex-start;
+                    margin: 1rem 0;
+                    align-items: flex-start;
+                    padding-left: 1rem;
+                ">
+                    <div style="
+                        background-color: #f5f5f5;
+                        color: #2c3e50;
+                        padding: 0.8rem 1.2rem;
+                        border-radius: 18px 18px 18px 4px;
+                        max-width: 75%;
+                        font-size: 0.95rem;
+                        line-height: 1.5;
+                        box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+                        border: 1px solid #e9ecef;
+                        word-wrap: break-word;
+                        white-space: pre-wrap;
+                    ">
+                        🤖 {clean_content}
+                    </div>
+                </div>
+                """
+
+def set_documents(documents):
+    """세션의 문서 테이블과 파생 인덱스 갱신 (본문은 암호화된 채로 보관, 검색 결과로 뽑힌 청크만 복호화)"""
+    if not isinstance(documents, ChunkTable):
+        documents = ChunkTable.from_records(documents, get_sealer())
+    st.session_state.documents = documents
+    st.session_state.metadata_index = documents.metadata_index() if documents else None
+    # 재수집된 청크가 바뀌면 이전 답변 캐시는 자동으로 무효가 됨 (해시는 암호화 전에 계산해 둔 열)
+    hashes = documents.hash_strings()
+    st.session_state.chunk_hashes = frozenset(hashes)
+    st.session_state.corpus_version = corpus_fingerprint(hashes) if documents else None
+
+def apply_ingest_job(job):
+    """끝난 문서 처리 작업의 결과를 세션에 반영 (작업 중에는 이전 인덱스로 계속 검색)"""
+    for warning in job['warnings']:
+        st.warning(warning)
+    
+    if job['status'] == DONE:
+        result = load_job_runner().result(job['id'])
+        documents = chunk_table_from_result(result) if result else None
+        if documents:
+            # 업로드 문서는 공유 기본 문서 위에 세션 전용 오버레이로 추가
+            base_documents = st.session_state.base_documents
+            base_embeddings = st.session_state.get('base_embeddings')
+            set_documents(base_documents + documents)
+            if base_embeddings is not None:
+                embeddings = base_embeddings.with_overlay(result['embeddings'])
+            else:
+                embeddings = EmbeddingStore(overlay=result['embeddings'])
+            st.session_state.embeddings = embeddings
+            st.session_state.encoder = st.session_state.encoder or load_sentence_transformer()
+            st.session_state.relevance_threshold = calibrate_threshold(embeddings)
+            st.success(f"Processed {len(documents)} document chunks")
         else:
-            prompt = f"""
-No uploaded documents found or no relevant information available.
+            st.warning("No processable documents found")
+    elif job['status'] == FAILED:
+        st.error(f"Document processing failed: {job['error']}")
+    elif job['status'] == CANCELLED:
+        st.info("Document processing cancelled")
+    else:
+        st.warning("Document processing was interrupted by a server restart - please process again")
 
-Question: {query}
+def clear_documents():
+    """Clear Docs 버튼 콜백: 문서/임베딩/파일 필터 초기화 (다음 실행 전에 호출되므로 위젯 키도 변경 가능)"""
+    set_documents(ChunkTable.empty(get_sealer()))
+    st.session_state.base_documents = st.session_state.documents
+    st.session_state.base_embeddings = None
+    st.session_state.embeddings = None
+    st.session_state.encoder = None
+    st.session_state.file_filter = []
+    st.session_state.index_bundle_version = None
 
-Please provide a general response based on your knowledge, but first mention that "No relevant information was found in the uploaded documents, so I'm providing a general response."
-Respond in Korean if the question is in Korean.
-"""
-        
-        response = model.generate_content(prompt)
-        return response.text
+@st.fragment(run_every=1.0)
+def ingest_job_status(job_id):
+    """진행 중인 작업 표시 (이 부분만 1초마다 다시 실행), 끝나면 전체를 다시 실행해서 결과 반영"""
+    runner = load_job_runner()
+    job = runner.get(job_id)
+    if job is None or job['status'] in FINISHED:
+        st.rerun()
     
-    except Exception as e:
-        return f"Error generating response: {e}"
+    st.progress(fraction(job), text=f"Processing documents... {describe(job)}")
+    if st.button("Cancel", key="cancel_ingest_job", use_container_width=True):
+        runner.cancel(job_id)
 
 # 사이드바 설정
 with st.sidebar:
@@ -540,11 +724,20 @@ with st.sidebar:
     api_key = st.text_input("Google Gemini API Key:", type="password", help="Enter your API key to enable AI features")
     
     if api_key:
-        genai.configure(api_key=api_key)
         st.success("API Connected")
     else:
         st.warning("API Key Required")
     
+    st.toggle("Stream responses", value=True, key="stream_responses", help="Show the answer as it is generated")
+    st.checkbox("Bypass response cache", key="bypass_response_cache", help="Always call the model, even for an identical prompt")
+    
+    response_stats = get_response_cache().stats()
+    if response_stats['hits'] + response_stats['misses']:
+        st.caption(
+            f"Response cache: {response_stats['hits']} hits / {response_stats['misses']} misses, "
+            f"{response_stats['entries']} entries ({response_stats['bytes'] / 1024:.0f} KB)"
+        )
+    
     st.markdown("---")
     
     # 문서 관리 섹션
@@ -559,43 +752,72 @@ with st.sidebar:
         help="Upload company documents for AI analysis"
     )
     
+    # 인덱스 번들로 시작 (RAG_INDEX_BUNDLE="전체 번들[,변경분 번들...]" 경로 또는 URL, 파싱/임베딩 생략)
+    bundle_sources = os.environ.get('RAG_INDEX_BUNDLE')
+    if bundle_sources and not st.session_state.default_loaded and not st.session_state.documents:
+        with st.spinner("인덱스 번들을 불러오고 있습니다..."):
+            try:
+                bundle = load_index_bundle(bundle_sources)
+            except Exception as e:
+                bundle = None
+                st.error(f"인덱스 번들 로드 실패: {e} - 기본 문서를 다시 처리합니다")
+            if bundle is not None:
+                set_documents(bundle.table)
+                embeddings = EmbeddingStore(bundle.embeddings)
+                st.session_state.base_documents = st.session_state.documents
+                st.session_state.base_embeddings = embeddings
+                st.session_state.embeddings = embeddings
+                st.session_state.encoder = load_sentence_transformer()
+                st.session_state.relevance_threshold = bundle.relevance_threshold or calibrate_threshold(embeddings)
+                st.session_state.default_loaded = True
+                st.session_state.index_bundle_version = bundle.version
+                st.success(f"✅ 인덱스 번들 (버전 {bundle.version}) 로드 완료!")
+                st.rerun()
+    
     # 기본 문서 자동 로드
     if not st.session_state.default_loaded and not st.session_state.documents:
         with st.spinner("기본 문서를 로드하고 있습니다..."):
             default_docs = load_default_document()
             if default_docs:
-                st.session_state.documents = default_docs
+                set_documents(default_docs)
                 
-                # 임베딩 생성
-                embeddings, encoder = create_embeddings(default_docs)
+                # 임베딩 생성 (코퍼스 버전별 파일을 모든 세션/프로세스가 메모리 맵으로 공유)
+                embeddings, encoder = create_embeddings(default_docs, cache_version=st.session_state.corpus_version)
                 if embeddings is not None:
+                    st.session_state.base_documents = st.session_state.documents
+                    st.session_state.base_embeddings = embeddings
                     st.session_state.embeddings = embeddings
                     st.session_state.encoder = encoder
+                    st.session_state.relevance_threshold = calibrate_threshold(embeddings)
                     st.session_state.default_loaded = True
                     st.success("✅ 기본 문서 (pstorm_pw.docx) 로드 완료!")
                     st.rerun()
     
-    # 문서 처리 버튼
+    # 문서 처리 작업 (작업 ID를 URL에 두어 새로고침해도 진행 상황을 이어서 표시)
+    job_id = st.query_params.get("job")
+    if job_id:
+        job = load_job_runner().get(job_id)
+        if job is None:
+            del st.query_params["job"]
+            job_id = None
+        elif job['status'] in FINISHED:
+            apply_ingest_job(job)
+            del st.query_params["job"]
+            job_id = None
+        else:
+            ingest_job_status(job_id)
+    
+    # 문서 처리 버튼 (파싱/임베딩은 백그라운드 작업으로 실행)
     if uploaded_files:
-        if st.button("Process Documents", type="primary", use_container_width=True):
-            with st.spinner("Processing documents..."):
-                # 문서 처리 로직
-                documents = process_documents(uploaded_files)
-                
-                if documents:
-                    st.session_state.documents = documents
-                    
-                    with st.spinner("Generating embeddings..."):
-                        embeddings, encoder = create_embeddings(documents)
-                        if embeddings is not None:
-                            st.session_state.embeddings = embeddings
-                            st.session_state.encoder = encoder
-                            st.success(f"Processed {len(documents)} document chunks")
-                        else:
-                            st.error("Embedding generation failed")
-                else:
-                    st.warning("No processable documents found")
-                
+        if st.button("Process Documents", type="primary", use_container_width=True, disabled=bool(job_id)):
+            encoder = st.session_state.encoder or load_sentence_transformer()
+            if encoder is None:
+                st.error("Embedding generation failed")
+            else:
+                st.query_params["job"] = load_job_runner().submit(
+                    'upload', ingest_uploads, [UploadedBytes(file) for file in uploaded_files], encoder,
+                    progress={'files_total': len(uploaded_files)}
+                )
                 st.rerun()
     
     st.markdown("---")
@@ -605,15 +827,117 @@ with st.sidebar:
     if st.session_state.get('documents'):
         st.metric("Total Chunks", len(st.session_state.documents))
         
-        # 파일별 청크 수 표시
-        file_counts = {}
-        for doc in st.session_state.documents:
-            filename = doc['filename']
-            file_counts[filename] = file_counts.get(filename, 0) + 1
+        # 임베딩 메모리 (공유 메모리 맵 / 세션 전용 오버레이)
+        if isinstance(st.session_state.get('embeddings'), EmbeddingStore):
+            embedding_memory = st.session_state.embeddings.memory()
+            st.caption(
+                f"Embeddings: {embedding_memory['shared_bytes'] / 1024:.0f} KB shared (memory-mapped), "
+                f"{embedding_memory['private_bytes'] / 1024:.0f} KB private"
+            )
+        
+        # 인덱스 번들 내보내기 (다른 복제본은 이 파일 하나로 파싱/임베딩 없이 시작)
+        if st.session_state.get('embeddings') is not None and st.session_state.encoder is not None:
+            version = st.session_state.corpus_version
+            bundle_args = (st.session_state.documents, st.session_state.embeddings, st.session_state.encoder,
+                           st.session_state.relevance_threshold)
+            st.download_button(
+                "Export index bundle",
+                data=index_bundle_data(*bundle_args),
+                file_name=f"index-{version}.ragb",
+                mime="application/zip",
+                on_click="ignore",
+                use_container_width=True,
+                help="Chunks, embeddings and model fingerprint in one checksummed file (set RAG_INDEX_BUNDLE on a replica)"
+            )
+            # 번들로 시작한 복제본은 그 번들 대비 변경분만 내보낼 수 있음
+            if st.session_state.index_bundle_version not in (None, version):
+                base_bundle = load_index_bundle(bundle_sources)  # 시작할 때 읽어 둔 캐시
+                if base_bundle.version == st.session_state.index_bundle_version:
+                    st.download_button(
+                        "Export delta bundle",
+                        data=index_bundle_data(*bundle_args, base=base_bundle),
+                        file_name=f"delta-{base_bundle.version}-{version}.ragb",
+                        mime="application/zip",
+                        on_click="ignore",
+                        use_container_width=True,
+                        help=f"Only the chunks changed since bundle {base_bundle.version}"
+                    )
+        
+        # 파일별 청크 수 표시 (파일명 코드 배열에서 한 번에 계산)
+        file_counts = st.session_state.documents.file_counts()
         
         for filename, count in file_counts.items():
             st.text(f"{filename}: {count} chunks")
         
+        # 파일별 검색 필터
+        if len(file_counts) > 1:
+            st.multiselect(
+                "Search only in:",
+                options=list(file_counts.keys()),
+                key="file_filter",
+                help="Leave empty to search all files"
+            )
+        
+        # 재정렬 옵션
+        st.checkbox(
+            "Rerank results",
+            key="use_reranker",
+            help="Re-score the top candidates with a small cross-encoder (slower, more accurate)"
+        )
+        
+        # 관련도 컷오프 전략
+        st.selectbox(
+            "Relevance cut-off",
+            options=['gap', 'elbow', 'calibrated', 'fixed'],
+            key="cutoff_strategy",
+            help="How weak matches are dropped before they are sent as context"
+        )
+        
+        stats = st.session_state.context_stats.summary()
+        if stats['queries']:
+            st.caption(
+                f"Avg context: {stats['avg_chars_before']:.0f} → {stats['avg_chars_after']:.0f} chars "
+                f"({stats['avg_chunks_before']:.1f} → {stats['avg_chunks_after']:.1f} chunks, {stats['queries']} queries)"
+            )
+        
+        # 답변 경로별 지연/비용
+        route_stats = load_answer_router()[1].summary()
+        for path, label in (('extractive', 'Extractive'), ('llm', 'LLM')):
+            if route_stats[path]['count']:
+                st.caption(
+                    f"{label}: {route_stats[path]['count']} answers, "
+                    f"p50 {route_stats[path]['latency_p50'] * 1000:.0f}ms / p95 {route_stats[path]['latency_p95'] * 1000:.0f}ms, "
+                    f"${route_stats[path]['total_cost']:.4f}"
+                )
+        
+        # 답변 캐시 상태
+        cache_stats = load_answer_cache().stats()
+        if cache_stats['hits'] + cache_stats['misses']:
+            st.caption(
+                f"Answer cache: {cache_stats['hit_rate']:.0%} hit rate "
+                f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}), {cache_stats['size']} entries"
+            )
+        
+        # 자주 묻는 질문 답변 미리 생성 (기본 문서/인덱스 번들 버전이 바뀌면 백그라운드에서 다시 생성)
+        # 방문자가 입력한 키가 아니라 운영자 키(RAG_FAQ_API_KEY)로만 호출하고,
+        # 업로드 문서가 섞인 세션 전용 코퍼스는 미리 생성/저장하지 않음 (배치 작업: python faq_precompute.py)
+        faq_table = load_faq_table()
+        faq_api_key = os.environ.get('RAG_FAQ_API_KEY')
+        on_base_corpus = (st.session_state.documents is st.session_state.base_documents
+                          and st.session_state.get('embeddings') is not None)
+        if faq_api_key and on_base_corpus:
+            faq_table.ensure_fresh(
+                st.session_state.corpus_version,
+                load_questions("faq_questions.txt"),
+                faq_answer_fn(st.session_state.documents, st.session_state.embeddings, st.session_state.encoder,
+                              faq_api_key)
+            )
+        faq_stats = faq_table.stats(st.session_state.corpus_version)
+        if faq_stats['building']:
+            st.caption("FAQ: precomputing answers...")
+        elif faq_stats['answers']:
+            st.caption(f"FAQ: {faq_stats['answers']} precomputed answers ({faq_stats['elapsed']:.1f}s)")
+        
         # 검색 기능 상태
         if st.session_state.get('embeddings') is not None:
             st.success("Search: Active")
@@ -631,15 +955,12 @@ with st.sidebar:
     
     with col1:
         if st.button("Clear Chat", use_container_width=True):
-            st.session_state.messages = []
+            st.session_state.memory.clear()
             st.rerun()
     
     with col2:
-        if st.button("Clear Docs", use_container_width=True):
-            st.session_state.documents = []
-            st.session_state.embeddings = None
-            st.session_state.encoder = None
-            st.rerun()
+        # 콜백에서 초기화 (file_filter 위젯이 이미 그려진 뒤에는 키를 바꿀 수 없음)
+        st.button("Clear Docs", use_container_width=True, on_click=clear_documents)
 
 # 사용법 안내를 사이드바로 이동
 with st.sidebar:
@@ -679,7 +1000,7 @@ chat_container = st.container()
 
 with chat_container:
     # 초기 환영 메시지 (채팅이 비어있을 때만 표시)
-    if not st.session_state.messages:
+    if not st.session_state.memory.messages:
         st.markdown("""
         <div style="
             display: flex;
@@ -706,62 +1027,22 @@ with chat_container:
         """, unsafe_allow_html=True)
 
     # 채팅 메시지 표시 (커스텀 스타일)
-    if st.session_state.messages:
-        for i, message in enumerate(st.session_state.messages):
+    if st.session_state.memory.messages:
+        if st.session_state.memory.summary_lines:
+            st.caption(f"이전 대화 {len(st.session_state.memory.summary_lines)}개는 요약되어 있습니다")
+        for i, message in enumerate(st.session_state.memory.messages):
             if message["role"] == "user":
                 # 사용자 메시지 - 우측 정렬
-                st.markdown(f"""
-                <div style="
-                    display: flex;
-                    justify-content: flex-end;
-                    margin: 1rem 0;
-                    padding-right: 1rem;
-                ">
-                    <div style="
-                        background-color: #e3f2fd;
-                        color: #1565c0;
-                        padding: 0.8rem 1.2rem;
-                        border-radius: 18px 18px 4px 18px;
-                        max-width: 70%;
-                        font-size: 0.95rem;
-                        line-height: 1.4;
-                        box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-                        word-wrap: break-word;
-                    ">
-                        {message["content"]}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(user_bubble_html(message["content"]), unsafe_allow_html=True)
             else:
                 # AI 응답 - 좌측 정렬
-                # HTML 태그 제거하고 깔끔하게 표시
-                clean_content = message["content"].replace('<div>', '').replace('</div>', '').strip()
+                st.markdown(assistant_bubble_html(message["content"]), unsafe_allow_html=True)
                 
-                st.markdown(f"""
-                <div style="
-                    display: flex;
-                    justify-content: flex-start;
-                    margin: 1rem 0;
-                    align-items: flex-start;
-                    padding-left: 1rem;
-                ">
-                    <div style="
-                        background-color: #f5f5f5;
-                        color: #2c3e50;
-                        padding: 0.8rem 1.2rem;
-                        border-radius: 18px 18px 18px 4px;
-                        max-width: 75%;
-                        font-size: 0.95rem;
-                        line-height: 1.5;
-                        box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-                        border: 1px solid #e9ecef;
-                        word-wrap: break-word;
-                        white-space: pre-wrap;
-                    ">
-                        🤖 {clean_content}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+                # 스트리밍 응답의 생성 시간 표시
+                if "timing" in message and message["timing"].get("ttft") is not None:
+                    st.caption(
+                        f"⏱ 첫 토큰 {message['timing']['ttft']:.2f}s · 전체 {message['timing']['total']:.2f}s"
+                    )
                 
                 # 참고 문서가 있을 경우 표시
                 if "references" in message:
@@ -858,29 +1139,104 @@ st.markdown("""
 
 # 사용자 입력 (커스텀 placeholder)
 if prompt := st.chat_input("AHN'S AI 에게 물어보기"):
+    # 후속 질문("그럼 비밀번호는?")은 직전 대화 주제를 붙여 검색용 질문으로 재작성
+    memory = st.session_state.memory
+    search_query = memory.rewrite(prompt)
+    cache_context = memory.context_for(prompt)
+    history = memory.history_text()
+    
     # 사용자 메시지 추가
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    memory.add("user", prompt)
     
     # AI 응답 생성
     if api_key:
         with st.spinner("답변을 생성하고 있습니다..."):
-            # 문서 검색
-            relevant_docs = search_documents(
-                prompt, 
-                st.session_state.documents, 
-                st.session_state.embeddings, 
-                st.session_state.encoder
-            )
+            # 문서 검색 (선택된 파일로 필터링)
+            file_filter = st.session_state.get('file_filter')
+            cutoff = st.session_state.get('cutoff_strategy', 'gap')
+            
+            # 미리 생성된 FAQ 답변이나 비슷한 질문의 캐시된 답변이 있으면 검색과 LLM 호출 생략
+            answer_cache = load_answer_cache()
+            namespace = ",".join(sorted(file_filter)) if file_filter else ""
+            cached = None
+            if not file_filter:
+                cached = load_faq_table().lookup(search_query, st.session_state.corpus_version)
+            if cached is None:
+                cached = answer_cache.lookup(
+                    search_query,
+                    corpus=st.session_state.chunk_hashes,
+                    version=st.session_state.corpus_version,
+                    namespace=namespace,
+                    context=cache_context
+                )
             
-            # 응답 생성
-            response = generate_response(prompt, relevant_docs, api_key)
+            if cached:
+                response, relevant_docs = cached
+            else:
+                started = time.perf_counter()
+                relevant_docs, scores = search_documents(
+                    search_query, 
+                    st.session_state.documents, 
+                    st.session_state.embeddings, 
+                    st.session_state.encoder,
+                    filters={'filename': file_filter} if file_filter else None,
+                    metadata_index=st.session_state.metadata_index,
+                    reranker=load_reranker() if st.session_state.get('use_reranker') else None,
+                    cutoff=cutoff,
+                    threshold=st.session_state.relevance_threshold if cutoff == 'calibrated' else 0.1,
+                    context_stats=st.session_state.context_stats,
+                    with_scores=True,
+                    retriever=session_retriever()
+                )
+                
+                # 단순 조회이고 검색 결과가 확실하면 LLM 없이 추출형 답변
+                router, router_stats = load_answer_router()
+                decision = router.decide(search_query, scores)
+                
+                # 응답 생성 (스트리밍이면 말풍선에 토큰이 도착하는 대로 표시)
+                bypass_cache = st.session_state.get('bypass_response_cache', False)
+                timing = None
+                response = None
+                if decision.path == 'extractive':
+                    response = extractive_answer(search_query, relevant_docs)
+                    if response is None:  # 청크에서 질문 주제의 레코드를 하나로 좁히지 못하면 LLM이 고름
+                        decision = RouteDecision('llm', decision.intent, 'no single matching record')
+                if response is None and st.session_state.get('stream_responses', True):
+                    timing = {}
+                    with chat_container:
+                        st.markdown(user_bubble_html(prompt), unsafe_allow_html=True)
+                        placeholder = st.empty()
+                    response = ""
+                    for token in generate_response_stream(prompt, relevant_docs, api_key, timing, bypass_cache=bypass_cache, history=history):
+                        response += token
+                        placeholder.markdown(assistant_bubble_html(response + " ▌"), unsafe_allow_html=True)
+                    placeholder.markdown(assistant_bubble_html(response), unsafe_allow_html=True)
+                elif response is None:
+                    response = generate_response(prompt, relevant_docs, api_key, bypass_cache=bypass_cache, history=history)
+                
+                cost = 0.0
+                if decision.path == 'llm':
+                    cost = estimate_cost('gemini-1.5-flash', build_prompt(prompt, relevant_docs, history=history), response)
+                router_stats.record(decision.path, time.perf_counter() - started, cost)
+                
+                if "Error generating response:" not in response:
+                    answer_cache.store(
+                        search_query,
+                        response,
+                        relevant_docs,
+                        version=st.session_state.corpus_version,
+                        namespace=namespace,
+                        context=cache_context
+                    )
             
             # 응답을 세션에 저장 (참고 문서 포함)
-            message_data = {"role": "assistant", "content": response}
+            message_data = {}
             if relevant_docs:
                 message_data["references"] = relevant_docs
+            if not cached and timing:
+                message_data["timing"] = timing
             
-            st.session_state.messages.append(message_data)
+            memory.add("assistant", response, **message_data)
             
         # 페이지 새로고침으로 UI 업데이트
         st.rerun()
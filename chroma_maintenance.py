@@ -0,0 +1,230 @@
+# chroma_maintenance.py - Chroma 벡터 저장소 점검/정리 도구
+# 삭제 후 재생성 패턴으로 남는 고아 HNSW 세그먼트 제거, chroma.sqlite3 VACUUM, 여러 저장소를 하나로 통합
+#
+# 사용법 (앱을 끈 상태에서 실행):
+#   python chroma_maintenance.py list                        # 현재 폴더의 모든 *_chroma_db
+#   python chroma_maintenance.py gc --dry-run real_chroma_db # 지울 대상만 표시
+#   python chroma_maintenance.py gc                          # 고아 세그먼트 삭제
+#   python chroma_maintenance.py vacuum
+#   python chroma_maintenance.py migrate --target ./chroma_store
+#
+# migrate는 원본 저장소를 Chroma로 열기 때문에 원본 파일도 바뀜 (HNSW 파일 재작성, data_level0.bin 생성 등)
+# → 원본을 그대로 보존해야 하면 먼저 복사해 두고 실행
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+SQLITE_FILE = "chroma.sqlite3"
+UUID_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def find_stores(root='.'):
+    """chroma.sqlite3가 있는 하위 폴더 목록"""
+    stores = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isfile(os.path.join(path, SQLITE_FILE)):
+            stores.append(path)
+    return stores
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def _connect(path, readonly=True):
+    db_path = os.path.abspath(os.path.join(path, SQLITE_FILE))
+    if readonly:
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    return sqlite3.connect(db_path)
+
+
+def inspect_store(path):
+    """저장소의 컬렉션, 세그먼트, 고아 세그먼트 폴더와 크기"""
+    conn = _connect(path)
+    try:
+        collections = []
+        for collection_id, name, dimension in conn.execute("SELECT id, name, dimension FROM collections"):
+            count = conn.execute(
+                "SELECT COUNT(*) FROM embeddings e JOIN segments s ON e.segment_id = s.id "
+                "WHERE s.collection = ? AND s.scope = 'METADATA'", (collection_id,)
+            ).fetchone()[0]
+            collections.append({'id': collection_id, 'name': name, 'dimension': dimension, 'count': count})
+
+        segments = []
+        for segment_id, scope, collection_id in conn.execute("SELECT id, scope, collection FROM segments"):
+            segment_dir = os.path.join(path, segment_id)
+            segments.append({
+                'id': segment_id,
+                'scope': scope,
+                'collection': collection_id,
+                'bytes': dir_size(segment_dir) if os.path.isdir(segment_dir) else 0,
+            })
+
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+
+    live = {segment['id'] for segment in segments}
+    orphans = [{'id': name, 'bytes': dir_size(os.path.join(path, name))}
+               for name in sorted(os.listdir(path))
+               if UUID_DIR.match(name) and os.path.isdir(os.path.join(path, name)) and name not in live]
+
+    return {
+        'path': path,
+        'sqlite_bytes': os.path.getsize(os.path.join(path, SQLITE_FILE)),
+        'free_bytes': page_size * free_pages,
+        'total_bytes': dir_size(path),
+        'collections': collections,
+        'segments': segments,
+        'orphans': orphans,
+    }
+
+
+def gc_store(path, dry_run=False):
+    """세그먼트 테이블에 없는 HNSW 폴더 삭제, 삭제(예정) 목록 반환"""
+    orphans = inspect_store(path)['orphans']
+    if not dry_run:
+        for orphan in orphans:
+            shutil.rmtree(os.path.join(path, orphan['id']))
+    return orphans
+
+
+def vacuum_store(path):
+    """chroma.sqlite3 VACUUM, (이전 크기, 이후 크기) 반환"""
+    db_path = os.path.join(path, SQLITE_FILE)
+    before = os.path.getsize(db_path)
+    conn = _connect(path, readonly=False)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before, os.path.getsize(db_path)
+
+
+def migrate_stores(sources, target, batch_size=1000):
+    """여러 저장소의 컬렉션을 하나의 저장소로 복사 (저장된 임베딩을 그대로 사용, 다시 임베딩하지 않음)
+
+    이름이 겹치면 '<저장소 폴더명>.<컬렉션명>'으로 저장, {(원본 경로, 컬렉션명): 새 컬렉션명} 반환
+    원본도 Chroma 클라이언트로 열기 때문에 원본 폴더의 파일이 다시 쓰일 수 있음
+    """
+    import chromadb
+
+    target_client = chromadb.PersistentClient(path=target)
+    existing = {collection.name for collection in target_client.list_collections()}
+    names = [(source, collection['name']) for source in sources for collection in inspect_store(source)['collections']]
+    duplicated = {name for _, name in names if sum(1 for _, other in names if other == name) > 1}
+
+    mapping = {}
+    for source in sources:
+        source_client = chromadb.PersistentClient(path=source)
+        for collection in source_client.list_collections():
+            name = collection.name
+            new_name = f"{os.path.basename(os.path.normpath(source))}.{name}" if name in duplicated else name
+            if new_name in existing:
+                print(f"  ⏭️ {source}/{name} → {new_name} (이미 있음, 건너뜀)")
+                mapping[(source, name)] = new_name
+                continue
+
+            data = collection.get(include=['embeddings', 'documents', 'metadatas'])
+            target_collection = target_client.create_collection(new_name, metadata=collection.metadata)
+            for start in range(0, len(data['ids']), batch_size):
+                end = start + batch_size
+                target_collection.add(
+                    ids=data['ids'][start:end],
+                    embeddings=data['embeddings'][start:end],
+                    documents=data['documents'][start:end],
+                    metadatas=data['metadatas'][start:end] if any(data['metadatas'][start:end]) else None,
+                )
+            existing.add(new_name)
+            mapping[(source, name)] = new_name
+            print(f"  📦 {source}/{name} → {new_name} ({len(data['ids'])}개)")
+    return mapping
+
+
+def open_time(path):
+    """PersistentClient로 열고 컬렉션 목록을 읽는 데 걸리는 시간(초)"""
+    import chromadb
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=path)
+    for collection in client.list_collections():
+        collection.count()
+    return time.perf_counter() - start
+
+
+def _kb(size):
+    return f"{size / 1024:.0f}KB"
+
+
+def print_store(info):
+    print(f"\n🗄️ {info['path']} (전체 {_kb(info['total_bytes'])}, sqlite {_kb(info['sqlite_bytes'])}, "
+          f"회수 가능 {_kb(info['free_bytes'])})")
+    for collection in info['collections']:
+        print(f"  📚 {collection['name']} ({collection['count']}개, {collection['dimension']}차원)")
+        for segment in info['segments']:
+            if segment['collection'] == collection['id']:
+                size = _kb(segment['bytes']) if segment['scope'] == 'VECTOR' else 'sqlite'
+                print(f"     - {segment['scope']:<8} {segment['id']} {size}")
+    for orphan in info['orphans']:
+        print(f"  🧹 고아 세그먼트 {orphan['id']} {_kb(orphan['bytes'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma 저장소 점검/정리")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="컬렉션/세그먼트/고아 폴더와 크기 표시")
+    list_parser.add_argument('--open-time', action='store_true', help="저장소 여는 시간도 측정")
+    gc_parser = subparsers.add_parser('gc', help="고아 세그먼트 폴더 삭제")
+    gc_parser.add_argument('--dry-run', action='store_true')
+    subparsers.add_parser('vacuum', help="chroma.sqlite3 VACUUM")
+    migrate_parser = subparsers.add_parser('migrate', help="모든 컬렉션을 하나의 저장소로 통합")
+    migrate_parser.add_argument('--target', default='./chroma_store')
+    for sub in subparsers.choices.values():
+        sub.add_argument('stores', nargs='*', help="저장소 경로 (생략하면 현재 폴더에서 찾기)")
+    args = parser.parse_args()
+
+    stores = args.stores or find_stores('.')
+    if args.command == 'migrate':
+        stores = [store for store in stores if os.path.abspath(store) != os.path.abspath(args.target)]
+    if not stores:
+        print("❌ Chroma 저장소를 찾을 수 없습니다")
+        return
+
+    if args.command == 'list':
+        for store in stores:
+            print_store(inspect_store(store))
+            if args.open_time:
+                print(f"  ⏱ 열기 {open_time(store) * 1000:.0f}ms")
+
+    elif args.command == 'gc':
+        freed = 0
+        for store in stores:
+            for orphan in gc_store(store, dry_run=args.dry_run):
+                freed += orphan['bytes']
+                print(f"{'🔎' if args.dry_run else '🧹'} {store}/{orphan['id']} ({_kb(orphan['bytes'])})")
+        print(f"✅ {'삭제 예정' if args.dry_run else '회수'}: {_kb(freed)}")
+
+    elif args.command == 'vacuum':
+        for store in stores:
+            before, after = vacuum_store(store)
+            print(f"🗜️ {store}: {_kb(before)} → {_kb(after)}")
+
+    elif args.command == 'migrate':
+        before = sum(dir_size(store) for store in stores)  # 원본을 열기 전에 측정 (열면 파일이 바뀜)
+        print(f"🚚 {len(stores)}개 저장소를 {args.target}로 통합 (원본 저장소도 수정됨)")
+        migrate_stores(stores, args.target)
+        info = inspect_store(args.target)
+        print(f"✅ 통합 완료: {len(info['collections'])}개 컬렉션, {_kb(before)} → {_kb(info['total_bytes'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# chunk_table.py - 열(column) 단위 청크 저장소 (list of dict 대체)
+# 파일명은 한 번만 저장(코드 배열), 본문은 하나의 바이트 버퍼 + 오프셋으로 보관
+# 행 접근(table[i]['text'])은 기존 dict와 같은 방식으로 동작
+#
+# 사용법 (10만 청크당 메모리 측정):
+#   python chunk_table.py --chunks 100000
+import argparse
+
+import numpy as np
+
+from metadata_filter import MetadataIndex
+from semantic_cache import chunk_hash
+
+
+class ChunkRow:
+    """청크 한 행의 읽기 전용 dict 호환 뷰 (본문은 접근할 때 디코딩/복호화)"""
+
+    __slots__ = ('table', 'index')
+    KEYS = ('id', 'text', 'filename', 'chunk_id', 'hash')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        table, i = self.table, self.index
+        if key == 'text':
+            return table.text(i)
+        if key == 'filename':
+            return table.filenames[table.file_codes[i]]
+        if key == 'chunk_id':
+            return int(table.chunk_ids[i])
+        if key == 'id':
+            return table.chunk_key(i)
+        if key == 'hash':
+            return table.hash_string(i)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def keys(self):
+        return self.KEYS
+
+    def to_dict(self):
+        return {key: self[key] for key in self.KEYS}
+
+    def __repr__(self):
+        return f"ChunkRow({self['id']!r})"
+
+
+class ChunkTable:
+    """청크 열 저장소
+
+    - filenames: 파일명 목록 (중복 없이), file_codes: 행별 파일명 번호 (int32)
+    - chunk_ids: 파일 내 청크 번호 (int32), hashes: 평문 기준 chunk_hash (uint64)
+    - buffer + offsets: 모든 본문을 이어 붙인 UTF-8 바이트와 시작 위치 (행 수 + 1)
+    sealer가 있으면 buffer에는 AES-GCM으로 봉인된 본문이 들어가고 행을 읽을 때만 복호화합니다.
+    """
+
+    def __init__(self, filenames, file_codes, chunk_ids, offsets, buffer, hashes, sealer=None):
+        self.filenames = list(filenames)
+        self.file_codes = np.asarray(file_codes, dtype=np.int32)
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.buffer = bytes(buffer)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.sealer = sealer
+
+    # ----- 생성 -----
+
+    @classmethod
+    def empty(cls, sealer=None):
+        return cls([], [], [], [0], b"", [], sealer)
+
+    @classmethod
+    def from_records(cls, records, sealer=None):
+        """기존 {'text', 'filename', 'chunk_id'} dict 목록에서 생성"""
+        builder = ChunkTableBuilder(sealer)
+        for record in records:
+            builder.add(record['filename'], record['chunk_id'], record['text'])
+        return builder.build()
+
+    @classmethod
+    def from_columns(cls, columns, sealer=None):
+        """to_columns() 결과에서 복원 (배열을 그대로 사용, 행 단위 처리 없음)"""
+        return cls(columns['filenames'], columns['file_codes'], columns['chunk_ids'], columns['offsets'],
+                   np.asarray(columns['buffer'], dtype=np.uint8).tobytes(), columns['hashes'],
+                   sealer if columns.get('sealed') else None)
+
+    def to_columns(self):
+        """직렬화용 열 (배열 5개 + 파일명 목록)"""
+        return {
+            'filenames': self.filenames,
+            'file_codes': self.file_codes,
+            'chunk_ids': self.chunk_ids,
+            'offsets': self.offsets,
+            'buffer': np.frombuffer(self.buffer, dtype=np.uint8),
+            'hashes': self.hashes,
+            'sealed': self.sealer is not None,
+        }
+
+    # ----- 행 접근 -----
+
+    def __len__(self):
+        return len(self.file_codes)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(index)
+            return ChunkRow(self, int(index))
+        if isinstance(index, slice):
+            index = np.arange(len(self))[index]
+        return self.take(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ChunkRow(self, i)
+
+    def raw(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def text(self, i):
+        if self.sealer is not None:
+            return self.sealer.open_bytes(self.raw(i), self.chunk_key(i))
+        return self.raw(i).decode('utf-8')
+
+    def texts(self):
+        return [self.text(i) for i in range(len(self))]
+
+    def chunk_key(self, i):
+        """기존 문서 ID 형식 '<파일명>_<청크 번호>'"""
+        return f"{self.filenames[self.file_codes[i]]}_{self.chunk_ids[i]}"
+
+    def hash_string(self, i):
+        return f"{int(self.hashes[i]):016x}"
+
+    def hash_strings(self):
+        return [f"{int(value):016x}" for value in self.hashes]
+
+    # ----- 열 연산 -----
+
+    def take(self, rows):
+        """행 번호 배열로 부분 테이블 생성"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, ends = self.offsets[rows], self.offsets[rows + 1]
+        lengths = ends - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        source = np.frombuffer(self.buffer, dtype=np.uint8)
+        buffer = np.concatenate([source[start:end] for start, end in zip(starts, ends)]) if len(rows) else b""
+        used = np.unique(self.file_codes[rows])
+        remap = np.full(len(self.filenames), -1, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        return ChunkTable([self.filenames[code] for code in used], remap[self.file_codes[rows]],
+                          self.chunk_ids[rows], offsets, bytes(buffer), self.hashes[rows], self.sealer)
+
+    def __add__(self, other):
+        if not isinstance(other, ChunkTable):
+            other = ChunkTable.from_records(other, self.sealer)
+        return ChunkTable.concat([self, other])
+
+    def __radd__(self, other):
+        if not isinstance(other, ChunkTable):
+            other = ChunkTable.from_records(other, self.sealer)
+        return ChunkTable.concat([other, self])
+
+    @staticmethod
+    def concat(tables):
+        """여러 테이블 이어 붙이기 (파일명 코드는 다시 매핑, 본문 버퍼는 그대로 연결)"""
+        tables = [table for table in tables if len(table)] or tables[:1]
+        sealers = {id(table.sealer) for table in tables}
+        if len(sealers) > 1:
+            raise ValueError("암호화 여부가 다른 테이블은 합칠 수 없습니다")
+        filenames = []
+        code_of = {}
+        file_codes, chunk_ids, offsets, hashes = [], [], [np.zeros(1, dtype=np.int64)], []
+        base = 0
+        for table in tables:
+            remap = np.array([code_of.setdefault(name, len(code_of)) for name in table.filenames], dtype=np.int32)
+            file_codes.append(remap[table.file_codes] if len(table) else table.file_codes)
+            chunk_ids.append(table.chunk_ids)
+            offsets.append(table.offsets[1:] + base)
+            hashes.append(table.hashes)
+            base += len(table.buffer)
+        filenames = list(code_of)
+        return ChunkTable(filenames, np.concatenate(file_codes), np.concatenate(chunk_ids),
+                          np.concatenate(offsets), b"".join(table.buffer for table in tables),
+                          np.concatenate(hashes), tables[0].sealer if tables else None)
+
+    def file_counts(self):
+        """파일별 청크 수 {파일명: 개수} (bincount 한 번)"""
+        counts = np.bincount(self.file_codes, minlength=len(self.filenames))
+        return {name: int(count) for name, count in zip(self.filenames, counts) if count}
+
+    def file_rows(self, filename):
+        """파일의 행 번호 배열"""
+        if filename not in self.filenames:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.file_codes == self.filenames.index(filename))
+
+    def metadata_index(self):
+        """파일명 필터용 MetadataIndex (행 단위 순회 없이 코드 배열에서 생성)"""
+        order = np.argsort(self.file_codes, kind='stable')
+        bounds = np.searchsorted(self.file_codes[order], np.arange(len(self.filenames) + 1))
+        postings = {'filename': {name: order[bounds[code]:bounds[code + 1]].astype(np.int64)
+                                 for code, name in enumerate(self.filenames) if bounds[code + 1] > bounds[code]},
+                    'type': {}}
+        return MetadataIndex.from_postings(len(self), postings)
+
+    def nbytes(self):
+        return (self.file_codes.nbytes + self.chunk_ids.nbytes + self.offsets.nbytes + len(self.buffer)
+                + self.hashes.nbytes + sum(len(name) for name in self.filenames))
+
+
+class ChunkTableBuilder:
+    """행을 하나씩 추가해서 ChunkTable 생성 (본문은 바이트 목록에 모았다가 한 번에 연결)"""
+
+    def __init__(self, sealer=None):
+        self.sealer = sealer
+        self.code_of = {}
+        self.file_codes = []
+        self.chunk_ids = []
+        self.parts = []
+        self.hashes = []
+
+    def add(self, filename, chunk_id, text):
+        self.file_codes.append(self.code_of.setdefault(filename, len(self.code_of)))
+        self.chunk_ids.append(chunk_id)
+        self.hashes.append(int(chunk_hash(text), 16))
+        if self.sealer is not None:
+            self.parts.append(self.sealer.seal_bytes(text, f"{filename}_{chunk_id}"))
+        else:
+            self.parts.append(text.encode('utf-8'))
+
+    def add_file(self, filename, chunks):
+        for i, chunk in enumerate(chunks):
+            self.add(filename, i, chunk)
+
+    def __len__(self):
+        return len(self.file_codes)
+
+    def build(self):
+        offsets = np.zeros(len(self.parts) + 1, dtype=np.int64)
+        np.cumsum([len(part) for part in self.parts], out=offsets[1:])
+        return ChunkTable(list(self.code_of), self.file_codes, self.chunk_ids, offsets,
+                          b"".join(self.parts), np.array(self.hashes, dtype=np.uint64), self.sealer)
+
+
+def main():
+    import pickle
+    import sys
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="청크 저장 방식별 메모리 측정")
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--files', type=int, default=200)
+    args = parser.parse_args()
+
+    print("🚀 청크 테이블 메모리 측정 시작!")
+    rng = np.random.default_rng(0)
+    words = ["계정", "비밀번호", "와이파이", "네트워크", "ID:", "PW:", "서버", "관리자", "설정", "company"]
+    texts = [" ".join(rng.choice(words, size=60)) for _ in range(2000)]
+    filenames = [f"document_{i}.docx" for i in range(args.files)]
+
+    def measure(build):
+        tracemalloc.start()
+        start = time.perf_counter()
+        value = build()
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return value, size, elapsed
+
+    def build_records():
+        return [{'id': f"{filenames[i % args.files]}_{i}", 'text': texts[i % len(texts)] + f" #{i}",
+                 'filename': filenames[i % args.files], 'chunk_id': i} for i in range(args.chunks)]
+
+    records, list_bytes, list_time = measure(build_records)
+    table, table_bytes, table_time = measure(lambda: ChunkTable.from_records(records))
+    scale = 100000 / args.chunks / 1024 / 1024
+    text_bytes = sum(sys.getsizeof(doc['text']) for doc in records)
+    print(f"📦 list of dict: {list_bytes * scale:.1f}MB / 10만 청크 "
+          f"(본문 {text_bytes * scale:.1f}MB + 행 오버헤드 {(list_bytes - text_bytes) * scale:.1f}MB, 생성 {list_time:.2f}s)")
+    print(f"📦 ChunkTable:   {table_bytes * scale:.1f}MB / 10만 청크 "
+          f"(본문 {len(table.buffer) * scale:.1f}MB + 열 {(table.nbytes() - len(table.buffer)) * scale:.1f}MB, "
+          f"변환 {table_time:.2f}s)")
+
+    start = time.perf_counter()
+    counts = {}
+    for doc in records:
+        counts[doc['filename']] = counts.get(doc['filename'], 0) + 1
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    assert table.file_counts() == counts
+    vector_time = time.perf_counter() - start
+    print(f"📊 파일별 개수: 반복문 {loop_time * 1000:.1f}ms → bincount {vector_time * 1000:.2f}ms")
+
+    start = time.perf_counter()
+    list_blob = pickle.dumps(records)
+    list_dump = time.perf_counter() - start
+    start = time.perf_counter()
+    table_blob = pickle.dumps(table.to_columns())
+    table_dump = time.perf_counter() - start
+    print(f"💾 직렬화: pickle(list) {len(list_blob) / 1024 / 1024:.1f}MB {list_dump * 1000:.0f}ms → "
+          f"열 {len(table_blob) / 1024 / 1024:.1f}MB {table_dump * 1000:.0f}ms")
+
+    rows = table.file_rows(filenames[0])
+    print(f"🔎 파일별 슬라이스: {filenames[0]} {len(rows)}행, 첫 행 {table[int(rows[0])]['id']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,13 @@
 
 import streamlit as st           # 웹 인터페이스 생성 (Flask보다 간단)
 import os                       # 파일 시스템 접근 (파일 존재 확인 등)
-from sentence_transformers import SentenceTransformer  # 🧠 텍스트→벡터 변환 AI
-import chromadb                 # 🗄️ 벡터 데이터베이스 (빠른 유사도 검색)
+from shared_resources import (  # 🤝 프로세스 전체가 공유하는 모델/DB 핸들 (세션마다 따로 만들지 않음)
+    SessionLease, acquire_rag_resources, get_registry, encoder_key, index_key, memory_report
+)
 from docx import Document       # 📄 Word 파일(.docx) 읽기
+from parent_child import (      # 🌳 부모-자식 인덱싱 (줄로 찾고 섹션으로 반환)
+    SectionBuilder, index_records, search_parents
+)
 
 # =====================================================
 # 🎨 웹페이지 기본 설정
@@ -37,35 +41,34 @@ class WebRAG:
     4. 찾은 조각들을 바탕으로 예쁜 답변 만들기
     """
     
+    # 🗄️ 벡터 DB 위치와 컬렉션 이름 (모든 세션이 같은 것을 공유)
+    DB_PATH = "./web_chroma_db"
+    COLLECTION_NAME = "web_company_info"
+    
     def __init__(self):
         """
         🏗️ RAG 시스템 초기화
         
         주의: Streamlit은 코드가 바뀔 때마다 전체를 다시 실행하므로
         무거운 AI 모델을 매번 새로 로드하면 느려짐
-        → session_state를 사용해서 한 번만 로드하도록 캐싱
+        → 프로세스 공유 저장소(shared_resources)에서 한 번만 로드하고
+          세션은 session_state에 참조(lease)만 보관
         """
         
         # 🔍 이미 초기화했는지 확인 (중복 방지)
-        if 'rag_initialized' not in st.session_state:
-            st.session_state.rag_initialized = True  # 초기화 완료 표시
+        if 'rag_lease' not in st.session_state:
             
             # 💫 로딩 스피너 표시 (사용자 경험 개선)
             with st.spinner('🧠 AI 시스템 초기화 중...'):
                 
-                # 🤖 임베딩 모델 로드
-                # 'all-MiniLM-L6-v2': 384차원, 빠른 속도, 적당한 정확도
-                # 다운로드 크기: 약 90MB
-                st.session_state.model = SentenceTransformer('all-MiniLM-L6-v2')
-                
-                # 🗃️ 벡터 데이터베이스 설정
-                # PersistentClient: 컴퓨터를 껐다 켜도 데이터 유지
-                # path="./web_chroma_db": 현재 폴더에 데이터베이스 파일 저장
-                st.session_state.client = chromadb.PersistentClient(path="./web_chroma_db")
-                
-                # 📚 컬렉션 생성 (테이블 같은 개념)
-                # get_or_create: 있으면 가져오고, 없으면 새로 만들기
-                st.session_state.collection = st.session_state.client.get_or_create_collection("web_company_info")
+                # 🤝 공유 리소스 빌리기 (참조 카운트)
+                # - 임베딩 모델 'all-MiniLM-L6-v2' (384차원, 약 90MB): 프로세스에 1개만 로드
+                # - PersistentClient(path="./web_chroma_db"): SQLite 연결도 1개만
+                # - 인덱스 "web_company_info": 모든 세션이 같은 버전 인덱스 사용
+                # lease를 session_state에 넣어두면 세션이 끝날 때 자동으로 반납됨
+                lease = SessionLease()
+                acquire_rag_resources(lease, self.DB_PATH, self.COLLECTION_NAME)
+                st.session_state.rag_lease = lease
                 
                 # 🚫 LLM 기능 비활성화 
                 # 이유: GPT 같은 LLM은 비용이 들고 느릴 수 있음
@@ -75,6 +78,26 @@ class WebRAG:
             # ✅ 초기화 완료 메시지
             st.success('✅ AI 시스템 (스마트 템플릿) 준비 완료!')
     
+    @property
+    def model(self):
+        """
+        🧠 공유 임베딩 모델 (all-MiniLM-L6-v2)
+        
+        자식 줄과 질문을 같은 모델로 직접 벡터화 (부모 섹션은 임베딩하지 않음)
+        """
+        return get_registry().get(encoder_key('all-MiniLM-L6-v2'))
+    
+    @property
+    def index(self):
+        """
+        📚 공유 버전 인덱스 (블루/그린)
+        
+        "web_company_info"는 별칭이고 실제 데이터는 "web_company_info-v<시각>" 컬렉션에 있음
+        문서를 다시 올리면 새 버전을 다 만든 뒤 별칭만 바꾸므로
+        다른 세션은 그동안에도 기존 버전으로 계속 검색 가능
+        """
+        return get_registry().get(index_key(self.DB_PATH, self.COLLECTION_NAME))
+    
     def load_word_file(self, file_path):
         """
         📄 Word 파일을 읽어서 검색 가능한 형태로 변환
@@ -83,22 +106,22 @@ class WebRAG:
             file_path (str): 읽을 Word 파일 경로
             
         Returns:
-            list: 처리된 텍스트 조각들 [{'id': '...', 'text': '...'}, ...]
+            tuple: (부모 섹션 목록, 자식 줄 목록) - parent_child.SectionBuilder 형식
             
-        핵심 아이디어:
-        - 단순히 전체 문서를 하나로 저장하면 검색이 부정확
-        - 의미 있는 단위로 나누되, 관련 정보는 함께 묶어야 함
-        - 예: "회사구글계정" + "ID/PW 정보"를 하나로 묶기
+        핵심 아이디어 (부모-자식 인덱싱):
+        - 단순히 전체 문서를 하나로 저장하면 검색이 부정확 → 검색은 줄(자식) 단위로
+        - 하지만 답변에는 관련 정보가 함께 묶여 있어야 함 → 결과는 섹션(부모) 단위로
+        - 예: "-Id : pstorm2019@gmail.com" 줄로 찾고 "회사구글계정" 섹션 전체를 반환
+        - 각 줄은 부모 섹션 본문에 한 번만 저장 (자식은 위치만 기억)
         """
         
         # 🚨 파일 존재 여부 확인
         if not os.path.exists(file_path):
-            return []  # 파일이 없으면 빈 리스트 반환
+            return [], []  # 파일이 없으면 빈 목록 반환
         
         # 📖 Word 문서 열기
         doc = Document(file_path)      # python-docx 라이브러리 사용
-        texts = []                     # 처리된 텍스트들을 저장할 리스트
-        current_section = ""           # 현재 섹션 제목 추적 변수
+        builder = SectionBuilder()     # 🌳 섹션(부모)과 줄(자식)을 모으는 도우미
         
         # 📝 문서의 모든 문단(paragraph) 순회
         for i, para in enumerate(doc.paragraphs):
@@ -111,104 +134,83 @@ class WebRAG:
                 # 조건: 50자 미만 + '-'나 'ID'로 시작하지 않음
                 # 예: "회사구글계정", "와이파이 정보" 등
                 if len(text) < 50 and not text.startswith('-') and not text.startswith('ID') and not text.startswith('PW'):
-                    current_section = text  # 현재 섹션으로 설정
-                    
-                    # 🏷️ 섹션 제목 자체도 검색 가능하도록 저장
-                    texts.append({
-                        'id': f'section_{i}',
-                        'text': text
-                    })
+                    # 🏷️ 새 섹션(부모) 시작 - 제목 줄도 자식으로 검색 가능
+                    builder.section(f'section_{i}', text)
                 
                 # 📄 섹션 내용 처리 (섹션이 있는 경우)
-                elif current_section:
-                    # 🔗 섹션 제목 + 내용을 결합한 버전
+                elif builder.in_section:
+                    # 🔗 임베딩은 "섹션 제목 + 내용"으로 (검색에서 높은 점수)
                     # 예: "회사구글계정\n-Id : pstorm2019@gmail.com"
-                    combined_text = f"{current_section}\n{text}"
-                    texts.append({
-                        'id': f'para_{i}',
-                        'text': combined_text  # 이게 검색에서 높은 점수를 받을 것
-                    })
-                    
-                    # 📝 원본 내용도 별도 저장 (다양한 검색 패턴 지원)
-                    texts.append({
-                        'id': f'original_{i}',
-                        'text': text
-                    })
+                    # 저장은 부모 섹션 본문에 한 번만 (예전처럼 para_/original_ 두 벌 저장하지 않음)
+                    builder.line(text)
                 
-                # 📄 섹션이 없는 독립적인 내용
+                # 📄 섹션이 없는 독립적인 내용 (자기 자신이 부모이자 자식)
                 else:
-                    texts.append({
-                        'id': f'para_{i}',
-                        'text': text
-                    })
+                    builder.standalone(f'para_{i}', text)
         
-        return texts
+        return builder.build()
     
-    def add_documents(self, texts):
+    def add_documents(self, parents, children):
         """
         📚 처리된 문서들을 벡터 데이터베이스에 추가
         
         Args:
-            texts (list): load_word_file()에서 반환된 텍스트 리스트
+            parents (list): load_word_file()에서 반환된 섹션(부모) 목록
+            children (list): load_word_file()에서 반환된 줄(자식) 목록
             
         Returns:
-            int: 추가된 문서 개수
+            int: 추가된 섹션 개수
             
         과정:
-        1. 기존 데이터 삭제 (깔끔한 업데이트)
-        2. 텍스트를 ChromaDB에 추가
-        3. ChromaDB가 자동으로 벡터화 수행
+        1. 자식 줄만 임베딩 모델로 벡터화 (부모는 자식 벡터 평균 → 추가 임베딩 없음)
+        2. 새 버전 컬렉션을 만들어 부모 본문 + 자식 위치 저장 (기존 버전은 그대로 검색 중)
+        3. 다 채워지면 별칭을 새 버전으로 교체, 기존 버전은 진행 중인 검색이 끝난 뒤 삭제
         """
         
-        try:
-            # 🗑️ 기존 컬렉션 삭제 (새로운 데이터로 완전 교체)
-            st.session_state.client.delete_collection("web_company_info")
-            # 🆕 새 컬렉션 생성
-            st.session_state.collection = st.session_state.client.create_collection("web_company_info")
-        except:
-            # 🤷‍♂️ 컬렉션이 없으면 에러 무시 (처음 실행할 때)
-            pass
-        
-        # 📄 데이터 분리: 텍스트 내용과 ID를 각각 리스트로
-        documents = [item['text'] for item in texts]  # 실제 텍스트 내용들
-        ids = [item['id'] for item in texts]          # 각 텍스트의 고유 식별자
+        # 📄 Chroma에 넣을 형태로 변환 (자식 문서는 빈 문자열, 메타데이터에 부모 ID와 위치)
+        documents, ids, metadatas, embeddings = index_records(
+            parents, children,
+            lambda texts: self.model.encode(texts, normalize_embeddings=True)
+        )
         
-        # 🏗️ 벡터 데이터베이스에 추가
-        # ChromaDB가 documents를 자동으로 임베딩(벡터화)해서 저장
-        st.session_state.collection.add(
-            documents=documents,  # 📝 텍스트들 (자동으로 벡터로 변환됨)
-            ids=ids              # 🆔 각 텍스트의 고유 ID
+        # 🏗️ 새 버전으로 벡터 데이터베이스 구축 후 🔀 교체
+        self.index.build(
+            documents,               # 📝 부모 섹션 본문 (자식은 빈 문자열)
+            ids,                     # 🆔 각 레코드의 고유 ID
+            metadatas,               # 🏷️ 부모/자식 구분, 자식 → 부모 포인터
+            embeddings=embeddings    # 🔢 직접 계산한 벡터
         )
         
-        return len(documents)  # 📊 추가된 문서 개수 반환
+        return len(parents)  # 📊 추가된 섹션 개수 반환
     
     def search(self, query, top_k=5):
         """
-        🔍 질문과 유사한 문서 조각들을 찾기
+        🔍 질문과 유사한 섹션들을 찾기
         
         Args:
             query (str): 사용자 질문 ("회사구글계정은?")
             top_k (int): 반환할 최대 결과 개수 (기본 5개)
             
         Returns:
-            list: 유사도 순으로 정렬된 문서 조각들
+            list: 유사도 순으로 정렬된 섹션 본문들 (중복 없음)
             
         벡터 검색 과정:
         1. 질문을 벡터로 변환: "회사구글계정" → [0.1, 0.5, -0.3, ...]
-        2. DB의 모든 문서 벡터와 유사도 계산 (코사인 유사도)
-        3. 가장 유사한 top_k개 문서 반환
+        2. DB의 자식 줄 벡터와 유사도 계산
+        3. 걸린 줄들의 부모 섹션을 중복 없이 top_k개 반환
+           (같은 섹션의 줄이 여러 개 걸려도 섹션은 한 번만)
         """
         
+        # 🔢 질문 벡터화 (저장할 때와 같은 모델)
+        query_embedding = self.model.encode([query], normalize_embeddings=True)[0]
+        
         # 🔍 ChromaDB에서 검색 수행
-        results = st.session_state.collection.query(
-            query_texts=[query],      # 🔍 검색할 질문 (리스트 형태로 전달)
-            n_results=top_k          # 📊 반환할 결과 개수
-        )
+        # reading() 동안은 이 버전이 삭제되지 않음 (검색 중에 교체되어도 안전)
+        with self.index.reading() as collection:
+            hits = search_parents(collection, query_embedding, top_k)
         
-        # 📄 검색 결과가 있으면 문서들 반환
-        if results['documents'][0]:
-            return results['documents'][0]  # 첫 번째 쿼리의 결과 문서들
-        return []                          # 🚫 결과 없으면 빈 리스트
+        # 📄 섹션 본문만 반환 (결과 없으면 빈 리스트)
+        return [document for document, _, _ in hits]
     
     def generate_smart_answer(self, question, context_docs):
         """
@@ -357,11 +359,11 @@ def main():
         # 💫 로딩 스피너 표시
         with st.spinner(f'📖 {file_path} 파일 읽는 중...'):
             # 📖 Word 파일 읽기 및 처리
-            texts = rag.load_word_file(file_path)
+            parents, children = rag.load_word_file(file_path)
             
-            if texts:
+            if children:
                 # 🏗️ 벡터 DB에 추가
-                doc_count = rag.add_documents(texts)
+                doc_count = rag.add_documents(parents, children)
                 st.sidebar.success(f'✅ {doc_count}개 정보 로드 완료!')
                 st.session_state.docs_loaded = True  # 로드 완료 상태 저장
             else:
@@ -384,6 +386,11 @@ def main():
     else:
         st.sidebar.info("📋 스마트 템플릿 모드")
     
+    # 🧠 메모리 사용량 (세션별이 아니라 프로세스 전체 기준)
+    # 모델과 DB는 모든 세션이 공유하므로 세션이 늘어도 거의 늘지 않음
+    report = memory_report()
+    st.sidebar.caption(f"프로세스 메모리 {report['rss_mb']:.0f}MB · 활성 세션 {report['sessions']}개")
+    
     # 💬 메인 채팅 영역
     st.header("💬 질문하기")
     
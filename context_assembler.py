@@ -0,0 +1,178 @@
+# context_assembler.py - 토큰 예산 기반 컨텍스트 조립 (중복/포함 청크 제거)
+#
+# 사용법 (질문 로그의 프롬프트 토큰 절감 측정):
+#   python context_assembler.py [questions.txt]
+#   python context_assembler.py --retrieval keyword   # 임베딩 모델을 받을 수 없을 때
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken이 없으면 근사치 사용
+    _encoding = None
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[가-힣]|[^\sA-Za-z\d가-힣]")
+
+
+def count_tokens(text):
+    """프롬프트 토큰 수 (tiktoken이 없으면 단어/한글 음절/기호 단위 근사)"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _lines(text):
+    return {line.strip() for line in text.split('\n') if line.strip()}
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _is_redundant(text, kept, overlap_threshold):
+    """이미 선택된 청크에 포함되거나 줄 단위로 대부분 겹치면 중복"""
+    normalized = _normalize(text)
+    lines = _lines(text)
+    for other in kept:
+        if normalized in other['normalized']:
+            return True
+        if lines and len(lines & other['lines']) / len(lines) >= overlap_threshold:
+            return True
+    return False
+
+
+class AssembledContext:
+    """조립 결과 (선택된 청크와 토큰 수)"""
+
+    def __init__(self, chunks, tokens_used, tokens_raw, dropped_duplicates, dropped_budget):
+        self.chunks = chunks
+        self.tokens_used = tokens_used
+        self.tokens_raw = tokens_raw
+        self.dropped_duplicates = dropped_duplicates
+        self.dropped_budget = dropped_budget
+
+    @property
+    def tokens_saved(self):
+        return self.tokens_raw - self.tokens_used
+
+
+def assemble_context(chunks, scores=None, token_budget=1500, overlap_threshold=0.8):
+    """점수 순으로 정렬하고, 포함/중복 청크를 빼고, 토큰 예산만큼 채우기
+
+    큰 청크(예: complete_section)가 작은 청크(item)를 포함하면 큰 쪽을 남깁니다.
+    """
+    if scores is None:
+        scores = [-i for i in range(len(chunks))]  # 입력 순서가 곧 순위
+    ranked = sorted(zip(chunks, scores), key=lambda pair: pair[1], reverse=True)
+    tokens_raw = sum(count_tokens(text) for text in chunks)
+
+    # 긴 청크가 짧은 청크를 포함하는 경우 긴 청크를 그 자리에 대신 사용
+    candidates = []
+    for text, score in ranked:
+        normalized = _normalize(text)
+        candidates.append({'text': text, 'normalized': normalized, 'lines': _lines(text), 'score': score})
+    for candidate in candidates:
+        for other in candidates:
+            if other is not candidate and len(other['normalized']) > len(candidate['normalized']) \
+                    and candidate['normalized'] in other['normalized']:
+                candidate['container'] = other
+                break
+
+    kept = []
+    tokens_used = 0
+    dropped_duplicates = 0
+    dropped_budget = 0
+
+    for candidate in candidates:
+        chosen = candidate.get('container', candidate)
+        if _is_redundant(chosen['text'], kept, overlap_threshold):
+            dropped_duplicates += 1
+            continue
+        tokens = count_tokens(chosen['text'])
+        if tokens_used + tokens > token_budget:
+            # 포함하는 큰 청크가 예산을 넘으면 원래 작은 청크라도 시도
+            if chosen is not candidate and tokens_used + count_tokens(candidate['text']) <= token_budget \
+                    and not _is_redundant(candidate['text'], kept, overlap_threshold):
+                chosen = candidate
+                tokens = count_tokens(candidate['text'])
+            else:
+                dropped_budget += 1
+                continue
+        kept.append(chosen)
+        tokens_used += tokens
+
+    return AssembledContext([item['text'] for item in kept], tokens_used, tokens_raw,
+                            dropped_duplicates, dropped_budget)
+
+
+def report_savings(queries, retrieve, token_budget=1500):
+    """질문 로그에 대해 조립 전후 프롬프트 토큰 비교
+
+    retrieve(query) -> (chunks, scores)
+    """
+    raw_total = 0
+    used_total = 0
+    for query in queries:
+        chunks, scores = retrieve(query)
+        assembled = assemble_context(chunks, scores, token_budget=token_budget)
+        raw_total += assembled.tokens_raw
+        used_total += assembled.tokens_used
+    n = max(len(queries), 1)
+    return {
+        'queries': len(queries),
+        'avg_tokens_raw': raw_total / n,
+        'avg_tokens_used': used_total / n,
+        'saved_ratio': 1 - used_total / raw_total if raw_total else 0.0,
+    }
+
+
+def main():
+    import argparse
+    from streamlit_app import ImprovedRAG
+
+    parser = argparse.ArgumentParser(description="컨텍스트 조립 토큰 절감 측정")
+    parser.add_argument('query_log', nargs='?', help="질문 로그 파일 (한 줄에 하나, 없으면 기본 질문)")
+    parser.add_argument('--retrieval', choices=['embedding', 'keyword'], default='embedding',
+                        help="자식 검색 방식 (keyword는 임베딩 모델 없이 질문 단어 포함 비율로 검색)")
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    print("🚀 컨텍스트 조립 토큰 절감 측정 시작!\n")
+
+    if args.query_log:
+        with open(args.query_log, encoding='utf-8') as file:
+            queries = [line.strip() for line in file if line.strip()]
+    else:
+        queries = ["adobe 계정 정보", "gmail 비밀번호", "와이파이 정보", "와이파이 비번", "구글 계정", "프린터"]
+
+    # ImprovedRAG 방식(줄 단위 자식 검색 → 섹션 부모 반환)으로 인덱싱
+    # Streamlit 세션 초기화 없이 파서만 사용
+    parents, children = object.__new__(ImprovedRAG).load_word_file("pstorm_pw.docx")
+    sections = {parent['id']: parent['text'] for parent in parents}
+
+    if args.retrieval == 'keyword':
+        def retrieve(query):
+            terms = query.lower().split()
+            scored = [(sum(term in child['text'].lower() for term in terms) / len(terms), child['parent'])
+                      for child in children]
+            top = sorted((hit for hit in scored if hit[0] > 0), key=lambda hit: -hit[0])[:args.top_k]
+            return [sections[parent] for _, parent in top], [score for score, _ in top]
+    else:
+        import chromadb
+        collection = chromadb.EphemeralClient().create_collection("assembler_report")
+        collection.add(documents=[c['text'] for c in children], ids=[c['id'] for c in children],
+                       metadatas=[{'parent': c['parent']} for c in children])
+
+        def retrieve(query):
+            results = collection.query(query_texts=[query], n_results=args.top_k)
+            return ([sections[metadata['parent']] for metadata in results['metadatas'][0]],
+                    [1 - d / 2 for d in results['distances'][0]])
+
+    report = report_savings(queries, retrieve)
+    print(f"📋 질문 {report['queries']}개 ({args.retrieval} 검색, 자식 top-{args.top_k})")
+    print(f"📏 평균 프롬프트 토큰: {report['avg_tokens_raw']:.0f} → {report['avg_tokens_used']:.0f}")
+    print(f"💰 절감률: {report['saved_ratio']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# conversation_memory.py - 크기가 제한된 대화 기록 (후속 질문 재작성 + 오래된 대화 요약)
+import re
+
+from context_assembler import count_tokens
+
+# 앞 대화를 가리키는 후속 질문 표시
+FOLLOW_UP_MARKERS = re.compile(
+    r"^(그럼|그러면|그건|그거|그것|거기|그리고|또|이거|저거|아까|방금|그\s)|"
+    r"^(what about|how about|and\b|also\b)|\b(it|that|those)\b",
+    re.IGNORECASE
+)
+# "비밀번호는?" 처럼 주어 없이 짧게 끝나는 질문
+SHORT_FOLLOW_UP = re.compile(r"^\S+\s?\S*(은|는|도|이랑|하고)\s*\??$")
+# 주제(서비스/대상) 없이 속성만 묻는 말과 지시어 - 이것만 있는 질문은 앞 대화 주제가 필요
+GENERIC_TERMS = {
+    '그럼', '그러면', '그건', '그거', '그것', '거기', '그리고', '또', '이거', '저거', '아까', '방금', '그',
+    '비밀번호', '비번', '패스워드', '암호', '계정', '아이디', '정보', '주소', '연락처', '번호', '이메일', '메일',
+    '로그인', '접속', '관리자', '뭐야', '뭐예요', '뭔가요', '알려줘', '알려주세요', '어떻게', '어디',
+    'id', 'pw', 'password', 'account', 'login', 'email', 'url', 'info', 'what', 'about', 'how', 'and', 'also',
+    'it', 'that', 'those', 'is', 'are', 'the', 'for', 'its', 'of', 'please',
+}
+PARTICLES = re.compile(r"(은|는|이|가|을|를|도|의|이랑|하고|요|이야|야)$")
+TERM = re.compile(r"[\w@.]+")
+
+
+def topic_terms(query):
+    """질문의 주제어 목록 (속성/지시어는 제외, 조사 제거)"""
+    terms = []
+    for term in TERM.findall(query.lower()):
+        term = term if term in GENERIC_TERMS else PARTICLES.sub('', term)
+        if term and term not in GENERIC_TERMS:
+            terms.append(term)
+    return terms
+
+
+def has_own_topic(query):
+    """질문에 속성/지시어가 아닌 자기 주제어가 있는지 (예: 'gmail 비밀번호는?' → True, '그럼 비밀번호는?' → False)"""
+    return bool(topic_terms(query))
+
+
+def is_follow_up(query):
+    """앞 대화 없이는 의미가 불완전한 질문인지 (후속 질문 형태이면서 자기 주제어가 없을 때만)"""
+    query = query.strip()
+    return bool(FOLLOW_UP_MARKERS.search(query) or SHORT_FOLLOW_UP.match(query)) and not has_own_topic(query)
+
+
+def _truncate(text, token_budget):
+    """토큰 예산에 맞게 앞부분만 남김"""
+    if count_tokens(text) <= token_budget:
+        return text
+    words = text[:token_budget * 4].split()  # 긴 답변은 먼저 대략 잘라서 계산량 제한
+    while words and count_tokens(' '.join(words)) > token_budget:
+        words.pop()
+    return ' '.join(words) + ' ...'
+
+
+class ConversationMemory:
+    """세션 대화 기록
+
+    - max_messages: 보관할 최근 메시지 수 (넘치면 오래된 대화를 요약으로 압축)
+    - keep_references: 참고 문서를 유지할 최근 메시지 수
+    - history_tokens: 프롬프트에 넣을 대화 기록 토큰 예산
+    - summary_tokens: 요약 토큰 상한
+    """
+
+    def __init__(self, max_messages=20, keep_references=6, history_tokens=300, summary_tokens=200):
+        self.max_messages = max_messages
+        self.keep_references = keep_references
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.messages = []
+        self.summary_lines = []
+
+    @property
+    def summary(self):
+        return '\n'.join(self.summary_lines)
+
+    def last_topic(self):
+        """주제어가 있는 가장 최근 사용자 질문 원문 (재작성된 질문은 쓰지 않아서 주제가 쌓이지 않음)"""
+        for message in reversed(self.messages):
+            if message['role'] == 'user' and not is_follow_up(message['content']):
+                return message['content']
+        return None
+
+    def rewrite(self, query):
+        """후속 질문이면 직전 질문 주제를 붙여 검색용 질문으로 재작성"""
+        if not is_follow_up(query):
+            return query
+        topic = self.last_topic()
+        if not topic:
+            return query
+        budget = max(self.history_tokens // 4, count_tokens(query) + 1)
+        return _truncate(f"{topic} {query}", budget)
+
+    def context_for(self, query):
+        """질문을 해석하는 데 쓰인 앞 대화 주제 (후속 질문이 아니면 '', 답변 캐시 키에 사용)"""
+        if not is_follow_up(query):
+            return ''
+        return self.last_topic() or ''
+
+    def add(self, role, content, **extra):
+        """메시지 추가 후 크기 제한 적용"""
+        self.messages.append({'role': role, 'content': content, **extra})
+        self._compact()
+
+    def _compact(self):
+        # 오래된 메시지의 참고 문서는 버림
+        for message in self.messages[:-self.keep_references]:
+            message.pop('references', None)
+
+        # 넘치는 대화는 한 줄 요약으로 압축
+        while len(self.messages) > self.max_messages:
+            message = self.messages.pop(0)
+            first_line = message['content'].strip().split('\n')[0]
+            prefix = 'Q' if message['role'] == 'user' else 'A'
+            self.summary_lines.append(f"{prefix}: {_truncate(first_line, 30)}")
+
+        while self.summary_lines and count_tokens(self.summary) > self.summary_tokens:
+            self.summary_lines.pop(0)
+
+    def history_text(self, token_budget=None):
+        """프롬프트용 대화 기록 (최근 대화 우선, 남는 예산만큼 요약)"""
+        token_budget = token_budget or self.history_tokens
+        used = 0
+
+        recent = []
+        for message in reversed(self.messages):
+            line = f"{'User' if message['role'] == 'user' else 'Assistant'}: {_truncate(message['content'], 80)}"
+            tokens = count_tokens(line)
+            if used + tokens > token_budget:
+                break
+            recent.append(line)
+            used += tokens
+
+        summary = []
+        for line in reversed(self.summary_lines):
+            tokens = count_tokens(line)
+            if used + tokens > token_budget:
+                break
+            summary.append(line)
+            used += tokens
+
+        parts = []
+        if summary:
+            parts.append("Earlier:\n" + '\n'.join(reversed(summary)))
+        if recent:
+            parts.append('\n'.join(reversed(recent)))
+        return '\n\n'.join(parts)
+
+    def clear(self):
+        self.messages = []
+        self.summary_lines = []
@@ -0,0 +1,187 @@
+# credential_extractor.py - 문서 수집 시점에 계정 정보(ID/PW/주소)를 구조화된 레코드로 추출
+# 질문 시점에는 줄 단위 검사 없이 사전 조회 + 포맷팅만 수행
+import re
+
+SECTION_TITLE = re.compile(r"^\*{0,2}\s*\d+\.\s*(?P<title>.+?)\s*\*{0,2}$")
+INLINE_FIELD = re.compile(r"\(\d+\)\s*")                     # "(1) ID: ... (2) PW: ..."
+FIELD = re.compile(r"^(?P<label>[^:：]{1,30}?)\s*[:：]\s*(?P<value>.+)$")
+PAIR = re.compile(r"^(?P<label>[^:：]{1,30}?)\s*[:：]\s*(?P<id>\S+@\s*\S+)\s*/\s*(?P<pw>\S+)$")  # "팀: id / pw"
+
+PASSWORD_LABEL = re.compile(r"(?i)\bpw\b|password|passwd|비밀번호|비번|패스워드")
+ID_LABEL = re.compile(r"(?i)\bid\b|아이디|계정명|계정")
+HOST_LABEL = re.compile(r"(?i)주소|url|도메인|workspace|ssid|\bip\b|host|서버")
+
+TOKEN = re.compile(r"[a-z0-9]+|[가-힣]+")
+# 검색 키에서 제외할 일반 단어
+STOPWORDS = {'계정', '정보', '알려줘', '뭐야', '비밀번호', '비번', '아이디', 'id', 'pw', 'password',
+             '로그인', '주소', '관리자', '공용', '회사', '서비스', 'the', 'and'}
+# 한글/별칭 → 대표 키
+ALIASES = {
+    '어도비': 'adobe', '구글': 'google', 'gmail': 'google', '지메일': 'google',
+    '와이파이': 'wifi', '무선': 'wifi', '인터넷': 'wifi',
+    '캔바': 'canva', '슬랙': 'slack', '노션': 'notion', '줌': 'zoom', '화상회의': 'zoom',
+    '드롭박스': 'dropbox', '인스타': 'instagram', '인스타그램': 'instagram', '티스토리': 'tistory',
+    '블로그': 'tistory', '가비아': 'gabia', '원티드': 'wanted', '채용': 'wanted', '위하고': 'wehago',
+    '세무': 'wehago', '회계': 'wehago', '오피스': 'office', '그룹웨어': 'works',
+}
+
+
+class CredentialRecord:
+    """서비스 하나의 계정 정보"""
+
+    def __init__(self, service, section):
+        self.service = service
+        self.section = section
+        self.account_id = None
+        self.password = None
+        self.host = None
+        self.notes = []
+        self.fields = []   # 원문 라벨 그대로 (label, value) - 답변 표시용
+
+    def add(self, label, value):
+        value = re.sub(r"@\s+", "@", value.strip())
+        if PASSWORD_LABEL.search(label):
+            self.password = self.password or value
+        elif ID_LABEL.search(label):
+            self.account_id = self.account_id or value
+        elif HOST_LABEL.search(label):
+            self.host = self.host or value
+        else:
+            self.notes.append(f"{label}: {value}")
+        self.fields.append((label, value))
+
+    def __bool__(self):
+        return bool(self.fields)
+
+    def keys(self):
+        """사전 조회 키 (서비스명과 섹션 제목의 단어)"""
+        keys = set()
+        for token in TOKEN.findall(f"{self.service} {self.section}".lower()):
+            token = ALIASES.get(token, token)
+            if token not in STOPWORDS and len(token) > 1:
+                keys.add(token)
+        return keys
+
+    def to_dict(self):
+        return {
+            'service': self.service,
+            'section': self.section,
+            'account_id': self.account_id,
+            'password': self.password,
+            'host': self.host,
+            'notes': list(self.notes),
+        }
+
+
+def _parse_fields(text):
+    """한 줄에서 (라벨, 값) 목록 추출 ("(1) ID: a (2) PW: b" 형식 포함)"""
+    fields = []
+    for part in INLINE_FIELD.split(text):
+        match = FIELD.match(part.strip())
+        if match:
+            fields.append((match.group('label').strip(), match.group('value')))
+    return fields
+
+
+def extract_records(lines):
+    """문단 목록을 섹션 단위로 나눠 CredentialRecord 목록 생성"""
+    records = []
+    section = None
+    section_record = None
+
+    def flush():
+        if section_record:
+            records.append(section_record)
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        title = SECTION_TITLE.match(line)
+        if title:
+            flush()
+            section = title.group('title')
+            section_record = CredentialRecord(section, section)
+            continue
+        if section is None:
+            continue
+
+        # "콘텐츠팀: id / pw" - 팀별 계정
+        pair = PAIR.match(line)
+        if pair:
+            record = CredentialRecord(f"{section} - {pair.group('label').strip()}", section)
+            record.add('ID', pair.group('id'))
+            record.add('PW', pair.group('pw'))
+            records.append(record)
+            continue
+
+        # "서비스명 (1) ID: ... (2) PW: ..." - 한 줄에 서비스 하나
+        parts = INLINE_FIELD.split(line)
+        if len(parts) > 2 and parts[0].strip():
+            record = CredentialRecord(parts[0].strip(), section)
+            for label, value in _parse_fields(line):
+                record.add(label, value)
+            if record:
+                records.append(record)
+                continue
+
+        # "ID: ..." - 섹션 전체에 속한 필드
+        fields = _parse_fields(line)
+        if fields:
+            for label, value in fields:
+                section_record.add(label, value)
+        else:
+            section_record.notes.append(line)
+
+    flush()
+    return records
+
+
+class CredentialIndex:
+    """키워드 → 레코드 사전 (수집 시 한 번 구축)"""
+
+    def __init__(self, records):
+        self.records = list(records)
+        self._by_key = {}
+        for position, record in enumerate(self.records):
+            for key in record.keys():
+                self._by_key.setdefault(key, []).append(position)
+
+    @classmethod
+    def from_texts(cls, texts):
+        """ImprovedRAG 수집 결과에서 완전한 섹션만 사용해 구축"""
+        lines = []
+        for item in texts:
+            if item.get('type') == 'complete_section':
+                first, _, rest = item['text'].partition('\n')
+                # "**제목**" 형식은 번호가 없으므로 제목임을 표시
+                lines.append(first if SECTION_TITLE.match(first) else f"0. {first}")
+                lines.extend(rest.split('\n'))
+        return cls(extract_records(lines))
+
+    def lookup(self, question):
+        """질문 단어와 가장 많이 겹치는 레코드 목록 (없으면 빈 목록)"""
+        hits = {}
+        for token in TOKEN.findall(question.lower()):
+            token = ALIASES.get(token, token)
+            for position in self._by_key.get(token, ()):
+                hits[position] = hits.get(position, 0) + 1
+        if not hits:
+            return []
+        best = max(hits.values())
+        return [self.records[position] for position in sorted(hits) if hits[position] == best]
+
+    def __len__(self):
+        return len(self.records)
+
+
+def format_records(records):
+    """레코드를 답변 텍스트로 포맷팅"""
+    blocks = []
+    for record in records:
+        lines = [f"🔐 **{record.service}**"]
+        lines.extend(f"- {label}: {value}" for label, value in record.fields)
+        lines.extend(f"- {note}" for note in record.notes if ':' not in note)
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks)
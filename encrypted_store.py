@@ -0,0 +1,193 @@
+# encrypted_store.py - 청크 본문 AES-GCM 암호화 (임베딩과 메타데이터는 평문으로 두고 검색)
+# 본문은 최종 상위 k개를 화면/LLM에 넘길 때만 복호화하므로 검색 비용은 거의 그대로
+#
+# 키: 환경변수 RAG_STORE_KEY (urlsafe base64, 32바이트) 또는 ./.rag_store.key (없으면 생성, 권한 600)
+# 끄기: RAG_ENCRYPT=0 / cryptography 미설치 시 자동으로 평문 저장
+#
+# 사용법 (질문당 복호화 오버헤드 측정):
+#   python encrypted_store.py --chunks 10000 --top-k 3 10
+import argparse
+import base64
+import os
+import threading
+import time
+
+from semantic_cache import chunk_hash
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pip install cryptography
+    AESGCM = None
+
+KEY_PATH = "./.rag_store.key"
+PREFIX = "gcm1:"
+NONCE_BYTES = 12
+
+
+def load_key(path=KEY_PATH):
+    """암호화 키 (환경변수 우선, 없으면 키 파일을 읽거나 새로 생성)"""
+    env_key = os.environ.get('RAG_STORE_KEY')
+    if env_key:
+        return base64.urlsafe_b64decode(env_key)
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            return base64.urlsafe_b64decode(file.read().strip())
+    key = AESGCM.generate_key(bit_length=256)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_key(path)  # 다른 프로세스가 먼저 생성
+    with os.fdopen(fd, 'wb') as file:
+        file.write(base64.urlsafe_b64encode(key))
+    return key
+
+
+def is_sealed(value):
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+class ChunkSealer:
+    """청크 본문 암호화/복호화 (청크 ID를 AAD로 묶어서 다른 청크 자리로 옮기면 복호화 실패)"""
+
+    def __init__(self, key):
+        self.aead = AESGCM(key)
+        self.opened = 0  # 복호화 횟수 (검색당 몇 개를 풀었는지 확인용)
+
+    def seal_bytes(self, text, chunk_id):
+        """nonce + 암호문 바이트 (열 저장소 버퍼용)"""
+        nonce = os.urandom(NONCE_BYTES)
+        return nonce + self.aead.encrypt(nonce, text.encode('utf-8'), str(chunk_id).encode('utf-8'))
+
+    def open_bytes(self, data, chunk_id):
+        self.opened += 1
+        return self.aead.decrypt(data[:NONCE_BYTES], data[NONCE_BYTES:], str(chunk_id).encode('utf-8')).decode('utf-8')
+
+    def seal(self, text, chunk_id):
+        return PREFIX + base64.b64encode(self.seal_bytes(text, chunk_id)).decode('ascii')
+
+    def open(self, token, chunk_id):
+        """봉인된 본문 복호화 (평문이면 그대로 반환)"""
+        if not is_sealed(token):
+            return token
+        return self.open_bytes(base64.b64decode(token[len(PREFIX):]), chunk_id)
+
+
+class SealedChunk(dict):
+    """본문이 암호화된 청크 dict
+
+    doc['text']에 접근할 때마다 복호화하고 평문은 보관하지 않습니다.
+    'hash'에는 평문 기준 chunk_hash를 미리 저장해서 캐시 무효화에 복호화가 필요 없게 합니다.
+    """
+
+    def __init__(self, data, sealer):
+        super().__init__(data)
+        self.sealer = sealer
+
+    def __getitem__(self, key):
+        if key == 'text' and not dict.__contains__(self, 'text'):
+            return self.sealer.open(dict.__getitem__(self, 'sealed'), dict.__getitem__(self, 'id'))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        return key == 'text' or super().__contains__(key)
+
+
+def seal_documents(documents, sealer=None):
+    """청크 목록의 본문 암호화 (이미 암호화된 청크는 그대로, 암호화가 꺼져 있으면 원본 반환)"""
+    sealer = sealer or get_sealer()
+    if sealer is None:
+        return documents
+    sealed = []
+    for doc in documents:
+        if isinstance(doc, SealedChunk):
+            sealed.append(doc)
+        elif 'sealed' in doc:
+            sealed.append(SealedChunk(doc, sealer))  # 작업 결과 파일 등에서 읽은 암호화 청크
+        else:
+            data = {key: value for key, value in doc.items() if key != 'text'}
+            data['sealed'] = sealer.seal(doc['text'], doc['id'])
+            data['hash'] = chunk_hash(doc['text'])
+            sealed.append(SealedChunk(data, sealer))
+    return sealed
+
+
+def document_hash(doc):
+    """청크 해시 (암호화된 청크는 저장된 값 사용)"""
+    return doc.get('hash') or chunk_hash(doc['text'])
+
+
+_sealer = None
+_sealer_lock = threading.Lock()
+
+
+def get_sealer():
+    """프로세스 공유 ChunkSealer, 암호화를 쓸 수 없으면 None"""
+    global _sealer
+    if AESGCM is None or os.environ.get('RAG_ENCRYPT', '1') == '0':
+        return None
+    with _sealer_lock:
+        if _sealer is None:
+            _sealer = ChunkSealer(load_key())
+    return _sealer
+
+
+def main():
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="청크 암호화 검색 오버헤드 측정")
+    parser.add_argument('--chunks', type=int, default=10000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, nargs='+', default=[3, 10])
+    args = parser.parse_args()
+
+    if AESGCM is None:
+        print("❌ cryptography가 설치되어 있지 않습니다 (pip install cryptography)")
+        return
+
+    print("🚀 청크 암호화 오버헤드 측정 시작!")
+    rng = np.random.default_rng(0)
+    sealer = ChunkSealer(AESGCM.generate_key(bit_length=256))
+    documents = [{'id': f"chunk_{i}", 'text': f"섹션 {i}\nID: user{i}@company.com\nPW: {rng.integers(1e9)}\n" * 8}
+                 for i in range(args.chunks)]
+
+    start = time.perf_counter()
+    sealed = seal_documents(documents, sealer)
+    seal_time = time.perf_counter() - start
+    plain_bytes = sum(len(doc['text'].encode('utf-8')) for doc in documents)
+    sealed_bytes = sum(len(dict.__getitem__(doc, 'sealed')) for doc in sealed)
+    print(f"🔒 {args.chunks}개 청크 암호화 {seal_time * 1000:.0f}ms "
+          f"({plain_bytes / 1024:.0f}KB → {sealed_bytes / 1024:.0f}KB)")
+
+    embeddings = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    start = time.perf_counter()
+    rankings = [np.argsort(embeddings @ query)[::-1] for query in queries]
+    search_us = (time.perf_counter() - start) / args.queries * 1e6
+    print(f"🔎 검색(임베딩은 평문): 질문당 {search_us:.0f}µs")
+
+    for top_k in args.top_k:
+        timings = {}
+        for name, docs in (('평문', documents), ('암호화', sealed)):
+            start = time.perf_counter()
+            for ranking in rankings:
+                [docs[i]['text'] for i in ranking[:top_k]]
+            timings[name] = (time.perf_counter() - start) / args.queries * 1e6
+        overhead = timings['암호화'] - timings['평문']
+        print(f"  📄 top-{top_k} 본문: 평문 {timings['평문']:.1f}µs, 암호화 {timings['암호화']:.1f}µs "
+              f"(+{overhead:.0f}µs/질문 = 검색 대비 {overhead / search_us:.1%}, 청크당 {overhead / top_k:.1f}µs)")
+
+    start = time.perf_counter()
+    for doc in sealed:
+        doc['text']
+    full = time.perf_counter() - start
+    print(f"📊 전체 복호화였다면 질문당 {full * 1000:.0f}ms (복호화 누적 {sealer.opened}회)")
+
+
+if __name__ == "__main__":
+    main()
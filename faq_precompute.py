@@ -0,0 +1,271 @@
+# faq_precompute.py - 자주 묻는 질문의 답변을 미리 생성해두는 배치 작업
+# 인덱스 버전이 바뀌면 다시 생성하고, 앱은 표에 있는 질문을 지연 없이 바로 답변
+#
+# 앱과 같은 검색/프롬프트(rag_pipeline)로 만들고, 앱의 코퍼스 버전(corpus_version)을 키로 저장
+# 운영자 키(RAG_FAQ_API_KEY 환경변수)로만 생성, 질문 목록은 faq_questions.txt (한 줄에 질문 하나)
+# 앱은 기본 문서/인덱스 번들 버전만 백그라운드에서 생성하고, 업로드 문서가 섞인 버전은 만들지 않음
+#
+# 사용법 (배치 작업, 앱과 같은 인덱스 번들 = RAG_INDEX_BUNDLE 또는 사이드바 "Export index bundle"):
+#   RAG_FAQ_API_KEY=... python faq_precompute.py index.ragb[,delta.ragb]
+#   RAG_FAQ_API_KEY=... python faq_precompute.py index.ragb --questions questions.txt --force
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATH = "./faq_answers.json"
+
+# README 예시 질문과 데모의 test_queries
+DEFAULT_QUESTIONS = [
+    "adobe 계정 정보",
+    "gmail 비밀번호",
+    "와이파이 정보",
+    "와이파이 비번",
+    "구글 계정",
+    "프린터",
+    "와이파이 비밀번호가 뭐야?",
+    "구글 계정 정보 알려줘",
+]
+
+
+def normalize_question(question):
+    """표 조회용 키 (대소문자, 공백, 끝 문장부호 무시)"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!.。").strip().lower()
+
+
+def load_questions(path=None):
+    """질문 목록 파일(한 줄에 하나)을 읽고, 없으면 기본 질문 반환"""
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as file:
+            return [line.strip() for line in file if line.strip()]
+    return list(DEFAULT_QUESTIONS)
+
+
+def precompute_answers(questions, answer_fn, max_workers=4):
+    """모든 질문에 대해 검색+생성을 동시에 실행
+
+    answer_fn(question) -> (answer, references)
+    실패한 질문은 결과에서 빠짐
+    """
+    def run(question):
+        try:
+            answer, references = answer_fn(question)
+            return question, answer, references, None
+        except Exception as e:
+            return question, None, None, f"{type(e).__name__}: {e}"
+
+    answers = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for question, answer, references, error in executor.map(run, questions):
+            if error or not answer or "Error generating response:" in answer:
+                errors[question] = error or "empty answer"
+                continue
+            answers[normalize_question(question)] = {
+                'question': question,
+                'answer': answer,
+                'references': list(references or []),
+            }
+    return answers, errors
+
+
+class FAQTable:
+    """인덱스 버전별 미리 생성된 답변 표 (JSON 파일)
+
+    - max_versions: 보관할 인덱스 버전 수 (오래된 버전부터 제거)
+    - sealer: ChunkSealer가 있으면 답변과 참고 청크를 봉인해서 저장 (질문만 평문)
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_versions=3, sealer=None):
+        self.path = path
+        self.sealer = sealer
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._building = set()
+        self._mtime = None
+        self._tables = self._load()
+        if sealer is not None:
+            # 암호화를 켜기 전에 평문으로 저장된 표는 지움
+            plain = [version for version, table in self._tables.items()
+                     if any('sealed' not in entry for entry in table['answers'].values())]
+            for version in plain:
+                del self._tables[version]
+            if plain:
+                self._save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            self._mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file).get('versions', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _refresh(self):
+        """다른 프로세스(배치 작업)가 파일을 바꿨으면 다시 읽기"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._tables = self._load()
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'versions': self._tables}, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def lookup(self, question, version):
+        """현재 인덱스 버전에 대해 미리 생성된 답변 반환, 없으면 None"""
+        with self._lock:
+            self._refresh()
+        table = self._tables.get(version)
+        if table is None:
+            return None
+        key = normalize_question(question)
+        entry = table['answers'].get(key)
+        if entry is None:
+            return None
+        if 'sealed' in entry:
+            if self.sealer is None:
+                return None
+            try:
+                answer, references = json.loads(self.sealer.open(entry['sealed'], f"{version}/{key}"))
+            except Exception:
+                return None  # 다른 키로 봉인된 표
+            return answer, list(references)
+        if self.sealer is not None:
+            return None  # 암호화를 켜기 전에 평문으로 저장된 표는 사용하지 않음
+        return entry['answer'], list(entry['references'])
+
+    def _seal(self, version, answers):
+        """답변과 참고 청크를 한 덩어리로 봉인 (버전/질문을 AAD로 묶음)"""
+        if self.sealer is None:
+            return answers
+        return {key: {'question': entry['question'],
+                      'sealed': self.sealer.seal(json.dumps([entry['answer'], entry['references']], ensure_ascii=False),
+                                                 f"{version}/{key}")}
+                for key, entry in answers.items()}
+
+    def has_version(self, version):
+        with self._lock:
+            self._refresh()
+        return version in self._tables
+
+    def is_building(self, version):
+        return version in self._building
+
+    def build(self, version, questions, answer_fn, max_workers=4):
+        """질문 목록을 미리 계산해서 해당 버전의 표로 저장"""
+        started = time.time()
+        answers, errors = precompute_answers(questions, answer_fn, max_workers=max_workers)
+
+        with self._lock:
+            self._refresh()  # 그 사이 다른 프로세스가 저장한 버전을 덮어쓰지 않도록
+            self._tables[version] = {
+                'built_at': started,
+                'elapsed': time.time() - started,
+                'answers': self._seal(version, answers),
+                'errors': errors,
+            }
+            while len(self._tables) > self.max_versions:
+                oldest = min(self._tables, key=lambda v: self._tables[v]['built_at'])
+                del self._tables[oldest]
+            self._save()
+        return self._tables[version]
+
+    def ensure_fresh(self, version, questions, answer_fn, max_workers=4, background=True):
+        """해당 버전의 표가 없으면 생성 (이미 생성 중이면 무시)
+
+        background=True면 스레드에서 생성하고 바로 반환
+        """
+        with self._lock:
+            self._refresh()
+            if version is None or version in self._tables or version in self._building:
+                return False
+            self._building.add(version)
+
+        def run():
+            try:
+                self.build(version, questions, answer_fn, max_workers=max_workers)
+            finally:
+                with self._lock:
+                    self._building.discard(version)
+
+        if background:
+            threading.Thread(target=run, name='faq-precompute', daemon=True).start()
+        else:
+            run()
+        return True
+
+    def stats(self, version):
+        with self._lock:
+            self._refresh()
+        table = self._tables.get(version)
+        if table is None:
+            return {'answers': 0, 'errors': 0, 'elapsed': 0.0, 'building': self.is_building(version)}
+        return {
+            'answers': len(table['answers']),
+            'errors': len(table['errors']),
+            'elapsed': table['elapsed'],
+            'building': self.is_building(version),
+        }
+
+
+def main():
+    from encrypted_store import get_sealer
+    from index_bundle import BundleError, load_bundles, model_fingerprint
+    from mmap_embeddings import EmbeddingStore
+    from rag_pipeline import faq_answer_fn
+    from sentence_transformers import SentenceTransformer
+
+    parser = argparse.ArgumentParser(description="FAQ 답변 미리 생성 (앱과 같은 인덱스 번들 버전으로 저장)")
+    parser.add_argument('bundle', nargs='?', default=os.environ.get('RAG_INDEX_BUNDLE'),
+                        help="전체 번들[,변경분 번들...] 경로 또는 URL (기본: RAG_INDEX_BUNDLE)")
+    parser.add_argument('--questions', default="faq_questions.txt", help="질문 목록 (없으면 기본 질문)")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--force', action='store_true', help="이미 있는 버전도 다시 생성")
+    args = parser.parse_args()
+
+    api_key = os.environ.get('RAG_FAQ_API_KEY')
+    if not api_key:
+        print("❌ RAG_FAQ_API_KEY 환경변수에 운영자 Gemini API 키를 설정해주세요.")
+        raise SystemExit(1)
+    if not args.bundle:
+        print("❌ 인덱스 번들 경로를 지정해주세요 (사이드바 \"Export index bundle\" 또는 RAG_INDEX_BUNDLE).")
+        raise SystemExit(1)
+
+    print("🚀 FAQ 답변 미리 생성 시작!")
+    encoder = SentenceTransformer('all-MiniLM-L6-v2')
+    sealer = get_sealer()
+    try:
+        bundle = load_bundles([source.strip() for source in args.bundle.split(',') if source.strip()],
+                              sealer, model_fingerprint(encoder))
+    except BundleError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    table = FAQTable(sealer=sealer)
+    if table.has_version(bundle.version) and not args.force:
+        print(f"✅ 인덱스 버전 {bundle.version}의 답변이 이미 있습니다 (--force로 다시 생성)")
+        return
+
+    questions = load_questions(args.questions)
+    answer_fn = faq_answer_fn(bundle.table, EmbeddingStore(bundle.embeddings), encoder, api_key)
+    table.build(bundle.version, questions, answer_fn, max_workers=args.workers)
+
+    stats = table.stats(bundle.version)
+    print(f"📋 버전 {bundle.version}: 질문 {len(questions)}개 중 {stats['answers']}개 답변 저장 ({stats['elapsed']:.1f}s)")
+    if stats['errors']:
+        print(f"❌ 실패 {stats['errors']}개")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+# index_bundle.py - 복제본 배포용 인덱스 번들 (청크 + 임베딩 + 모델 지문 + 버전을 체크섬과 함께 파일 하나로)
+# 새 복제본은 문서를 다시 파싱/임베딩하지 않고 번들 하나만 받아서 바로 검색 시작
+# 전체(full) 번들 뒤에 변경분(delta) 번들을 이어서 적용할 수 있음
+#
+# 파일 구조 (zip, 압축 없음):
+#   manifest.json    형식/종류/코퍼스 버전/모델 지문/파일별 sha256
+#   chunks/*.npy     ChunkTable 열 (암호화된 본문은 봉인된 바이트 그대로, 키는 복제본끼리 같은 RAG_STORE_KEY 사용)
+#   embeddings.npy   정규화된 임베딩 (delta는 추가된 행만)
+#   rows.npy         delta 전용: 새 코퍼스의 각 행 = 기준 번들 행 번호 (추가된 행은 기준 행 수 + 추가 순번)
+#
+# 사용법:
+#   python index_bundle.py info index.ragb
+#   python index_bundle.py verify index.ragb delta.ragb          # 전체 + 변경분 체크섬/버전 확인
+#   python index_bundle.py delta old.ragb new.ragb -o delta.ragb  # 두 전체 번들의 차이
+#   python index_bundle.py apply old.ragb delta.ragb -o new.ragb  # 변경분을 합친 전체 번들
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from chunk_table import ChunkTable
+from mmap_embeddings import normalize
+from semantic_cache import corpus_fingerprint
+
+FORMAT = "rag-index-bundle"
+FORMAT_VERSION = 1
+FULL, DELTA = 'full', 'delta'
+CHUNK_COLUMNS = ('file_codes', 'chunk_ids', 'offsets', 'buffer', 'hashes')
+PROBE_TEXT = "회사 와이파이 비밀번호와 구글 계정 정보"
+
+
+class BundleError(Exception):
+    """번들 형식/체크섬/버전/모델이 맞지 않을 때 발생"""
+
+
+def corpus_version(table):
+    """app.py set_documents와 같은 코퍼스 버전 (청크 해시 + 순서)"""
+    return corpus_fingerprint(table.hash_strings()) if table else None
+
+
+def model_fingerprint(encoder, model_name='all-MiniLM-L6-v2'):
+    """임베딩 모델 지문 (이름, 차원, 고정 문장 임베딩) - 가중치가 다르면 번들 임베딩과 질문 임베딩이 맞지 않음"""
+    probe = normalize(encoder.encode([PROBE_TEXT]))[0]
+    return {'name': model_name, 'dim': int(probe.shape[0]), 'probe': [round(float(value), 6) for value in probe]}
+
+
+def check_model(expected, actual, min_similarity=0.999):
+    """번들 모델 지문과 현재 모델 지문 비교 (부동소수점 차이는 허용하도록 유사도로 판단)"""
+    if expected['name'] != actual['name'] or expected['dim'] != actual['dim']:
+        raise BundleError(f"임베딩 모델이 다릅니다: 번들 {expected['name']}({expected['dim']}), "
+                          f"현재 {actual['name']}({actual['dim']})")
+    similarity = float(np.dot(expected['probe'], actual['probe']))
+    if similarity < min_similarity:
+        raise BundleError(f"임베딩 모델 가중치가 다릅니다 (probe 유사도 {similarity:.4f})")
+
+
+# ----- 쓰기 -----
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _chunk_members(table):
+    columns = table.to_columns()
+    return {f"chunks/{name}.npy": _npy_bytes(columns[name]) for name in CHUNK_COLUMNS}
+
+
+def _stored(table, sealed):
+    """번들에 쓸 형식의 테이블 (평문 번들인데 봉인된 테이블이면 복호화, 봉인된 본문은 그대로)"""
+    if not sealed and table.sealer is not None:
+        return ChunkTable.from_records(table)
+    return table
+
+
+def _manifest(kind, table, model, sealed, relevance_threshold):
+    return {
+        'format': FORMAT,
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'version': corpus_version(table),
+        'rows': len(table),
+        'sealed': bool(sealed),
+        'model': model,
+        'relevance_threshold': relevance_threshold,
+        'created_at': time.time(),
+    }
+
+
+def _write(target, manifest, members):
+    """target은 경로(임시 파일에 쓴 뒤 교체) 또는 파일 객체, manifest 반환"""
+    manifest['files'] = {name: {'sha256': hashlib.sha256(data).hexdigest(), 'bytes': len(data)}
+                         for name, data in members.items()}
+
+    def dump(file):
+        with zipfile.ZipFile(file, 'w', zipfile.ZIP_STORED) as archive:
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+            for name, data in members.items():
+                archive.writestr(name, data)
+
+    if isinstance(target, (str, os.PathLike)):
+        tmp_path = f"{target}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                dump(file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    else:
+        dump(target)
+    return manifest
+
+
+def export_bundle(target, table, embeddings, model, relevance_threshold=None, sealed=None):
+    """전체 번들 쓰기 (embeddings는 ndarray 또는 EmbeddingStore, sealed는 기본적으로 table 암호화 여부)"""
+    embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+    if len(embeddings) != len(table):
+        raise BundleError(f"청크 {len(table)}개와 임베딩 {len(embeddings)}개 수가 다릅니다")
+    sealed = table.sealer is not None if sealed is None else sealed
+    manifest = _manifest(FULL, table, model, sealed, relevance_threshold)
+    table = _stored(table, sealed)
+    manifest['filenames'] = table.filenames
+    members = _chunk_members(table)
+    members['embeddings.npy'] = _npy_bytes(embeddings)
+    return _write(target, manifest, members)
+
+
+def export_delta(target, base, table, embeddings, model, relevance_threshold=None, sealed=None):
+    """base(IndexBundle) 대비 변경분 번들 쓰기 (청크는 '<파일명>_<번호>' + 평문 해시가 같으면 재사용)
+
+    새 청크는 기준 번들 파일과 같은 형식으로 씀 (평문 기준 번들을 이 복제본의 키로 봉인해 열었어도 평문으로)
+    """
+    if len(embeddings) != len(table):
+        raise BundleError(f"청크 {len(table)}개와 임베딩 {len(embeddings)}개 수가 다릅니다")
+    sealed = base.sealed if sealed is None else sealed
+    if sealed != base.sealed:
+        raise BundleError("기준 번들과 암호화 여부가 다릅니다")
+
+    known = {}
+    for i in range(len(base.table)):
+        known.setdefault((base.table.chunk_key(i), int(base.table.hashes[i])), i)
+    rows = np.empty(len(table), dtype=np.int64)
+    added = []
+    for i in range(len(table)):
+        row = known.get((table.chunk_key(i), int(table.hashes[i])))
+        if row is None:
+            row = len(base.table) + len(added)
+            added.append(i)
+        rows[i] = row
+    added = np.asarray(added, dtype=np.int64)
+    added_table = _stored(table.take(added), sealed)
+
+    manifest = _manifest(DELTA, table, model, sealed, relevance_threshold)
+    manifest.update(base_version=base.version, base_rows=len(base.table), filenames=added_table.filenames,
+                    added=len(added), removed=len(base.table) - len(np.unique(rows[rows < len(base.table)])))
+    members = _chunk_members(added_table)
+    members['embeddings.npy'] = _npy_bytes(normalize(embeddings[added]) if len(added)
+                                           else np.empty((0, model['dim']), dtype=np.float32))
+    members['rows.npy'] = _npy_bytes(rows)
+    return _write(target, manifest, members)
+
+
+# ----- 읽기 -----
+
+class IndexBundle:
+    """읽어 들인 번들 (delta를 적용한 결과도 전체 코퍼스로 보관)
+
+    table: ChunkTable, embeddings: 정규화된 임베딩 행렬, manifest: 마지막으로 적용한 파일의 manifest
+    sealed는 파일에 적힌 암호화 여부 (table은 복제본 키로 봉인되어 있을 수 있음)
+    """
+
+    def __init__(self, manifest, table, embeddings):
+        self.manifest = manifest
+        self.table = table
+        self.embeddings = embeddings
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def model(self):
+        return self.manifest['model']
+
+    @property
+    def sealed(self):
+        return self.manifest['sealed']
+
+    @property
+    def relevance_threshold(self):
+        return self.manifest.get('relevance_threshold')
+
+    def save(self, target):
+        """전체 번들로 저장 (delta를 합친 결과를 새 기준 번들로 배포할 때)"""
+        return export_bundle(target, self.table, self.embeddings, self.model, self.relevance_threshold, self.sealed)
+
+
+def _open(source):
+    """경로 또는 http(s) URL"""
+    if str(source).startswith(('http://', 'https://')):
+        import requests
+        response = requests.get(source, timeout=60)
+        response.raise_for_status()
+        return zipfile.ZipFile(io.BytesIO(response.content))
+    return zipfile.ZipFile(source)
+
+
+def _read_members(source):
+    """manifest와 체크섬을 확인한 파일 내용 {이름: 바이트}"""
+    try:
+        with _open(source) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+            if manifest.get('format') != FORMAT or manifest.get('format_version') != FORMAT_VERSION:
+                raise BundleError(f"지원하지 않는 번들 형식: {manifest.get('format')} v{manifest.get('format_version')}")
+            members = {}
+            for name, info in manifest['files'].items():
+                data = archive.read(name)
+                if len(data) != info['bytes'] or hashlib.sha256(data).hexdigest() != info['sha256']:
+                    raise BundleError(f"체크섬 불일치: {name}")
+                members[name] = data
+    except (KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise BundleError(f"번들을 읽을 수 없습니다 ({source}): {e}") from e
+    return manifest, members
+
+
+def _load_npy(data):
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def read_bundle(source, sealer=None, base=None, model=None):
+    """번들 하나 읽기 (delta면 base에 적용한 전체 코퍼스 반환)
+
+    sealer는 암호화된 번들의 본문을 읽을 때 사용, model(현재 모델 지문)이 있으면 번들 모델과 비교
+    """
+    manifest, members = _read_members(source)
+    if model is not None:
+        check_model(manifest['model'], model)
+
+    columns = {name: _load_npy(members[f"chunks/{name}.npy"]) for name in CHUNK_COLUMNS}
+    columns.update(filenames=manifest['filenames'], sealed=manifest['sealed'])
+    table = ChunkTable.from_columns(columns, sealer)
+    embeddings = _load_npy(members['embeddings.npy'])
+
+    if manifest['kind'] == DELTA:
+        if base is None:
+            raise BundleError(f"변경분 번들은 기준 버전 {manifest['base_version']}의 전체 번들 뒤에 적용해야 합니다")
+        if base.version != manifest['base_version'] or len(base.table) != manifest['base_rows']:
+            raise BundleError(f"변경분의 기준 버전 {manifest['base_version']}과 현재 버전 {base.version}이 다릅니다")
+        if base.sealed != manifest['sealed']:
+            raise BundleError("기준 번들과 암호화 여부가 다릅니다")
+        check_model(base.model, manifest['model'])
+        rows = _load_npy(members['rows.npy'])
+        table = ChunkTable.concat([base.table, table]).take(rows)
+        embeddings = np.concatenate([np.asarray(base.embeddings, dtype=np.float32), embeddings])[rows]
+    elif base is not None:
+        raise BundleError("전체 번들 뒤에는 변경분 번들만 이어서 적용할 수 있습니다")
+
+    if len(embeddings) != len(table) or corpus_version(table) != manifest['version']:
+        raise BundleError(f"번들 내용이 버전 {manifest['version']}과 맞지 않습니다")
+    return IndexBundle(manifest, table, embeddings)
+
+
+def load_bundles(sources, sealer=None, model=None):
+    """전체 번들 + 변경분 번들을 순서대로 적용 (첫 번째는 전체 번들)
+
+    암호화된 번들은 sealer로 첫 청크를 복호화해 보고 키가 다르면 BundleError,
+    평문 번들을 암호화가 켜진 복제본에서 열면 본문을 이 복제본의 키로 봉인
+    (manifest의 sealed는 그대로 두어 이 번들 기준의 변경분도 평문으로 내보냄)
+    """
+    if not sources:
+        raise BundleError("번들 경로가 없습니다")
+    bundle = None
+    for source in sources:
+        bundle = read_bundle(source, sealer, base=bundle, model=model)
+
+    if bundle.sealed:
+        if sealer is None:
+            raise BundleError("암호화된 번들입니다 (같은 RAG_STORE_KEY와 cryptography 필요)")
+        if bundle.table:
+            try:
+                bundle.table.text(0)
+            except Exception as e:
+                raise BundleError("번들 암호화 키가 이 복제본의 키와 다릅니다") from e
+    elif sealer is not None:
+        bundle.table = ChunkTable.from_records(bundle.table, sealer)
+    return bundle
+
+
+# ----- CLI -----
+
+def _file_size(path):
+    return os.path.getsize(path) / 1024 if os.path.exists(path) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="인덱스 번들 조회/검증/변경분 생성")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="manifest 요약")
+    info.add_argument('bundle')
+    verify = commands.add_parser('verify', help="체크섬/버전 검증 (전체 번들 뒤에 변경분을 순서대로)")
+    verify.add_argument('bundles', nargs='+')
+    delta = commands.add_parser('delta', help="두 전체 번들의 차이로 변경분 번들 생성")
+    delta.add_argument('old')
+    delta.add_argument('new')
+    delta.add_argument('-o', '--output', required=True)
+    apply = commands.add_parser('apply', help="전체 번들에 변경분을 합쳐 새 전체 번들 생성")
+    apply.add_argument('bundles', nargs='+')
+    apply.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'info':
+            manifest, _ = _read_members(args.bundle)
+            print(f"📦 {args.bundle} ({_file_size(args.bundle):.0f}KB): {manifest['kind']} 번들, "
+                  f"버전 {manifest['version']}, 청크 {manifest['rows']}개")
+            if manifest['kind'] == DELTA:
+                print(f"  🔁 기준 버전 {manifest['base_version']} ({manifest['base_rows']}개) → "
+                      f"추가 {manifest['added']}개, 삭제 {manifest['removed']}개")
+            print(f"  🧠 모델 {manifest['model']['name']} ({manifest['model']['dim']}차원), "
+                  f"암호화 {'예' if manifest['sealed'] else '아니오'}")
+            for name, entry in manifest['files'].items():
+                print(f"  📄 {name}: {entry['bytes'] / 1024:.1f}KB sha256 {entry['sha256'][:16]}")
+
+        elif args.command == 'verify':
+            start = time.perf_counter()
+            bundle = None
+            for source in args.bundles:
+                bundle = read_bundle(source, base=bundle)
+            print(f"✅ 버전 {bundle.version}, 청크 {len(bundle.table)}개, 임베딩 {bundle.embeddings.shape} "
+                  f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+        elif args.command == 'delta':
+            old, new = read_bundle(args.old), read_bundle(args.new)
+            check_model(old.model, new.model)
+            manifest = export_delta(args.output, old, new.table, new.embeddings, new.model,
+                                    new.relevance_threshold, new.sealed)
+            print(f"✅ {args.output}: {old.version} → {new.version}, 추가 {manifest['added']}개, "
+                  f"삭제 {manifest['removed']}개 ({_file_size(args.output):.0f}KB, 전체 번들 {_file_size(args.new):.0f}KB)")
+
+        elif args.command == 'apply':
+            bundle = None
+            for source in args.bundles:
+                bundle = read_bundle(source, base=bundle)
+            bundle.save(args.output)
+            print(f"✅ {args.output}: 버전 {bundle.version}, 청크 {len(bundle.table)}개")
+    except BundleError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
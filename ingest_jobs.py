@@ -0,0 +1,272 @@
+# ingest_jobs.py - 문서 처리(파싱 + 임베딩)를 백그라운드 작업으로 실행하는 작업 큐
+# 진행 상황은 작업별 JSON 파일에 저장되므로 브라우저를 새로고침해도 작업 ID로 다시 조회 가능
+#
+# 사용법 (데모):
+#   python ingest_jobs.py
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ingest_log import process_alive, process_token
+
+DEFAULT_DIR = "./ingest_jobs"
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, INTERRUPTED = (
+    'queued', 'running', 'done', 'failed', 'cancelled', 'interrupted')
+FINISHED = (DONE, FAILED, CANCELLED, INTERRUPTED)
+
+
+class JobCancelled(Exception):
+    """작업 함수 안에서 취소 요청을 확인했을 때 발생"""
+
+
+class JobStore:
+    """작업 상태/결과 파일 저장소
+
+    <id>.json: 상태, 진행 상황, 경고 / <id>.result.json + <id>.<키>.npy: 결과 (배열은 .npy로 분리)
+    """
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, suffix='.json'):
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def save(self, job):
+        self._write_json(self._path(job['id']), job)
+
+    def load(self, job_id):
+        """작업 상태, 없으면 None"""
+        if not job_id or not all(c.isalnum() or c == '-' for c in job_id):
+            return None  # URL에서 온 값이므로 경로 문자 차단
+        try:
+            with open(self._path(job_id), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def jobs(self):
+        result = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and not name.endswith('.result.json'):
+                job = self.load(name[:-len('.json')])
+                if job:
+                    result.append(job)
+        return sorted(result, key=lambda job: job['created_at'])
+
+    def save_result(self, job_id, result):
+        data = {}
+        for key, value in (result or {}).items():
+            if isinstance(value, np.ndarray):
+                np.save(self._path(job_id, f".{key}.npy"), value)
+                data[key] = {'__npy__': key}
+            else:
+                data[key] = value
+        self._write_json(self._path(job_id, '.result.json'), data)
+
+    def load_result(self, job_id):
+        try:
+            with open(self._path(job_id, '.result.json'), encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return {key: np.load(self._path(job_id, f".{value['__npy__']}.npy"))
+                if isinstance(value, dict) and '__npy__' in value else value
+                for key, value in data.items()}
+
+    def delete(self, job_id):
+        prefix = f"{job_id}."
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                os.unlink(os.path.join(self.directory, name))
+
+    def prune(self, max_age=24 * 3600):
+        """끝난 지 오래된 작업 파일 삭제"""
+        cutoff = time.time() - max_age
+        for job in self.jobs():
+            if job['status'] in FINISHED and job['updated_at'] < cutoff:
+                self.delete(job['id'])
+
+
+class JobContext:
+    """작업 함수에 전달되는 핸들 (진행 상황 기록, 취소 확인, 경고)"""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.id = job_id
+        self.cancel_event = threading.Event()
+
+    def progress(self, **counts):
+        """진행 카운터 갱신 (예: files_parsed=2, chunks_embedded=128)"""
+        self.runner._update(self.id, progress=counts)
+
+    def warn(self, message):
+        self.runner._update(self.id, warning=message)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobRunner:
+    """작업자 풀 + 작업 ID 기반 조회/취소
+
+    fn(job, *args)의 반환값(dict)은 결과로 저장되고, 작업 함수는 job.check_cancelled()로 취소를 확인합니다.
+    작업을 실행하던 프로세스가 없어졌으면 끝나지 않은 작업은 'interrupted'로 표시됩니다 (입력 파일은 저장하지 않음).
+    """
+
+    def __init__(self, store=None, max_workers=2):
+        self.store = store or JobStore()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self._lock = threading.Lock()
+        self._contexts = {}
+        self.store.prune()
+        for job in self.store.jobs():
+            if job['status'] not in FINISHED and not process_alive(job.get('pid'), job.get('token')):
+                job.update(status=INTERRUPTED, message="서버 재시작으로 중단됨", updated_at=time.time())
+                self.store.save(job)
+
+    def submit(self, kind, fn, *args, progress=None):
+        """작업 등록 후 작업 ID 반환 (progress는 초기 카운터, 예: files_total)"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        job = {'id': job_id, 'kind': kind, 'pid': os.getpid(), 'token': process_token(), 'status': QUEUED,
+               'created_at': now, 'updated_at': now, 'started_at': None, 'finished_at': None, 'progress': dict(progress or {}),
+               'warnings': [], 'message': '', 'error': None}
+        context = JobContext(self, job_id)
+        with self._lock:
+            self.store.save(job)
+            self._contexts[job_id] = context
+        self.executor.submit(self._run, context, fn, args)
+        return job_id
+
+    def _update(self, job_id, progress=None, warning=None, **fields):
+        with self._lock:
+            job = self.store.load(job_id)
+            if job is None:
+                return None
+            if progress:
+                job['progress'].update(progress)
+            if warning:
+                job['warnings'].append(warning)
+            job.update(fields, updated_at=time.time())
+            self.store.save(job)
+            return job
+
+    def _run(self, context, fn, args):
+        if context.cancelled:
+            self._finish(context, CANCELLED, message="시작 전 취소됨")
+            return
+        self._update(context.id, status=RUNNING, started_at=time.time())
+        try:
+            result = fn(context, *args)
+            self.store.save_result(context.id, result)
+            self._finish(context, DONE)
+        except JobCancelled:
+            self._finish(context, CANCELLED, message="취소됨")
+        except Exception as e:
+            self._finish(context, FAILED, error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, context, status, **fields):
+        self._update(context.id, status=status, finished_at=time.time(), **fields)
+        with self._lock:
+            self._contexts.pop(context.id, None)
+
+    def get(self, job_id):
+        return self.store.load(job_id)
+
+    def result(self, job_id):
+        return self.store.load_result(job_id)
+
+    def cancel(self, job_id):
+        """취소 요청 (작업 함수가 다음 확인 지점에서 멈춤), 실행 중인 작업이 아니면 False"""
+        with self._lock:
+            context = self._contexts.get(job_id)
+        if context is None:
+            return False
+        context.cancel_event.set()
+        self._update(job_id, message="취소 요청됨")
+        return True
+
+    def active(self, kind=None):
+        return [job for job in self.store.jobs()
+                if job['status'] not in FINISHED and (kind is None or job['kind'] == kind)]
+
+
+def describe(job):
+    """사이드바 표시용 한 줄 요약"""
+    progress = job['progress']
+    parts = []
+    if 'files_total' in progress:
+        parts.append(f"파일 {progress.get('files_parsed', 0)}/{progress['files_total']}")
+    if 'chunks_total' in progress:
+        parts.append(f"청크 {progress.get('chunks_embedded', 0)}/{progress['chunks_total']}")
+    return ", ".join(parts)
+
+
+def fraction(job):
+    """진행률 0~1 (파싱 절반, 임베딩 절반)"""
+    progress = job['progress']
+    parsed = progress.get('files_parsed', 0) / max(progress.get('files_total', 0), 1)
+    embedded = progress.get('chunks_embedded', 0) / max(progress.get('chunks_total', 0), 1)
+    return min(1.0, (parsed + embedded) / 2)
+
+
+def main():
+    import tempfile
+
+    print("🚀 백그라운드 작업 큐 데모 시작!")
+
+    def fake_ingest(job, files):
+        job.progress(files_total=len(files))
+        chunks = []
+        for i, name in enumerate(files):
+            job.check_cancelled()
+            time.sleep(0.05)
+            chunks.extend(f"{name}-{k}" for k in range(20))
+            job.progress(files_parsed=i + 1, chunks_total=len(chunks))
+        vectors = []
+        for start in range(0, len(chunks), 16):
+            job.check_cancelled()
+            time.sleep(0.02)
+            vectors.append(np.ones((len(chunks[start:start + 16]), 4), np.float32))
+            job.progress(chunks_embedded=start + len(vectors[-1]))
+        return {'chunks': chunks, 'embeddings': np.vstack(vectors)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        runner = JobRunner(JobStore(directory), max_workers=2)
+        first = runner.submit('demo', fake_ingest, ['a.docx', 'b.pdf', 'c.txt'])
+        second = runner.submit('demo', fake_ingest, ['d.docx'] * 10)
+        time.sleep(0.2)
+        runner.cancel(second)
+
+        while runner.active():
+            for job in runner.store.jobs():
+                print(f"  ⏳ {job['id']} {job['status']:<9} {fraction(job):>4.0%} {describe(job)}")
+            time.sleep(0.2)
+
+        for job_id in (first, second):
+            job = runner.get(job_id)
+            result = runner.result(job_id)
+            size = f", 결과 {len(result['chunks'])}개 청크 {result['embeddings'].shape}" if result else ""
+            print(f"✅ {job_id}: {job['status']} {describe(job)}{size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# ingest_log.py - Chroma 적재 작업의 추가 전용(append-only) 로그
+# 배치를 적용하기 전에 내용(청크 해시 포함)을 먼저 기록하고 fsync하므로,
+# 도중에 죽어도 재시작 시 끝나지 않은 배치만 다시 적용하거나 되돌리면 됨 (전체 재구축 불필요)
+#
+# 레코드 (한 줄에 JSON 하나):
+#   begin   {txn, collection, total, pid, token, meta}
+#   batch   {txn, batch, op(add/update/delete), ids, hashes, documents, metadatas, embeddings, before}
+#   applied {txn, batch}
+#   commit / abort {txn}
+import fcntl
+import json
+import os
+import time
+import uuid
+
+from semantic_cache import chunk_hash
+
+LOG_FILE = "ingest_log.jsonl"
+
+
+def pid_alive(pid):
+    """프로세스가 살아 있는지 (없거나 알 수 없으면 False)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # 다른 사용자의 프로세스
+    return True
+
+
+def process_token(pid=None):
+    """프로세스 식별자 'pid:시작 시각' (PID가 재사용돼도 다른 프로세스와 구별, /proc이 없으면 None)
+
+    컨테이너를 재시작하면 같은 PID가 다시 쓰이므로 PID만으로는 죽은 프로세스인지 알 수 없음
+    """
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as file:
+            fields = file.read().rsplit(')', 1)[1].split()  # 프로세스 이름에 공백/괄호가 있을 수 있음
+    except (OSError, IndexError):
+        return None
+    return f"{pid}:{fields[19]}"  # 22번째 필드 starttime (부팅 후 클럭 틱)
+
+
+def process_alive(pid, token=None):
+    """기록한 프로세스가 아직 살아 있는지 (token이 있으면 같은 PID를 재사용한 다른 프로세스는 죽은 것으로 봄)"""
+    if not pid_alive(pid):
+        return False
+    if token is None:
+        return True  # token 없이 기록된 예전 레코드
+    current = process_token(pid)
+    return current is None or current == token
+
+
+def _apply(collection, op, ids, documents=None, metadatas=None, embeddings=None):
+    """배치 하나 적용 (다시 실행해도 결과가 같도록 add/update는 upsert)"""
+    if op == 'delete':
+        collection.delete(ids=ids)
+    else:
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+
+def _undo(collection, record):
+    """배치 하나 되돌리기 (이전 내용이 있던 id는 복원, 새로 생긴 id는 삭제)"""
+    before = record.get('before') or {}
+    created = [id_ for id_ in record['ids'] if id_ not in before]
+    if created:
+        collection.delete(ids=created)
+    if before:
+        ids = list(before)
+        collection.upsert(ids=ids,
+                          documents=[before[id_]['document'] for id_ in ids],
+                          metadatas=[before[id_]['metadata'] for id_ in ids] if any(
+                              before[id_]['metadata'] for id_ in ids) else None,
+                          embeddings=[before[id_]['embedding'] for id_ in ids] if all(
+                              'embedding' in before[id_] for id_ in ids) else None)
+
+
+class IngestLog:
+    """적재 트랜잭션 로그
+
+    write()가 begin → 모든 배치 기록 → 배치별 적용/applied → commit 순서로 처리합니다.
+    모든 배치가 기록된 트랜잭션은 복구 시 남은 배치만 마저 적용하고,
+    기록 도중 중단된 트랜잭션은 적용된 배치를 되돌립니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    # ----- 기록 -----
+
+    def _append(self, records):
+        with open(self.path, 'a+b') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)  # 다른 프로세스와 줄이 섞이지 않도록
+            try:
+                data = b"".join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n"
+                                for record in records)
+                size = file.seek(0, os.SEEK_END)
+                if size:
+                    file.seek(size - 1)
+                    if file.read(1) != b"\n":
+                        data = b"\n" + data  # 잘린 마지막 줄과 붙지 않도록
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def begin(self, collection_name, total, meta=None):
+        txn = uuid.uuid4().hex[:12]
+        self._append([{'type': 'begin', 'txn': txn, 'collection': collection_name, 'total': total,
+                       'pid': os.getpid(), 'token': process_token(), 'ts': time.time(), 'meta': meta or {}}])
+        return txn
+
+    def commit(self, txn):
+        self._append([{'type': 'commit', 'txn': txn}])
+
+    def abort(self, txn):
+        self._append([{'type': 'abort', 'txn': txn}])
+
+    def write(self, collection, op, ids, documents=None, metadatas=None, batch_size=1000,
+              on_batch=None, before_commit=None, meta=None, embeddings=None):
+        """로그를 남기며 적재 (실패/취소 시 적용한 배치를 되돌리고 예외 전달)
+
+        on_batch(처리된 개수)는 배치마다 호출, before_commit()은 commit 직전에 호출 (예: 별칭 교체)
+        embeddings를 주면 컬렉션의 임베딩 함수 대신 그대로 저장 (암호화된 본문 등)
+        """
+        txn = self.begin(collection.name, len(ids), meta)
+        records = []
+        for batch, start in enumerate(range(0, len(ids), batch_size)):
+            end = start + batch_size
+            batch_ids = ids[start:end]
+            record = {'type': 'batch', 'txn': txn, 'batch': batch, 'op': op, 'ids': batch_ids,
+                      'documents': documents[start:end] if documents else None,
+                      'metadatas': metadatas[start:end] if metadatas else None,
+                      'embeddings': [list(map(float, vector)) for vector in embeddings[start:end]]
+                      if embeddings is not None else None}
+            if op != 'add':
+                record['before'] = _snapshot(collection, batch_ids)
+            texts = record['documents'] or [item['document'] for item in record.get('before', {}).values()]
+            record['hashes'] = [chunk_hash(text or '') for text in texts]  # 암호화된 본문이면 암호문 기준
+            records.append(record)
+        self._append(records)  # 의도를 먼저 모두 기록
+
+        applied = []
+        try:
+            for record in records:
+                _apply(collection, op, record['ids'], record['documents'], record['metadatas'], record['embeddings'])
+                self._append([{'type': 'applied', 'txn': txn, 'batch': record['batch']}])
+                applied.append(record)
+                if on_batch:
+                    on_batch(sum(len(r['ids']) for r in applied))
+            if before_commit:
+                before_commit()
+        except BaseException:
+            for record in reversed(applied + records[len(applied):len(applied) + 1]):
+                try:
+                    _undo(collection, record)
+                except Exception:
+                    pass  # 남은 부분은 다음 복구에서 처리
+            self.abort(txn)
+            self.compact()
+            raise
+        self.commit(txn)
+        self.compact()
+        return txn
+
+    # ----- 읽기 / 복구 -----
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                lines = file.readlines()
+        except OSError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # 기록 도중 죽어서 잘린 마지막 줄
+        return records
+
+    def pending(self):
+        """끝나지 않은(commit/abort 없는) 트랜잭션 {txn: {'begin', 'batches', 'applied'}}"""
+        transactions = {}
+        for record in self._read():
+            txn = record['txn']
+            if record['type'] == 'begin':
+                transactions[txn] = {'begin': record, 'batches': [], 'applied': set()}
+            elif txn not in transactions:
+                continue
+            elif record['type'] == 'batch':
+                transactions[txn]['batches'].append(record)
+            elif record['type'] == 'applied':
+                transactions[txn]['applied'].add(record['batch'])
+            else:
+                del transactions[txn]
+        return transactions
+
+    def recover(self, client, on_finished=None, match=None):
+        """죽은 프로세스가 남긴 트랜잭션 마무리, [(txn, 컬렉션명, 'finished'|'rolled_back', 처리한 배치 수)] 반환
+
+        on_finished(begin 레코드, collection)은 마저 적용한 트랜잭션의 commit 직전에 호출,
+        match(begin 레코드)가 있으면 True인 트랜잭션만 처리
+        """
+        results = []
+        for txn, state in self.pending().items():
+            begin = state['begin']
+            if process_alive(begin['pid'], begin.get('token')) or (match and not match(begin)):
+                continue  # 다른 프로세스가 아직 적재 중이거나 다른 인덱스 담당
+            try:
+                collection = client.get_collection(begin['collection'])
+            except Exception:
+                self.abort(txn)  # 컬렉션이 없으면 되돌릴 것도 없음
+                results.append((txn, begin['collection'], 'rolled_back', 0))
+                continue
+
+            batches = sorted(state['batches'], key=lambda record: record['batch'])
+            if sum(len(record['ids']) for record in batches) == begin['total']:
+                todo = [record for record in batches if record['batch'] not in state['applied']]
+                for record in todo:
+                    _apply(collection, record['op'], record['ids'], record['documents'], record['metadatas'],
+                           record.get('embeddings'))
+                    self._append([{'type': 'applied', 'txn': txn, 'batch': record['batch']}])
+                if on_finished:
+                    on_finished(begin, collection)
+                self.commit(txn)
+                results.append((txn, begin['collection'], 'finished', len(todo)))
+            else:
+                for record in reversed(batches):
+                    _undo(collection, record)
+                self.abort(txn)
+                results.append((txn, begin['collection'], 'rolled_back', len(batches)))
+        self.compact()
+        return results
+
+    def compact(self):
+        """끝나지 않은 트랜잭션이 없으면 로그 비우기 (있으면 그대로 두고 다음 기회에)"""
+        try:
+            with open(self.path, 'r+', encoding='utf-8') as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    if not self.pending():
+                        file.truncate(0)
+                        os.fsync(file.fileno())
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+        except OSError:
+            pass
+
+    def stats(self):
+        pending = self.pending()
+        return {
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            'pending': len(pending),
+            'pending_batches': sum(len(state['batches']) - len(state['applied']) for state in pending.values()),
+        }
+
+
+def _snapshot(collection, ids):
+    """되돌리기용 이전 내용 {id: {'document', 'metadata'}}"""
+    existing = collection.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+    return {id_: {'document': document, 'metadata': metadata, 'embedding': list(map(float, embedding))}
+            for id_, document, metadata, embedding in zip(existing['ids'], existing['documents'],
+                                                         existing['metadatas'], existing['embeddings'])}
@@ -0,0 +1,115 @@
+# llm_benchmark.py - LLM 프로바이더 처리량/지연 측정 (대역 서버로 오프라인 측정 가능)
+#
+# 사용법:
+#   python llm_benchmark.py --mock --providers gemini openai ollama --requests 50 --concurrency 8
+#   python llm_benchmark.py --providers ollama --model llama3.2 --requests 20
+import argparse
+import asyncio
+import time
+
+from llm_client import get_client, get_loop_thread
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def _one_request(client, prompt, results):
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    try:
+        async for _ in client.stream(prompt):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+        results.append({'ttft': ttft or 0.0, 'total': time.perf_counter() - start, 'tokens': tokens, 'ok': True})
+    except Exception as e:
+        results.append({'ttft': 0.0, 'total': time.perf_counter() - start, 'tokens': tokens, 'ok': False,
+                        'error': f"{type(e).__name__}: {e}"})
+
+
+async def _run(client, prompts, concurrency):
+    results = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def limited(prompt):
+        async with gate:
+            await _one_request(client, prompt, results)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(prompt) for prompt in prompts))
+    return results, time.perf_counter() - start
+
+
+def run_benchmark(client, requests=20, concurrency=4, prompt="Question: 와이파이 비밀번호가 뭐야?", warmup=True):
+    """스트리밍 요청을 동시에 보내고 TTFT/전체 지연/처리량 집계"""
+    prompts = [f"{prompt} #{i}" for i in range(requests)]
+    if warmup:
+        # SDK import, 연결 생성, 모델 로드 시간은 측정에서 제외
+        get_loop_thread().run(_run(client, [prompt], 1))
+    results, elapsed = get_loop_thread().run(_run(client, prompts, concurrency))
+
+    ok = [r for r in results if r['ok']]
+    tokens = sum(r['tokens'] for r in ok)
+    return {
+        'requests': requests,
+        'succeeded': len(ok),
+        'elapsed': elapsed,
+        'req_per_sec': len(ok) / elapsed if elapsed else 0.0,
+        'tokens_per_sec': tokens / elapsed if elapsed else 0.0,
+        'ttft_p50': percentile([r['ttft'] for r in ok], 50),
+        'ttft_p95': percentile([r['ttft'] for r in ok], 95),
+        'total_p50': percentile([r['total'] for r in ok], 50),
+        'total_p95': percentile([r['total'] for r in ok], 95),
+        'errors': [r['error'] for r in results if not r['ok']][:3],
+    }
+
+
+def print_report(name, report):
+    print(f"\n📊 {name}")
+    print(f"  성공 {report['succeeded']}/{report['requests']}  ({report['elapsed']:.2f}s)")
+    print(f"  처리량: {report['req_per_sec']:.1f} req/s, {report['tokens_per_sec']:.0f} tok/s")
+    print(f"  첫 토큰: p50 {report['ttft_p50'] * 1000:.0f}ms / p95 {report['ttft_p95'] * 1000:.0f}ms")
+    print(f"  전체:   p50 {report['total_p50'] * 1000:.0f}ms / p95 {report['total_p95'] * 1000:.0f}ms")
+    for error in report['errors']:
+        print(f"  ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 프로바이더 처리량 측정")
+    parser.add_argument('--providers', nargs='+', default=['gemini', 'openai', 'ollama'])
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mock', action='store_true', help="로컬 대역 서버를 띄워서 측정")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--tokens-per-sec', type=float, default=40)
+    args = parser.parse_args()
+
+    print("🚀 LLM 처리량 측정 시작!")
+
+    base_urls = {}
+    if args.mock:
+        from mock_llm_server import MockLLMConfig, start_server
+        start_server(args.port, MockLLMConfig(args.latency_ms, args.tokens_per_sec))
+        root = f"http://127.0.0.1:{args.port}"
+        base_urls = {'gemini': root, 'openai': f"{root}/v1", 'ollama': root}
+        print(f"🧪 대역 서버: {root} (지연 {args.latency_ms:.0f}ms, {args.tokens_per_sec:.0f} tok/s)")
+
+    for provider in args.providers:
+        config = {'max_concurrency': args.concurrency}
+        if provider in base_urls:
+            config['base_url'] = base_urls[provider]
+        client = get_client(provider, model=args.model, api_key='mock' if args.mock else None,
+                            response_cache=False, **config)
+        print_report(f"{provider} ({client.model})", run_benchmark(client, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+# llm_client.py - 공유 비동기 LLM 클라이언트 (연결 재사용, 타임아웃, 재시도, 동시 호출 제한)
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+
+from response_cache import get_response_cache
+
+# 재시도할 만한 일시적 오류 (HTTP 상태 코드 / 예외 클래스 이름)
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {
+    'APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError',
+    'ServiceUnavailable', 'DeadlineExceeded', 'ResourceExhausted',
+    'TimeoutException', 'ConnectError', 'ReadError', 'RemoteProtocolError',
+}
+
+
+def is_transient(error):
+    """재시도하면 성공할 수 있는 오류인지 판단"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS:
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+class LLMHTTPError(Exception):
+    """API 오류 응답 (URL/헤더 없이 상태 코드와 응답 본문만 담아 키가 화면/기록에 남지 않게 함)"""
+
+    def __init__(self, status_code, body):
+        super().__init__(f"HTTP {status_code}: {body}")
+        self.status_code = status_code
+
+
+async def _raise_for_status(response, max_body=500):
+    """오류 응답이면 LLMHTTPError (httpx.HTTPStatusError는 메시지에 요청 URL 전체가 들어감)"""
+    if response.is_success:
+        return
+    body = (await response.aread()).decode('utf-8', errors='replace')
+    raise LLMHTTPError(response.status_code, body[:max_body])
+
+
+class _LoopThread:
+    """동기 코드(Streamlit, CLI)에서 쓰기 위한 백그라운드 이벤트 루프
+
+    클라이언트의 연결 풀과 세마포어는 루프에 묶이므로 프로세스 전체가 루프 하나를 공유합니다.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='llm-loop', daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_loop_thread():
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+        return _loop_thread
+
+
+class LLMClient:
+    """프로바이더 공통 클라이언트 (새 프로바이더는 _complete/_stream 구현 후 register_provider)
+
+    - timeout: 요청 하나의 마감 시간(초, 재시도 포함 전체)
+    - max_retries: 일시적 오류 재시도 횟수 (지터가 있는 지수 백오프)
+    - max_concurrency: 프로바이더별 동시 진행 호출 수 상한
+    - base_url: API 주소 (로컬 대역 서버 mock_llm_server.py로 돌릴 때 사용)
+    - response_cache: 같은 프롬프트 응답 캐시 (ResponseCache, None이면 사용 안 함)
+    """
+
+    provider = None
+
+    def __init__(self, model, api_key=None, timeout=30.0, max_retries=3, base_delay=0.5,
+                 max_delay=8.0, max_concurrency=4, base_url=None, max_connections=20, response_cache=None):
+        self.model = model
+        self.response_cache = response_cache
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.max_connections = max_connections
+        self._http = None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'in_flight': 0}
+
+    @property
+    def semaphore(self):
+        # 루프 안에서 처음 사용할 때 생성
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @property
+    def http(self):
+        """연결 풀을 재사용하는 httpx 클라이언트 (이벤트 루프 안에서 생성)"""
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout,
+            )
+        return self._http
+
+    def backoff(self, attempt):
+        """full jitter 지수 백오프"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _complete(self, prompt, **options):
+        raise NotImplementedError
+
+    async def _stream(self, prompt, **options):
+        raise NotImplementedError
+        yield
+
+    def _cached(self, prompt, options, bypass_cache):
+        if self.response_cache is None or bypass_cache:
+            return None
+        return self.response_cache.get(self.provider, self.model, options.get('temperature'), prompt,
+                                       base_url=self.base_url, options=options)
+
+    def _remember(self, prompt, options, response):
+        if self.response_cache is not None and response:
+            self.response_cache.put(self.provider, self.model, options.get('temperature'), prompt, response,
+                                    base_url=self.base_url, options=options)
+
+    async def generate(self, prompt, bypass_cache=False, **options):
+        """전체 답변 생성 (캐시 확인 후, 마감 시간 안에서 재시도)"""
+        cached = self._cached(prompt, options, bypass_cache)
+        if cached is not None:
+            return cached
+        response = await self._generate(prompt, **options)
+        self._remember(prompt, options, response)
+        return response
+
+    async def _generate(self, prompt, **options):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        self.stats['requests'] += 1
+
+        async with self.semaphore:
+            self.stats['in_flight'] += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"{self.provider} 요청 마감 시간 초과")
+                    try:
+                        return await asyncio.wait_for(self._complete(prompt, **options), remaining)
+                    except Exception as e:
+                        if attempt >= self.max_retries or not is_transient(e):
+                            self.stats['failures'] += 1
+                            raise
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(min(self.backoff(attempt), max(deadline - loop.time(), 0)))
+            finally:
+                self.stats['in_flight'] -= 1
+
+    async def stream(self, prompt, bypass_cache=False, **options):
+        """토큰 스트리밍 (캐시 적중이면 저장된 답변을 한 번에 전달)"""
+        cached = self._cached(prompt, options, bypass_cache)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for token in self._stream_with_retry(prompt, **options):
+            parts.append(token)
+            yield token
+        self._remember(prompt, options, ''.join(parts))
+
+    async def _stream_with_retry(self, prompt, **options):
+        """첫 토큰 전까지만 재시도"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        self.stats['requests'] += 1
+
+        async with self.semaphore:
+            self.stats['in_flight'] += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    started = False
+                    try:
+                        iterator = self._stream(prompt, **options).__aiter__()
+                        while True:
+                            remaining = deadline - loop.time()
+                            if remaining <= 0:
+                                raise asyncio.TimeoutError(f"{self.provider} 스트리밍 마감 시간 초과")
+                            try:
+                                token = await asyncio.wait_for(iterator.__anext__(), remaining)
+                            except StopAsyncIteration:
+                                return
+                            started = True
+                            yield token
+                    except Exception as e:
+                        if started or attempt >= self.max_retries or not is_transient(e):
+                            self.stats['failures'] += 1
+                            raise
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(min(self.backoff(attempt), max(deadline - loop.time(), 0)))
+            finally:
+                self.stats['in_flight'] -= 1
+
+    def generate_sync(self, prompt, **options):
+        """동기 코드용 generate"""
+        return get_loop_thread().run(self.generate(prompt, **options))
+
+    def stream_sync(self, prompt, **options):
+        """동기 코드용 stream (토큰을 큐로 전달)"""
+        tokens = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for token in self.stream(prompt, **options):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), get_loop_thread().loop)
+        while True:
+            item = tokens.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def _sse_events(response):
+    """Server-Sent Events 응답에서 data JSON 추출"""
+    async def events():
+        async for line in response.aiter_lines():
+            if line.startswith('data:'):
+                data = line[5:].strip()
+                if data and data != '[DONE]':
+                    yield json.loads(data)
+    return events()
+
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com"
+
+
+class GeminiClient(LLMClient):
+    """Google Gemini REST API (키를 요청마다 헤더로 보내므로 키별 클라이언트가 서로 섞이지 않음)
+
+    키가 없으면 환경변수(GOOGLE_API_KEY)로 설정된 google-generativeai SDK 사용
+    (SDK의 genai.configure는 프로세스 전체 설정이라 클라이언트별 키에는 쓰지 않음)
+    """
+
+    provider = 'gemini'
+
+    def __init__(self, model='gemini-1.5-flash', **kwargs):
+        super().__init__(model, **kwargs)
+        self._model = None
+        if self.api_key and not self.base_url:
+            self.base_url = GEMINI_API_URL
+        if not self.base_url:
+            import google.generativeai as genai
+            # 모델 객체는 한 번만 만들고 재사용
+            self._model = genai.GenerativeModel(model)
+
+    async def _complete(self, prompt, temperature=None, max_tokens=None):
+        if self._model is not None:
+            response = await self._model.generate_content_async(
+                prompt, generation_config=self._config(temperature, max_tokens))
+            return response.text
+
+        response = await self.http.post(
+            f"{self.base_url}/v1beta/models/{self.model}:generateContent",
+            headers=self._headers(),
+            json=self._body(prompt, temperature, max_tokens),
+        )
+        await _raise_for_status(response)
+        return self._text(response.json())
+
+    async def _stream(self, prompt, temperature=None, max_tokens=None):
+        if self._model is not None:
+            response = await self._model.generate_content_async(
+                prompt, generation_config=self._config(temperature, max_tokens), stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            return
+
+        async with self.http.stream(
+            'POST',
+            f"{self.base_url}/v1beta/models/{self.model}:streamGenerateContent",
+            params={'alt': 'sse'},
+            headers=self._headers(),
+            json=self._body(prompt, temperature, max_tokens),
+        ) as response:
+            await _raise_for_status(response)
+            async for event in _sse_events(response):
+                text = self._text(event)
+                if text:
+                    yield text
+
+    def _headers(self):
+        # 키는 URL(쿼리)이 아니라 헤더로 보냄 (오류 메시지/로그에 URL이 남아도 키는 노출되지 않음)
+        return {'x-goog-api-key': self.api_key} if self.api_key else {}
+
+    def _config(self, temperature, max_tokens):
+        config = {}
+        if temperature is not None:
+            config['temperature'] = temperature
+        if max_tokens is not None:
+            config['max_output_tokens'] = max_tokens
+        return config or None
+
+    def _body(self, prompt, temperature, max_tokens):
+        body = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        config = {}
+        if temperature is not None:
+            config['temperature'] = temperature
+        if max_tokens is not None:
+            config['maxOutputTokens'] = max_tokens
+        if config:
+            body['generationConfig'] = config
+        return body
+
+    def _text(self, payload):
+        candidates = payload.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return ''.join(part.get('text', '') for part in parts)
+
+
+class OpenAIClient(LLMClient):
+    """OpenAI Chat Completions (openai>=1.0, httpx 연결 풀 재사용)"""
+
+    provider = 'openai'
+
+    def __init__(self, model='gpt-3.5-turbo', **kwargs):
+        super().__init__(model, **kwargs)
+        self._client = None
+
+    @property
+    def client(self):
+        # httpx 클라이언트는 이벤트 루프 안에서 생성
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                api_key=self.api_key or 'not-needed',
+                base_url=self.base_url,
+                max_retries=0,  # 재시도는 이 레이어에서 처리
+                timeout=self.timeout,
+                http_client=self.http,
+            )
+        return self._client
+
+    async def _complete(self, prompt, temperature=None, max_tokens=None):
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            **self._options(temperature, max_tokens)
+        )
+        return response.choices[0].message.content.strip()
+
+    async def _stream(self, prompt, temperature=None, max_tokens=None):
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            **self._options(temperature, max_tokens)
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _options(self, temperature, max_tokens):
+        options = {}
+        if temperature is not None:
+            options['temperature'] = temperature
+        if max_tokens is not None:
+            options['max_tokens'] = max_tokens
+        return options
+
+
+class OllamaClient(LLMClient):
+    """로컬 ollama 서버 (/api/generate, NDJSON 스트리밍)
+
+    - keep_alive: 마지막 요청 후 모델을 메모리에 유지할 시간 (예: '30m', -1이면 계속 유지)
+    - num_thread: CPU 추론 스레드 수 (None이면 ollama 기본값)
+    - 동시 처리 수(max_concurrency)는 서버의 OLLAMA_NUM_PARALLEL과 맞춰야 대기열이 생기지 않음
+    """
+
+    provider = 'ollama'
+
+    def __init__(self, model='llama3.2', keep_alive='30m', num_thread=None, **kwargs):
+        kwargs['base_url'] = kwargs.get('base_url') or 'http://localhost:11434'
+        kwargs.setdefault('timeout', 120.0)  # CPU에서는 첫 로드와 긴 답변이 느림
+        super().__init__(model, **kwargs)
+        self.keep_alive = keep_alive
+        self.num_thread = num_thread
+
+    def _body(self, prompt, stream, temperature, max_tokens):
+        body = {'model': self.model, 'prompt': prompt, 'stream': stream, 'keep_alive': self.keep_alive}
+        options = {}
+        if temperature is not None:
+            options['temperature'] = temperature
+        if max_tokens is not None:
+            options['num_predict'] = max_tokens
+        if self.num_thread:
+            options['num_thread'] = self.num_thread
+        if options:
+            body['options'] = options
+        return body
+
+    async def warmup(self):
+        """빈 프롬프트로 모델을 메모리에 올림 (첫 질문의 로드 지연 제거), 걸린 시간 반환"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await self.http.post(
+            f"{self.base_url}/api/generate",
+            json={'model': self.model, 'prompt': '', 'stream': False, 'keep_alive': self.keep_alive},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return loop.time() - start
+
+    def warmup_sync(self):
+        return get_loop_thread().run(self.warmup())
+
+    async def _complete(self, prompt, temperature=None, max_tokens=None):
+        response = await self.http.post(
+            f"{self.base_url}/api/generate",
+            json=self._body(prompt, False, temperature, max_tokens),
+        )
+        response.raise_for_status()
+        return response.json().get('response', '').strip()
+
+    async def _stream(self, prompt, temperature=None, max_tokens=None):
+        async with self.http.stream(
+            'POST',
+            f"{self.base_url}/api/generate",
+            json=self._body(prompt, True, temperature, max_tokens),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get('response'):
+                    yield event['response']
+                if event.get('done'):
+                    return
+
+
+CLIENT_CLASSES = {
+    'gemini': GeminiClient,
+    'openai': OpenAIClient,
+    'ollama': OllamaClient,
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def register_provider(name, cls):
+    """새 LLM 프로바이더 등록 (LLMClient 하위 클래스)"""
+    CLIENT_CLASSES[name] = cls
+
+
+def default_base_url(provider):
+    """환경변수 LLM_<PROVIDER>_BASE_URL로 API 주소 지정 (예: 로컬 대역 서버)"""
+    return os.getenv(f"LLM_{provider.upper()}_BASE_URL") or None
+
+
+def get_client(provider, model=None, api_key=None, response_cache=True, **config):
+    """프로세스 전체에서 재사용하는 클라이언트 반환 (프로바이더/모델/키 별로 하나)
+
+    response_cache=True면 공유 응답 캐시를 사용하고, False면 사용하지 않음
+    """
+    if provider not in CLIENT_CLASSES:
+        raise ValueError(f"지원하지 않는 LLM 프로바이더: {provider}")
+    if config.get('base_url') is None:
+        base_url = default_base_url(provider)
+        if base_url:
+            config['base_url'] = base_url
+    key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12] if api_key else None
+    key = (provider, model, key_hash, bool(response_cache), tuple(sorted(config.items())))
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if response_cache is True:
+                config['response_cache'] = get_response_cache()
+            elif response_cache:
+                config['response_cache'] = response_cache
+            cls = CLIENT_CLASSES[provider]
+            client = cls(model=model, api_key=api_key, **config) if model else cls(api_key=api_key, **config)
+            _clients[key] = client
+        return client
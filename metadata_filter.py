@@ -0,0 +1,88 @@
+# metadata_filter.py - 메타데이터 사전 필터링 (posting list 인덱스)
+import numpy as np
+
+
+class MetadataIndex:
+    """필드별 posting list 기반 메타데이터 인덱스
+
+    점수 계산 전에 후보 청크를 좁히기 위해 사용합니다.
+    예: {'filename': ['a.docx']}, {'type': 'complete_section'}
+    """
+
+    def __init__(self, records, fields=('filename', 'type')):
+        self.size = len(records)
+        self.fields = tuple(fields)
+        postings = {field: {} for field in self.fields}
+
+        for i, record in enumerate(records):
+            for field in self.fields:
+                value = record.get(field)
+                if value is not None:
+                    postings[field].setdefault(value, []).append(i)
+
+        # 인덱스 순서대로 쌓였으므로 이미 정렬된 상태
+        self.postings = {
+            field: {value: np.asarray(ids, dtype=np.int64) for value, ids in values.items()}
+            for field, values in postings.items()
+        }
+
+    @classmethod
+    def from_postings(cls, size, postings):
+        """이미 만들어진 posting list로 생성 (예: 열 저장소의 코드 배열에서 계산)"""
+        index = cls.__new__(cls)
+        index.size = size
+        index.fields = tuple(postings)
+        index.postings = postings
+        return index
+
+    def values(self, field):
+        """필드에 존재하는 값 목록"""
+        return sorted(self.postings.get(field, {}))
+
+    def candidates(self, filters):
+        """필터 조건에 맞는 후보 인덱스 (정렬된 배열)
+
+        같은 필드의 여러 값은 OR, 서로 다른 필드는 AND로 결합합니다.
+        """
+        result = None
+
+        for field, wanted in (filters or {}).items():
+            if wanted is None:
+                continue
+            if field not in self.postings:
+                raise ValueError(f"인덱싱되지 않은 필드입니다: {field}")
+            if isinstance(wanted, (str, int)):
+                wanted = [wanted]
+
+            lists = [self.postings[field][v] for v in wanted if v in self.postings[field]]
+            if not lists:
+                return np.empty(0, dtype=np.int64)
+
+            ids = lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+
+            if len(result) == 0:
+                break
+
+        if result is None:
+            return np.arange(self.size, dtype=np.int64)
+        return result
+
+
+def to_chroma_where(filters):
+    """필터 딕셔너리를 Chroma where 절로 변환 (Chroma가 검색 전에 적용)"""
+    clauses = []
+
+    for field, wanted in (filters or {}).items():
+        if wanted is None:
+            continue
+        if isinstance(wanted, (str, int)):
+            clauses.append({field: wanted})
+        else:
+            clauses.append({field: {'$in': list(wanted)}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {'$and': clauses}
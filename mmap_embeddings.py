@@ -0,0 +1,189 @@
+# mmap_embeddings.py - 읽기 전용 메모리 맵 임베딩 행렬 + 세션 전용 오버레이
+# 기본 문서 임베딩은 파일 하나를 모든 세션/프로세스가 매핑하므로 OS 페이지 캐시에 한 벌만 존재
+#
+# 사용법 (여러 프로세스가 같은 파일을 매핑할 때 메모리 측정):
+#   python mmap_embeddings.py --rows 50000 --workers 4
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_DIR = "./embedding_cache"
+
+
+def normalize(vectors):
+    """행 단위 L2 정규화 (저장 시 한 번만 하면 검색 때 내적 = 코사인 유사도)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def embedding_cache_path(version, model_name='all-MiniLM-L6-v2', directory=DEFAULT_DIR):
+    """코퍼스 버전별 임베딩 파일 경로"""
+    return os.path.join(directory, f"{model_name}-{version[:16]}.npy")
+
+
+def save_embeddings(path, vectors):
+    """정규화해서 .npy로 저장 (임시 파일에 쓴 뒤 교체하므로 동시에 만들어도 안전)"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.save(file, normalize(vectors))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def open_embeddings(path):
+    """읽기 전용 메모리 맵으로 열기 (데이터를 복사하지 않음)"""
+    return np.load(path, mmap_mode='r')
+
+
+def load_or_build(path, build):
+    """파일이 있으면 매핑, 없으면 build()로 만들어 저장 후 매핑"""
+    if not os.path.exists(path):
+        save_embeddings(path, build())
+    return open_embeddings(path)
+
+
+class EmbeddingStore:
+    """공유 기본 행렬(메모리 맵) 뒤에 세션 전용 오버레이를 이어 붙인 논리적 행렬
+
+    행 번호는 기본 행렬 → 오버레이 순서이며, 모든 벡터는 정규화되어 있습니다.
+    """
+
+    def __init__(self, base=None, overlay=None):
+        self.base = base
+        dim = base.shape[1] if base is not None else (np.asarray(overlay).shape[-1] if overlay is not None else 0)
+        self.overlay = normalize(overlay) if overlay is not None and len(overlay) else np.empty((0, dim), np.float32)
+
+    @property
+    def base_rows(self):
+        return len(self.base) if self.base is not None else 0
+
+    def __len__(self):
+        return self.base_rows + len(self.overlay)
+
+    @property
+    def shape(self):
+        return (len(self), self.overlay.shape[1])
+
+    def with_overlay(self, vectors):
+        """기본 행렬은 공유한 채로 새 벡터를 오버레이에 추가한 저장소 반환"""
+        overlay = normalize(vectors)
+        if len(self.overlay):
+            overlay = np.vstack([self.overlay, overlay])
+        store = EmbeddingStore(self.base)
+        store.overlay = overlay
+        return store
+
+    def similarities(self, query, rows=None):
+        """질문 벡터와의 코사인 유사도 (rows가 있으면 해당 행만)"""
+        query = normalize(query)[0]
+        if rows is None:
+            parts = []
+            if self.base is not None:
+                parts.append(self.base @ query)
+            parts.append(self.overlay @ query)
+            return np.concatenate(parts)
+        return self[rows] @ query
+
+    def __getitem__(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        in_base = rows < self.base_rows
+        result = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        if in_base.any():
+            result[in_base] = self.base[rows[in_base]]
+        if (~in_base).any():
+            result[~in_base] = self.overlay[rows[~in_base] - self.base_rows]
+        return result
+
+    def view(self, rows):
+        """행 번호 배열의 벡터 (기본 행렬이나 오버레이 안에서 연속된 행이면 복사 없이 슬라이스)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) and np.all(np.diff(rows) == 1):
+            start, end = int(rows[0]), int(rows[-1]) + 1
+            if end <= self.base_rows:
+                return self.base[start:end]
+            if start >= self.base_rows:
+                return self.overlay[start - self.base_rows:end - self.base_rows]
+        return self[rows]
+
+    def __array__(self, dtype=None, copy=None):
+        parts = ([np.asarray(self.base)] if self.base is not None else []) + [self.overlay]
+        array = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        return array.astype(dtype) if dtype is not None else array
+
+    def memory(self):
+        """공유(파일 매핑)와 세션 전용 바이트 수"""
+        return {
+            'shared_bytes': int(self.base.nbytes) if self.base is not None else 0,
+            'private_bytes': int(self.overlay.nbytes),
+        }
+
+
+def _memory_kb(field):
+    """현재 프로세스의 smaps_rollup 항목 (Rss / Pss, KB)"""
+    try:
+        with open('/proc/self/smaps_rollup') as file:
+            for line in file:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _worker(path, ready, results):
+    before_rss, before_pss = _memory_kb('Rss'), _memory_kb('Pss')
+    store = EmbeddingStore(open_embeddings(path))
+    store.similarities(np.ones(store.shape[1], np.float32))  # 모든 페이지 접근
+    ready.wait()  # 모든 프로세스가 매핑한 상태에서 측정 (Pss가 나눠짐)
+    results.put((os.getpid(), (_memory_kb('Rss') - before_rss) / 1024, (_memory_kb('Pss') - before_pss) / 1024))
+
+
+def main():
+    import multiprocessing as mp
+
+    parser = argparse.ArgumentParser(description="메모리 맵 임베딩 공유 측정")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print("🚀 메모리 맵 임베딩 공유 측정 시작!")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'embeddings.npy')
+        save_embeddings(path, np.random.default_rng(0).standard_normal((args.rows, args.dim), dtype=np.float32))
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"📦 임베딩 파일: {args.rows}×{args.dim} ({size_mb:.1f}MB)")
+
+        ctx = mp.get_context('spawn')
+        ready = ctx.Barrier(args.workers + 1)
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_worker, args=(path, ready, results)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        ready.wait()
+        rows = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        for pid, rss, pss in rows:
+            print(f"  pid {pid}: Rss +{rss:.1f}MB, Pss +{pss:.1f}MB")
+        total_pss = sum(pss for _, _, pss in rows)
+        print(f"💾 프로세스 {args.workers}개 실제 점유(Pss 합): {total_pss:.1f}MB "
+              f"(복사본이었다면 {size_mb * args.workers:.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# mock_llm_server.py - Gemini/OpenAI/ollama 스트리밍 API를 흉내 내는 로컬 대역 서버
+# 실제 비용 없이 전체 파이프라인 처리량을 측정하기 위한 용도
+#
+# 사용법:
+#   python mock_llm_server.py --port 8800 --latency-ms 300 --tokens-per-sec 40
+#   LLM_GEMINI_BASE_URL=http://127.0.0.1:8800 streamlit run app.py
+#   LLM_OPENAI_BASE_URL=http://127.0.0.1:8800/v1 python smart_rag_gpt.py
+#   LLM_OLLAMA_BASE_URL=http://127.0.0.1:8800 ...
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_REPLY = "요청하신 정보는 문서에 있는 내용을 바탕으로 정리하면 다음과 같습니다. 위 정보를 참고해주세요."
+
+
+class MockLLMConfig:
+    """대역 서버 동작 설정"""
+
+    def __init__(self, latency_ms=300, tokens_per_sec=40, max_tokens=60, reply=DEFAULT_REPLY):
+        self.latency_ms = latency_ms          # 첫 토큰까지 지연
+        self.tokens_per_sec = tokens_per_sec  # 이후 토큰 생성 속도 (0이면 지연 없음)
+        self.max_tokens = max_tokens
+        self.reply = reply
+
+    def tokens(self, prompt, limit=None):
+        """응답 토큰 (고정 답변 + 질문 일부를 단어 단위로)"""
+        question = re.search(r"(?:Question|질문):\s*(.+)", prompt)
+        text = self.reply + (f" ({question.group(1).strip()})" if question else "")
+        words = text.split(' ')
+        limit = min(limit or self.max_tokens, self.max_tokens)
+        return [word + ' ' for word in words[:limit]]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = MockLLMConfig()
+
+    def log_message(self, format, *args):
+        pass  # 부하 측정 중 출력 생략
+
+    # ----- 공통 -----
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        body = data.encode('utf-8')
+        self.wfile.write(f"{len(body):x}\r\n".encode('ascii') + body + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _emit(self, tokens, write):
+        """첫 토큰 지연 후 설정된 속도로 토큰 전송"""
+        time.sleep(self.config.latency_ms / 1000)
+        interval = 1 / self.config.tokens_per_sec if self.config.tokens_per_sec else 0
+        for i, token in enumerate(tokens):
+            if i and interval:
+                time.sleep(interval)
+            write(token)
+
+    def _wait_full(self, tokens):
+        interval = 1 / self.config.tokens_per_sec if self.config.tokens_per_sec else 0
+        time.sleep(self.config.latency_ms / 1000 + interval * max(len(tokens) - 1, 0))
+
+    # ----- 라우팅 -----
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/api/tags':
+            self._send_json({'models': [{'name': 'mock'}]})
+        elif path == '/health':
+            self._send_json({'status': 'ok'})
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_json()
+
+        if url.path == '/v1/chat/completions':
+            self._openai(body)
+        elif url.path == '/api/generate':
+            self._ollama(body)
+        elif url.path.startswith('/v1beta/models/'):
+            stream = url.path.endswith(':streamGenerateContent')
+            self._gemini(body, stream, parse_qs(url.query).get('alt') == ['sse'])
+        else:
+            self._send_json({'error': 'not found'}, status=404)
+
+    # ----- OpenAI -----
+
+    def _openai(self, body):
+        prompt = ' '.join(m.get('content', '') for m in body.get('messages', []))
+        tokens = self.config.tokens(prompt, body.get('max_tokens'))
+        model = body.get('model', 'mock')
+
+        if not body.get('stream'):
+            self._wait_full(tokens)
+            self._send_json({
+                'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(tokens),
+                          'total_tokens': len(prompt.split()) + len(tokens)},
+            })
+            return
+
+        self._start_stream('text/event-stream')
+
+        def write(token):
+            chunk = {'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                     'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+
+        self._emit(tokens, write)
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+    # ----- ollama -----
+
+    def _ollama(self, body):
+        model = body.get('model', 'mock')
+        if not body.get('prompt'):
+            # 빈 프롬프트는 모델 로드 요청 (keep_alive 워밍업)
+            time.sleep(self.config.latency_ms / 1000)
+            self._send_json({'model': model, 'response': '', 'done': True, 'done_reason': 'load'})
+            return
+        tokens = self.config.tokens(body['prompt'], body.get('options', {}).get('num_predict'))
+
+        if not body.get('stream', True):
+            self._wait_full(tokens)
+            self._send_json({'model': model, 'response': ''.join(tokens), 'done': True,
+                             'eval_count': len(tokens)})
+            return
+
+        self._start_stream('application/x-ndjson')
+        self._emit(tokens, lambda token: self._write_chunk(
+            json.dumps({'model': model, 'response': token, 'done': False}, ensure_ascii=False) + "\n"))
+        self._write_chunk(json.dumps({'model': model, 'response': '', 'done': True,
+                                      'eval_count': len(tokens)}) + "\n")
+        self._end_stream()
+
+    # ----- Gemini -----
+
+    def _gemini(self, body, stream, sse):
+        prompt = ' '.join(part.get('text', '') for content in body.get('contents', [])
+                          for part in content.get('parts', []))
+        tokens = self.config.tokens(prompt, body.get('generationConfig', {}).get('maxOutputTokens'))
+
+        def candidate(text):
+            return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}]}
+
+        if not stream:
+            self._wait_full(tokens)
+            self._send_json(candidate(''.join(tokens)))
+            return
+
+        if sse:
+            self._start_stream('text/event-stream')
+            self._emit(tokens, lambda token: self._write_chunk(
+                f"data: {json.dumps(candidate(token), ensure_ascii=False)}\r\n\r\n"))
+            self._end_stream()
+        else:
+            # alt=sse가 없으면 JSON 배열로 한 번에 응답
+            self._wait_full(tokens)
+            self._send_json([candidate(token) for token in tokens])
+
+
+def make_server(host='127.0.0.1', port=8800, config=None):
+    """설정이 적용된 대역 서버 생성"""
+    handler = type('ConfiguredHandler', (MockLLMHandler,), {'config': config or MockLLMConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(port=8800, config=None, host='127.0.0.1'):
+    """백그라운드 스레드에서 대역 서버 시작 (벤치마크용), 서버 객체 반환"""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini/OpenAI/ollama 대역 서버")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency-ms', type=float, default=300, help="첫 토큰까지 지연 (ms)")
+    parser.add_argument('--tokens-per-sec', type=float, default=40, help="토큰 생성 속도")
+    parser.add_argument('--max-tokens', type=int, default=60)
+    args = parser.parse_args()
+
+    config = MockLLMConfig(args.latency_ms, args.tokens_per_sec, args.max_tokens)
+    server = make_server(args.host, args.port, config)
+    print(f"🧪 LLM 대역 서버 시작: http://{args.host}:{args.port} "
+          f"(지연 {args.latency_ms:.0f}ms, {args.tokens_per_sec:.0f} tok/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 대역 서버를 종료합니다!")
+
+
+if __name__ == "__main__":
+    main()
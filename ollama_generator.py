@@ -0,0 +1,111 @@
+# ollama_generator.py - 로컬 ollama 모델로 RAG 답변 생성 (모델 상주, 스트리밍, 동시 처리 제한)
+#
+# 사용법:
+#   ollama pull llama3.2 && OLLAMA_NUM_PARALLEL=2 ollama serve
+#   RAG_LLM_PROVIDER=ollama python smart_rag_gpt.py
+#   python ollama_generator.py --model llama3.2 --parallelism 1 2 4 --requests 8   # CPU 지연 측정
+#   python ollama_generator.py --mock                                              # 대역 서버로 측정
+import argparse
+
+from context_assembler import assemble_context
+from llm_client import get_client
+
+DEFAULT_MODEL = 'llama3.2'
+
+
+def build_rag_prompt(question, context_docs, token_budget=1000):
+    """로컬 모델용 프롬프트 (작은 모델이 따라오기 쉽게 짧은 지시문)"""
+    context = "\n".join(f"- {doc}" for doc in assemble_context(context_docs, token_budget=token_budget).chunks)
+    return f"""아래 회사 정보만 보고 질문에 한국어로 짧게 답하세요. 정보가 없으면 "해당 정보가 없습니다"라고 답하세요.
+비밀번호, ID, 주소는 원문 그대로 적으세요.
+
+회사 정보:
+{context}
+
+질문: {question}
+답변:"""
+
+
+class OllamaGenerator:
+    """RAG 클래스에서 쓰는 로컬 답변 생성기
+
+    - parallelism: 동시에 생성할 요청 수 (서버의 OLLAMA_NUM_PARALLEL과 같게 설정)
+    - keep_alive: 모델을 메모리에 유지할 시간
+    - token_budget: 컨텍스트 토큰 예산 (CPU에서는 프롬프트가 짧을수록 첫 토큰이 빠름)
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, parallelism=2, keep_alive='30m', num_thread=None,
+                 token_budget=1000, max_tokens=300, base_url=None, response_cache=True):
+        self.client = get_client('ollama', model=model, response_cache=response_cache, max_concurrency=parallelism,
+                                 keep_alive=keep_alive, num_thread=num_thread, base_url=base_url)
+        self.token_budget = token_budget
+        self.max_tokens = max_tokens
+        self.load_time = None
+
+    @property
+    def model(self):
+        return self.client.model
+
+    def warmup(self):
+        """모델을 미리 메모리에 올림 (실패하면 None)"""
+        try:
+            self.load_time = self.client.warmup_sync()
+        except Exception as e:
+            print(f"❌ ollama 모델 로드 실패: {e}")
+            return None
+        return self.load_time
+
+    def generate(self, question, context_docs, temperature=0.3):
+        """전체 답변 생성"""
+        if not context_docs:
+            return "죄송합니다. 관련 정보를 찾을 수 없습니다."
+        prompt = build_rag_prompt(question, context_docs, self.token_budget)
+        return self.client.generate_sync(prompt, max_tokens=self.max_tokens, temperature=temperature)
+
+    def stream(self, question, context_docs, temperature=0.3):
+        """토큰이 도착하는 대로 yield"""
+        if not context_docs:
+            yield "죄송합니다. 관련 정보를 찾을 수 없습니다."
+            return
+        prompt = build_rag_prompt(question, context_docs, self.token_budget)
+        yield from self.client.stream_sync(prompt, max_tokens=self.max_tokens, temperature=temperature)
+
+
+def main():
+    from llm_benchmark import run_benchmark, print_report
+
+    parser = argparse.ArgumentParser(description="ollama 로컬 생성 지연 측정")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=8)
+    parser.add_argument('--num-thread', type=int, default=None)
+    parser.add_argument('--mock', action='store_true', help="로컬 대역 서버를 띄워서 측정")
+    parser.add_argument('--port', type=int, default=8801)
+    args = parser.parse_args()
+
+    print("🚀 ollama 로컬 생성 지연 측정 시작!")
+
+    base_url = None
+    if args.mock:
+        from mock_llm_server import MockLLMConfig, start_server
+        # CPU 소형 모델과 비슷한 속도 (첫 토큰 800ms, 초당 12토큰)
+        start_server(args.port, MockLLMConfig(latency_ms=800, tokens_per_sec=12))
+        base_url = f"http://127.0.0.1:{args.port}"
+        print(f"🧪 대역 서버: {base_url}")
+
+    context_docs = ["6. 사내 와이파이(WIFI) 정보\n이름(SSID): ahns_ai _Creative_5G\n비밀번호(Password): ahn!@#creative"]
+    prompt = build_rag_prompt("와이파이 비밀번호가 뭐야?", context_docs)
+
+    for parallelism in args.parallelism:
+        generator = OllamaGenerator(args.model, parallelism=parallelism, num_thread=args.num_thread,
+                                    base_url=base_url, response_cache=False)
+        load_time = generator.warmup()
+        if load_time is None:
+            return
+        print(f"\n🧠 모델 로드/상주 확인: {load_time * 1000:.0f}ms")
+        report = run_benchmark(generator.client, args.requests, parallelism, prompt, warmup=False)
+        print_report(f"ollama {generator.model} (parallelism {parallelism})", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# parent_child.py - 부모-자식 인덱싱 (작은 자식 청크만 임베딩하고 검색 결과는 부모 섹션으로 반환)
+# 섹션 본문은 부모 레코드에 한 번만 저장하고, 자식은 본문 없이 부모 안의 위치(start, end)만 가짐
+# → 같은 줄을 항목 / 완전한 섹션 / 제목으로 여러 번 저장·임베딩하지 않음
+#
+# 사용법 (기존 방식과 저장량/임베딩 수 비교):
+#   python parent_child.py pstorm_pw.docx
+import argparse
+
+import numpy as np
+
+PARENT, CHILD = 'parent', 'child'
+
+
+class SectionBuilder:
+    """문단을 순서대로 받아 부모(섹션)와 자식(줄) 목록 생성
+
+    부모: {'id', 'text', 'type'} ('complete_section' 또는 'standalone')
+    자식: {'id', 'parent', 'start', 'end', 'type', 'text'} ('text'는 임베딩할 문장이며 저장하지 않음)
+    """
+
+    def __init__(self):
+        self.parents = []
+        self.children = []
+        self._lines = None
+        self._offset = 0
+
+    def _close(self):
+        if self._lines is not None:
+            self.parents[-1]['text'] = "\n".join(self._lines)
+            self._lines = None
+
+    def _add_child(self, text, type, embed_text):
+        parent = self.parents[-1]
+        self.children.append({
+            'id': f"{parent['id']}#{len(self._lines)}",
+            'parent': parent['id'],
+            'start': self._offset,
+            'end': self._offset + len(text),
+            'type': type,
+            'text': embed_text,
+        })
+        self._lines.append(text)
+        self._offset += len(text) + 1  # 줄바꿈
+
+    @property
+    def in_section(self):
+        return self._lines is not None
+
+    def section(self, parent_id, title):
+        """새 섹션 시작 (제목 줄도 자식으로 검색됨)"""
+        self._close()
+        self.parents.append({'id': parent_id, 'text': '', 'type': 'complete_section'})
+        self._lines = []
+        self._offset = 0
+        self._add_child(title, 'title', title)
+
+    def line(self, text, type='item'):
+        """현재 섹션에 줄 추가 (섹션 제목과 함께 임베딩해서 문맥 유지)"""
+        self._add_child(text, type, f"{self._lines[0]}\n{text}")
+
+    def standalone(self, parent_id, text):
+        """섹션 밖 문단 (자기 자신이 부모이자 유일한 자식)"""
+        self._close()
+        self.parents.append({'id': parent_id, 'text': '', 'type': 'standalone'})
+        self._lines = []
+        self._offset = 0
+        self._add_child(text, 'standalone', text)
+        self._close()
+
+    def build(self):
+        """(부모 목록, 자식 목록)"""
+        self._close()
+        return self.parents, self.children
+
+
+def child_text(parent_text, metadata):
+    """부모 본문에서 자식 줄 잘라내기"""
+    return parent_text[metadata['start']:metadata['end']]
+
+
+def index_records(parents, children, encode, sealer=None):
+    """VersionedIndex.build에 넘길 (documents, ids, metadatas, embeddings)
+
+    자식만 임베딩하고, 부모 벡터는 자식 벡터의 평균 (부모는 검색 대상이 아니지만 Chroma 레코드에 벡터가 필요)
+    자식 문서는 빈 문자열로 저장하고 본문은 부모에만 (암호화가 켜져 있으면 부모 본문만 봉인)
+    """
+    child_vectors = np.asarray(encode([child['text'] for child in children]), dtype=np.float32)
+    positions = {parent['id']: i for i, parent in enumerate(parents)}
+    parent_vectors = np.zeros((len(parents), child_vectors.shape[1]), dtype=np.float32)
+    np.add.at(parent_vectors, [positions[child['parent']] for child in children], child_vectors)
+    parent_vectors /= np.maximum(np.linalg.norm(parent_vectors, axis=1, keepdims=True), 1e-12)
+
+    parent_types = {parent['id']: parent['type'] for parent in parents}
+    documents = ([sealer.seal(parent['text'], parent['id']) if sealer else parent['text'] for parent in parents]
+                 + [''] * len(children))
+    ids = [parent['id'] for parent in parents] + [child['id'] for child in children]
+    metadatas = ([{'role': PARENT, 'type': parent['type']} for parent in parents]
+                 + [{'role': CHILD, 'type': child['type'], 'parent': child['parent'],
+                     'parent_type': parent_types[child['parent']], 'start': child['start'], 'end': child['end']}
+                    for child in children])
+    return documents, ids, metadatas, np.vstack([parent_vectors, child_vectors])
+
+
+def child_where(types=None):
+    """자식만 검색하는 where 절 (types는 자식 유형 또는 부모 유형 중 하나와 맞으면 통과)"""
+    if not types:
+        return {'role': CHILD}
+    types = list(types)
+    return {'$and': [{'role': CHILD},
+                     {'$or': [{'type': {'$in': types}}, {'parent_type': {'$in': types}}]}]}
+
+
+def search_parents(collection, query_embedding, top_k, types=None, fan_out=4, sealer=None):
+    """자식 검색 후 부모 단위로 중복 제거, [(부모 본문, 부모 메타데이터, 가장 가까운 자식 거리)] 거리순
+
+    한 섹션의 여러 줄이 함께 걸리므로 자식은 top_k * fan_out개까지 가져와서 부모 top_k개를 채움
+    """
+    results = collection.query(
+        query_embeddings=[list(map(float, query_embedding))],
+        n_results=top_k * fan_out,
+        where=child_where(types),
+        include=['metadatas', 'distances'],
+    )
+    best = {}
+    for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
+        best.setdefault(metadata['parent'], distance)  # 거리순이므로 처음 나온 자식이 가장 가까움
+    parent_ids = list(best)[:top_k]
+    if not parent_ids:
+        return []
+
+    parents = collection.get(ids=parent_ids, include=['documents', 'metadatas'])
+    found = {id_: (document, metadata)
+             for id_, document, metadata in zip(parents['ids'], parents['documents'], parents['metadatas'])}
+    hits = []
+    for id_ in parent_ids:
+        if id_ in found:
+            document, metadata = found[id_]
+            hits.append((sealer.open(document, id_) if sealer else document, metadata, best[id_]))
+    return hits
+
+
+def main():
+    from docx import Document
+
+    parser = argparse.ArgumentParser(description="부모-자식 인덱싱 저장량 비교")
+    parser.add_argument('docx', nargs='?', default='pstorm_pw.docx')
+    args = parser.parse_args()
+
+    builder = SectionBuilder()
+    for i, para in enumerate(Document(args.docx).paragraphs):
+        text = para.text.strip()
+        if not text:
+            continue
+        if text.startswith('**') and text.endswith('**') or text[:2] in {f"{n}." for n in range(1, 10)}:
+            builder.section(f"section_{i}", text.replace('**', '').strip())
+        elif builder.in_section:
+            builder.line(text)
+        else:
+            builder.standalone(f"standalone_{i}", text)
+    parents, children = builder.build()
+
+    # 기존 방식: 제목, 항목(제목+줄), 완전한 섹션을 각각 저장하고 모두 임베딩
+    old_texts = ([child['text'] for child in children]
+                 + [parent['text'] for parent in parents if parent['type'] == 'complete_section'])
+    old_bytes = sum(len(text.encode('utf-8')) for text in old_texts)
+    new_bytes = sum(len(parent['text'].encode('utf-8')) for parent in parents)
+
+    print(f"📄 {args.docx}: 섹션 {sum(p['type'] == 'complete_section' for p in parents)}개, "
+          f"독립 문단 {sum(p['type'] == 'standalone' for p in parents)}개, 줄 {len(children)}개")
+    print(f"  📦 기존: 레코드 {len(old_texts)}개, 본문 {old_bytes / 1024:.1f}KB, 임베딩 {len(old_texts)}회")
+    print(f"  🌳 부모-자식: 레코드 {len(parents) + len(children)}개 (본문은 부모 {len(parents)}개에만), "
+          f"본문 {new_bytes / 1024:.1f}KB, 임베딩 {len(children)}회")
+    print(f"  ✅ 본문 {1 - new_bytes / old_bytes:.0%} 감소, 임베딩 {1 - len(children) / len(old_texts):.0%} 감소")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# rag_pipeline.py - app.py의 검색 → 프롬프트 → 생성 단계 (Streamlit 없이도 같은 코드로 실행)
+# 앱과 배치 작업(faq_precompute.py)이 같은 검색/프롬프트를 써야 미리 만든 답변이 앱 답변과 일치함
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from context_assembler import assemble_context
+from llm_client import get_client
+from metadata_filter import MetadataIndex
+from mmap_embeddings import EmbeddingStore
+from relevance_cutoff import apply_cutoff
+
+
+def search_documents(query, documents, embeddings, encoder, n_results=3, filters=None, metadata_index=None, reranker=None,
+                     cutoff='fixed', threshold=0.1, context_stats=None, with_scores=False, retriever=None):
+    """문서에서 관련 내용 검색 (filters가 있으면 점수 계산 전에 후보를 좁힘)
+
+    with_scores=True면 (텍스트 목록, 1차 유사도 목록)을 반환, 오류는 예외로 전달 (화면 표시는 호출하는 쪽에서)
+    retriever(ShardedRetriever)가 있으면 파일별 샤드를 병렬 검색하고 파일명 필터는 샤드 선택으로 처리
+    """
+    if not documents or embeddings is None or encoder is None:
+        return ([], []) if with_scores else []
+
+    # 재정렬을 사용하면 상위 N개 후보를 가져와서 cross-encoder로 다시 정렬
+    n_candidates = max(n_results, reranker.top_n) if reranker else n_results
+    if retriever is not None and set(filters or {}) <= {'filename'}:
+        hits = retriever.search(query, top_k=n_candidates, shards=(filters or {}).get('filename'), min_score=0.1)
+        results, scores = [hit['text'] for hit in hits], [hit['score'] for hit in hits]
+    else:
+        results, scores = _matrix_search(query, documents, embeddings, encoder, n_candidates, filters, metadata_index)
+
+    if reranker and len(results) > 1:
+        score_by_text = dict(zip(results, scores))
+        results = reranker.rerank(query, results, scores)
+        scores = [score_by_text[text] for text in results]
+
+    # 점수 분포 기반 컷오프 (관련 섹션이 하나뿐이면 컨텍스트를 줄임)
+    # 재정렬이 끝난 최종 n_results개에 적용하고, 남기는 청크는 재정렬 순서 유지
+    results, scores = results[:n_results], scores[:n_results]
+    before = results
+    ranked = sorted(scores, reverse=True)
+    keep = apply_cutoff(ranked, cutoff, threshold=max(threshold, 0.1))
+    floor = ranked[keep - 1] if keep else float('inf')
+    kept = [(text, score) for text, score in zip(results, scores) if score >= floor]
+    results, scores = [text for text, _ in kept], [score for _, score in kept]
+    if context_stats is not None:
+        context_stats.record(before, results)
+
+    return (results, scores) if with_scores else results
+
+
+def _matrix_search(query, documents, embeddings, encoder, n_candidates, filters=None, metadata_index=None):
+    """행렬 하나에서 1차 검색, (텍스트 목록, 유사도 목록) 유사도 내림차순"""
+    # 메타데이터 필터로 후보 청크 선별
+    candidates = None
+    if filters:
+        if metadata_index is None:
+            metadata_index = MetadataIndex(documents)
+        candidates = metadata_index.candidates(filters)
+        if len(candidates) == 0:
+            return [], []
+
+    query_embedding = encoder.encode([query])
+    if isinstance(embeddings, EmbeddingStore):
+        # 공유 메모리 맵 + 오버레이를 복사하지 않고 바로 계산
+        similarities = embeddings.similarities(query_embedding, candidates)
+    elif candidates is None:
+        similarities = cosine_similarity(query_embedding, embeddings)[0]
+    else:
+        similarities = cosine_similarity(query_embedding, embeddings[candidates])[0]
+    top_indices = np.argsort(similarities)[::-1][:n_candidates]
+
+    results = []
+    scores = []
+    for idx in top_indices:
+        if similarities[idx] > 0.1:
+            doc_idx = idx if candidates is None else candidates[idx]
+            results.append(documents[doc_idx]['text'])
+            scores.append(float(similarities[idx]))
+    return results, scores
+
+
+def build_prompt(query, context_docs, token_budget=1500, history=""):
+    """검색된 문서로 Gemini 프롬프트 구성 (중복 제거 후 토큰 예산만큼만 포함)"""
+    conversation = f"\nConversation so far:\n{history}\n" if history else ""
+    if context_docs:
+        context = "\n\n".join(assemble_context(context_docs, token_budget=token_budget).chunks)
+        return f"""
+Based on the following document content, please answer the question professionally.
+
+Document Content:
+{context}
+{conversation}
+Question: {query}
+
+Please follow these guidelines:
+1. Answer accurately based on the document content
+2. If information is not in the documents, state "The requested information is not available in the uploaded documents"
+3. Use a professional and helpful tone
+4. Include specific examples or details when possible
+5. Respond in Korean if the question is in Korean
+"""
+
+    return f"""
+No uploaded documents found or no relevant information available.
+{conversation}
+Question: {query}
+
+Please provide a general response based on your knowledge, but first mention that "No relevant information was found in the uploaded documents, so I'm providing a general response."
+Respond in Korean if the question is in Korean.
+"""
+
+
+def generate_response(query, context_docs, api_key, bypass_cache=False, history=""):
+    """Gemini를 사용하여 응답 생성 (같은 프롬프트는 응답 캐시에서 재사용)"""
+    try:
+        # 공유 클라이언트 (연결 재사용, 마감 시간, 재시도, 동시 호출 제한)
+        client = get_client('gemini', model='gemini-1.5-flash', api_key=api_key)
+        prompt = build_prompt(query, context_docs, history=history)
+
+        return client.generate_sync(prompt, bypass_cache=bypass_cache)
+
+    except Exception as e:
+        return f"Error generating response: {e}"
+
+
+def generate_response_stream(query, context_docs, api_key, timing, bypass_cache=False, history=""):
+    """Gemini 응답을 토큰이 도착하는 대로 yield (timing에 첫 토큰/전체 시간 기록)"""
+    start = time.perf_counter()
+    timing['ttft'] = None
+
+    try:
+        client = get_client('gemini', model='gemini-1.5-flash', api_key=api_key)
+        prompt = build_prompt(query, context_docs, history=history)
+
+        for text in client.stream_sync(prompt, bypass_cache=bypass_cache):
+            if timing['ttft'] is None:
+                timing['ttft'] = time.perf_counter() - start
+            yield text
+
+    except Exception as e:
+        yield f"Error generating response: {e}"
+
+    finally:
+        timing['total'] = time.perf_counter() - start
+
+
+def faq_answer_fn(documents, embeddings, encoder, api_key):
+    """FAQ 미리 생성용 검색+생성 함수 (앱과 같은 검색/프롬프트, 백그라운드 스레드와 배치 작업에서 호출)
+
+    오류는 예외로 넘겨 실패한 질문으로 기록됨
+    """
+    def answer(question):
+        context_docs = search_documents(question, documents, embeddings, encoder, cutoff='gap')
+        return generate_response(question, context_docs, api_key), context_docs
+    return answer
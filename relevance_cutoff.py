@@ -0,0 +1,123 @@
+# relevance_cutoff.py - 점수 분포 기반 적응형 관련도 컷오프
+import numpy as np
+
+STRATEGIES = ('gap', 'elbow', 'calibrated', 'fixed')
+
+
+def gap_cutoff(scores, min_gap=0.08):
+    """top-k 점수에서 가장 큰 간격 앞까지만 유지 (간격이 min_gap 미만이면 전부 유지)"""
+    if len(scores) < 2:
+        return len(scores)
+    gaps = -np.diff(np.asarray(scores, dtype=np.float64))
+    cut = int(np.argmax(gaps))
+    if gaps[cut] < min_gap:
+        return len(scores)
+    return cut + 1
+
+
+def elbow_cutoff(scores):
+    """첫 점과 마지막 점을 잇는 직선에서 가장 멀리 떨어진 지점(엘보)까지 유지"""
+    n = len(scores)
+    if n < 3:
+        return n
+    y = np.asarray(scores, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    # 직선 위 점과의 수직 거리 (정규화 없이 비교만 하면 됨)
+    line = y[0] + (y[-1] - y[0]) * x / (n - 1)
+    distances = line - y
+    elbow = int(np.argmax(distances))
+    if distances[elbow] <= 0:
+        return n
+    return elbow
+
+
+def calibrate_threshold(embeddings, percentile=95, sample_size=2000, floor=0.1, seed=0):
+    """코퍼스 청크끼리의 유사도 분포로 '우연히 비슷한' 수준의 임계값 추정"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) < 2:
+        return floor
+    rng = np.random.default_rng(seed)
+    if len(embeddings) > sample_size:
+        embeddings = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    normalized = embeddings / norms
+    sims = normalized @ normalized.T
+    background = sims[np.triu_indices(len(sims), k=1)]
+    return max(floor, float(np.percentile(background, percentile)))
+
+
+def apply_cutoff(scores, strategy='gap', threshold=0.1, min_gap=0.08):
+    """내림차순 점수에 컷오프 적용 후 유지할 개수 반환"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"알 수 없는 컷오프 전략: {strategy}")
+    scores = [s for s in scores if s > threshold]
+    if strategy == 'gap':
+        return gap_cutoff(scores, min_gap)
+    if strategy == 'elbow':
+        return elbow_cutoff(scores)
+    # calibrated/fixed는 임계값만 적용 (calibrated는 threshold에 보정값을 넘김)
+    return len(scores)
+
+
+class ContextSizeStats:
+    """컷오프 전후 컨텍스트 크기(문자 수) 평균 집계"""
+
+    def __init__(self):
+        self.queries = 0
+        self.chunks_before = 0
+        self.chunks_after = 0
+        self.chars_before = 0
+        self.chars_after = 0
+
+    def record(self, before, after):
+        self.queries += 1
+        self.chunks_before += len(before)
+        self.chunks_after += len(after)
+        self.chars_before += sum(len(text) for text in before)
+        self.chars_after += sum(len(text) for text in after)
+
+    def summary(self):
+        n = max(self.queries, 1)
+        return {
+            'queries': self.queries,
+            'avg_chunks_before': self.chunks_before / n,
+            'avg_chunks_after': self.chunks_after / n,
+            'avg_chars_before': self.chars_before / n,
+            'avg_chars_after': self.chars_after / n,
+        }
+
+
+def main():
+    from sentence_transformers import SentenceTransformer
+
+    print("🚀 적응형 컷오프 비교 시작!\n")
+    encoder = SentenceTransformer('all-MiniLM-L6-v2')
+
+    with open("test_passwords.txt", encoding='utf-8') as file:
+        chunks = [line.strip() for line in file if len(line.strip()) > 5]
+    embeddings = encoder.encode(chunks)
+    calibrated = calibrate_threshold(embeddings)
+    print(f"📏 보정된 임계값: {calibrated:.3f}")
+
+    queries = ["와이파이 비밀번호", "구글 드라이브 계정", "프린터 관리자", "회계 시스템", "IT 헬프데스크 연락처"]
+    query_embeddings = encoder.encode(queries)
+
+    for strategy in STRATEGIES:
+        stats = ContextSizeStats()
+        for query_embedding in query_embeddings:
+            sims = embeddings @ query_embedding / (
+                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding))
+            top = np.argsort(sims)[::-1][:3]
+            scores = [float(sims[i]) for i in top]
+            before = [chunks[i] for i, s in zip(top, scores) if s > 0.1]
+            threshold = calibrated if strategy == 'calibrated' else 0.1
+            keep = apply_cutoff(scores, strategy, threshold=threshold)
+            stats.record(before, [chunks[i] for i in top[:keep]])
+        s = stats.summary()
+        print(f"  {strategy:>10}: 청크 {s['avg_chunks_before']:.2f} → {s['avg_chunks_after']:.2f}, "
+              f"문자 {s['avg_chars_before']:.0f} → {s['avg_chars_after']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# reranker.py - 선택적 Cross-Encoder 재정렬 단계
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CrossEncoderReranker:
+    """1차 검색 상위 N개 후보를 작은 CPU cross-encoder로 재정렬
+
+    - top_n: 재정렬할 후보 수
+    - latency_budget_ms: 재정렬에 쓸 수 있는 최대 시간 (초과하면 남은 후보는 1차 순서 유지)
+    - skip_margin: 1위와 2위의 1차 점수 차이가 이 값 이상이면 재정렬 생략
+    """
+
+    def __init__(self, model_name='cross-encoder/ms-marco-MiniLM-L-6-v2', top_n=10,
+                 latency_budget_ms=300, skip_margin=0.15, batch_size=4, cache_size=2048):
+        self.model_name = model_name
+        self.top_n = top_n
+        self.latency_budget_ms = latency_budget_ms
+        self.skip_margin = skip_margin
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.last_stats = {}
+
+    @property
+    def model(self):
+        """모델은 처음 사용할 때 로드"""
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device='cpu')
+        return self._model
+
+    def _cache_key(self, query, text):
+        return query, hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key, score):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def is_decisive(self, scores):
+        """1차 점수 차이가 충분히 크면 재정렬이 필요 없음"""
+        if scores is None or len(scores) < 2 or self.skip_margin is None:
+            return False
+        return scores[0] - scores[1] >= self.skip_margin
+
+    def rerank(self, query, candidates, scores=None):
+        """후보 텍스트를 재정렬해서 반환 (candidates와 scores는 1차 점수 내림차순)"""
+        start = time.perf_counter()
+        self.last_stats = {'skipped': False, 'scored': 0, 'cached': 0, 'elapsed_ms': 0.0}
+
+        if len(candidates) < 2 or self.is_decisive(scores):
+            self.last_stats['skipped'] = True
+            return list(candidates)
+
+        head = list(candidates[:self.top_n])
+        tail = list(candidates[self.top_n:])
+
+        # 캐시에 있는 점수 먼저 채우기
+        ce_scores = {}
+        pending = []
+        for i, text in enumerate(head):
+            score = self._cache_get(self._cache_key(query, text))
+            if score is None:
+                pending.append(i)
+            else:
+                ce_scores[i] = score
+                self.last_stats['cached'] += 1
+
+        # 예산 안에서 1차 순위가 높은 후보부터 배치로 점수 계산
+        deadline = start + self.latency_budget_ms / 1000
+        for b in range(0, len(pending), self.batch_size):
+            if time.perf_counter() >= deadline:
+                break
+            batch = pending[b:b + self.batch_size]
+            batch_scores = self.model.predict([(query, head[i]) for i in batch])
+            for i, score in zip(batch, batch_scores):
+                ce_scores[i] = float(score)
+                self._cache_put(self._cache_key(query, head[i]), float(score))
+            self.last_stats['scored'] += len(batch)
+
+        # 점수가 있는 후보는 재정렬, 시간 부족으로 남은 후보는 1차 순서 유지
+        scored = sorted(ce_scores, key=lambda i: ce_scores[i], reverse=True)
+        unscored = [i for i in range(len(head)) if i not in ce_scores]
+        reranked = [head[i] for i in scored + unscored] + tail
+
+        self.last_stats['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return reranked
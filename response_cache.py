@@ -0,0 +1,165 @@
+# response_cache.py - 같은 프롬프트의 LLM 응답을 재사용하는 영구 캐시 (SQLite)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from encrypted_store import PREFIX, get_sealer, is_sealed
+
+DEFAULT_PATH = "./llm_response_cache.sqlite3"
+
+
+def prompt_key(provider, model, temperature, prompt, base_url=None, options=None):
+    """(프로바이더, API 주소, 모델, temperature, 생성 옵션, 프롬프트 해시) 캐시 키
+
+    같은 모델 이름이라도 다른 서버(대역 서버 등)의 응답은 섞이지 않게 주소도 키에 포함
+    options는 출력에 영향을 주는 나머지 생성 옵션 (max_tokens 등, None인 값은 지정하지 않은 것과 같음)
+    """
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    options = sorted((name, value) for name, value in (options or {}).items() if value is not None)
+    raw = json.dumps([provider, base_url, model, temperature, options, prompt_hash])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LLM 응답 캐시
+
+    - ttl: 항목 유지 시간(초)
+    - max_bytes: 저장된 응답 총 크기 상한 (초과하면 가장 오래 안 쓴 항목부터 제거)
+    - sealer: ChunkSealer가 있으면 응답을 AES-GCM으로 봉인해서 저장 (답변에 비밀번호가 들어가므로)
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024, sealer=None):
+        self.path = path
+        self.sealer = sealer
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                temperature REAL,
+                response TEXT,
+                size INTEGER,
+                created REAL,
+                accessed REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        if sealer is not None:
+            # 암호화를 켜기 전에 평문으로 저장된 응답은 지움
+            self._conn.execute("DELETE FROM responses WHERE response NOT LIKE ?", (f"{PREFIX}%",))
+        self._conn.commit()
+        self.metrics = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, provider, model, temperature, prompt, base_url=None, options=None):
+        """캐시된 응답 반환, 없거나 만료되면 None"""
+        key = prompt_key(provider, model, temperature, prompt, base_url, options)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.metrics['misses'] += 1
+                return None
+
+            response, created = row
+            if now - created > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.metrics['expirations'] += 1
+                self.metrics['misses'] += 1
+                return None
+
+            response = self._open(key, response)
+            if response is None:
+                # 키가 바뀌었거나 암호화를 끈 뒤 남은 봉인 항목은 읽을 수 없으므로 삭제
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.metrics['misses'] += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.metrics['hits'] += 1
+            return response
+
+    def _open(self, key, stored):
+        """저장된 응답 복호화 (평문 항목은 암호화가 꺼져 있을 때만 사용, 읽을 수 없으면 None)"""
+        if not is_sealed(stored):
+            return stored if self.sealer is None else None
+        if self.sealer is None:
+            return None
+        try:
+            return self.sealer.open(stored, key)
+        except Exception:
+            return None
+
+    def put(self, provider, model, temperature, prompt, response, base_url=None, options=None):
+        """응답 저장 후 크기 상한을 넘으면 오래된 항목 제거"""
+        key = prompt_key(provider, model, temperature, prompt, base_url, options)
+        now = time.time()
+        if self.sealer is not None:
+            response = self.sealer.seal(response, key)
+        size = len(response.encode('utf-8'))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, temperature, response, size, now, now)
+            )
+            self.metrics['writes'] += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.metrics['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """적중/실패 지표와 저장 크기"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            total = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'entries': entries,
+                'bytes': size,
+                'hit_rate': self.metrics['hits'] / total if total else 0.0,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """프로세스 공유 캐시 (경로는 LLM_RESPONSE_CACHE 환경변수로 변경, 청크 암호화가 켜져 있으면 응답도 봉인)"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(os.getenv('LLM_RESPONSE_CACHE', DEFAULT_PATH), sealer=get_sealer())
+        return _default_cache
@@ -0,0 +1,139 @@
+# semantic_cache.py - 의미 기반 답변 캐시 (비슷한 질문이면 LLM 호출 생략)
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from conversation_memory import topic_terms
+
+
+def chunk_hash(text):
+    """청크 내용 해시 (재수집 시 변경 여부 판단용)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def corpus_fingerprint(texts):
+    """코퍼스 전체 버전 (청크 내용 + 순서)"""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(chunk_hash(text).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+class SemanticAnswerCache:
+    """질문 임베딩 유사도로 과거 답변을 재사용하는 캐시
+
+    - threshold: 이 코사인 유사도 이상이면 같은 질문으로 간주
+    - ttl: 항목 유지 시간(초)
+    - max_entries: 최대 항목 수 (초과하면 가장 오래 안 쓴 항목 제거)
+
+    유사도가 높아도 질문의 주제어(서비스 이름 등)가 다르면 다른 질문으로 봅니다 ('슬랙 비밀번호' ≠ '줌 비밀번호').
+    답변이 참조한 청크가 현재 코퍼스에 없으면(재수집으로 바뀌었으면) 무효로 처리합니다.
+    """
+
+    def __init__(self, encoder, threshold=0.92, ttl=3600, max_entries=256):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _embed(self, query):
+        vector = np.asarray(self.encoder.encode([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _is_valid(self, entry, corpus, version):
+        if entry['chunk_hashes']:
+            return corpus is not None and entry['chunk_hashes'] <= corpus
+        return entry['version'] == version
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self.metrics['expirations'] += len(expired)
+
+    def lookup(self, query, corpus=None, version=None, namespace='', context=''):
+        """비슷한 과거 질문의 (답변, 참고 문서) 반환, 없으면 None
+
+        corpus: 현재 코퍼스의 청크 해시 집합, version: 코퍼스 버전
+        context: 후속 질문을 해석한 앞 대화 주제 (ConversationMemory.context_for), 같은 맥락의 답변만 재사용
+        """
+        vector = self._embed(query)
+        terms = frozenset(topic_terms(query))
+
+        with self._lock:
+            self._expire(time.time())
+
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry['namespace'] != namespace or entry['terms'] != terms or entry['context'] != context:
+                    continue
+                if not self._is_valid(entry, corpus, version):
+                    continue
+                score = float(vector @ entry['vector'])
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.metrics['misses'] += 1
+                return None
+
+            self.metrics['hits'] += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            return entry['answer'], list(entry['references'])
+
+    def store(self, query, answer, references=None, version=None, namespace='', context=''):
+        """답변 저장 (참고 문서의 청크 해시, 주제어, 대화 맥락을 함께 기록)"""
+        references = list(references or [])
+        entry = {
+            'query': query,
+            'vector': self._embed(query),
+            'terms': frozenset(topic_terms(query)),
+            'context': context,
+            'answer': answer,
+            'references': references,
+            'chunk_hashes': frozenset(chunk_hash(text) for text in references),
+            'version': version,
+            'namespace': namespace,
+            'created': time.time(),
+        }
+
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+    def invalidate_chunks(self, hashes):
+        """지정한 청크를 참조하는 항목 제거 (재수집 시 호출)"""
+        hashes = set(hashes)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['chunk_hashes'] & hashes]
+            for key in stale:
+                del self._entries[key]
+            self.metrics['invalidations'] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """적중률 등 캐시 지표"""
+        with self._lock:
+            total = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'size': len(self._entries),
+                'hit_rate': self.metrics['hits'] / total if total else 0.0,
+            }
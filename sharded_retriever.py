@@ -0,0 +1,246 @@
+# sharded_retriever.py - 파일/부서별 샤드 검색 (병렬 fan-out + k-way 병합)
+# app.py는 세션 코퍼스를 파일별 샤드로 나눠 검색 (rag_pipeline.search_documents의 retriever)
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from mmap_embeddings import EmbeddingStore
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _key_func(key):
+    return key if callable(key) else (lambda doc: doc.get(key, 'default'))
+
+
+def partition_documents(documents, key='filename'):
+    """청크를 샤드별로 분할 (key는 필드 이름 또는 함수)"""
+    get_key = _key_func(key)
+    shards = {}
+    for doc in documents:
+        shards.setdefault(get_key(doc), []).append(doc)
+    return shards
+
+
+class TableRows:
+    """ChunkTable 일부 행의 시퀀스 뷰 (행 객체는 검색 결과로 뽑힐 때만 만들고, 본문도 그때 복호화)"""
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = np.asarray(rows, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.table[int(self.rows[i])]
+
+
+class Shard:
+    """독립적인 메모리 내 임베딩 인덱스 하나
+
+    normalized=True면 이미 정규화된 벡터로 보고 그대로 사용 (메모리 맵 슬라이스를 복사하지 않음)
+    """
+
+    def __init__(self, name, documents, embeddings, normalized=False, signature=None):
+        if len(documents) != len(embeddings):
+            raise ValueError(f"샤드 '{name}': 문서 수와 임베딩 수가 다릅니다")
+        self.name = name
+        self.documents = documents
+        self.embeddings = np.asarray(embeddings, dtype=np.float32) if normalized else _normalize(embeddings)
+        self.signature = signature
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query_vector, top_k, min_score=0.1):
+        """샤드 내 top-k 검색 (점수 내림차순)"""
+        if not len(self.documents):
+            return []
+        scores = self.embeddings @ query_vector
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.name, self.documents[i]) for i in top if scores[i] > min_score]
+
+
+class ChromaShard:
+    """Chroma 컬렉션 하나를 샤드로 사용"""
+
+    def __init__(self, name, collection):
+        self.name = name
+        self.collection = collection
+
+    def __len__(self):
+        return self.collection.count()
+
+    def search(self, query_vector, top_k, min_score=0.1):
+        results = self.collection.query(
+            query_embeddings=[query_vector.tolist()],
+            n_results=top_k
+        )
+        texts = results['documents'][0]
+        metadatas = results['metadatas'][0] or [{}] * len(texts)
+        hits = []
+        for text, meta, distance in zip(texts, metadatas, results['distances'][0]):
+            score = 1 - distance / 2  # 정규화된 벡터의 L2 거리 → 코사인
+            if score > min_score:
+                hits.append((score, self.name, {'text': text, **(meta or {})}))
+        return hits
+
+
+class ShardedRetriever:
+    """샤드별로 동시에 검색하고 per-shard top-k를 힙으로 병합"""
+
+    def __init__(self, encoder, max_workers=4):
+        self.encoder = encoder
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shard')
+
+    @classmethod
+    def from_documents(cls, documents, encoder, key='filename', embeddings=None, max_workers=4):
+        """문서 목록을 key 기준으로 나눠서 샤드 생성"""
+        retriever = cls(encoder, max_workers=max_workers)
+        if embeddings is not None:
+            get_key = _key_func(key)
+            positions = {}
+            for i, doc in enumerate(documents):
+                positions.setdefault(get_key(doc), []).append(i)
+            for name, ids in positions.items():
+                retriever.load_shard(name, [documents[i] for i in ids], np.asarray(embeddings)[ids])
+        else:
+            for name, docs in partition_documents(documents, key).items():
+                retriever.load_shard(name, docs)
+        return retriever
+
+    @classmethod
+    def from_table(cls, table, embeddings, encoder, max_workers=4):
+        """ChunkTable + EmbeddingStore를 파일별 샤드로 나눔 (sync_table 참고)"""
+        retriever = cls(encoder, max_workers=max_workers)
+        retriever.sync_table(table, embeddings)
+        return retriever
+
+    def sync_table(self, table, embeddings):
+        """코퍼스가 바뀌면 바뀐 파일의 샤드만 다시 로드하고 없어진 파일의 샤드는 언로드
+
+        샤드 벡터는 EmbeddingStore.view로 가져오므로 연속된 행이면 공유 메모리 맵을 복사하지 않음
+        (행 위치와 청크 해시가 같은 파일은 기존 샤드를 그대로 사용), {'loaded', 'unloaded', 'kept'} 반환
+        """
+        wanted = {}
+        for name in table.filenames:
+            rows = table.file_rows(name)
+            wanted[name] = (rows, (int(rows[0]), table.hashes[rows].tobytes()) if len(rows) else None)
+
+        with self._lock:
+            current = dict(self._shards)
+        changes = {'loaded': [], 'unloaded': [], 'kept': []}
+        for name in current:
+            if name not in wanted:
+                self.unload_shard(name)
+                changes['unloaded'].append(name)
+        for name, (rows, signature) in wanted.items():
+            shard = current.get(name)
+            if isinstance(shard, Shard) and shard.signature == signature:
+                changes['kept'].append(name)
+                continue
+            vectors = (embeddings.view(rows) if isinstance(embeddings, EmbeddingStore)
+                       else _normalize(np.asarray(embeddings)[rows]))
+            self.add_shard(Shard(name, TableRows(table, rows), vectors, normalized=True, signature=signature))
+            changes['loaded'].append(name)
+        return changes
+
+    def load_shard(self, name, documents, embeddings=None):
+        """샤드 로드 (같은 이름이 있으면 교체)"""
+        if embeddings is None:
+            embeddings = self.encoder.encode([doc['text'] for doc in documents])
+        shard = Shard(name, documents, embeddings)
+        with self._lock:
+            self._shards[name] = shard
+        return shard
+
+    def add_shard(self, shard):
+        """이미 만들어진 샤드(ChromaShard 등) 등록"""
+        with self._lock:
+            self._shards[shard.name] = shard
+
+    def unload_shard(self, name):
+        """샤드 언로드 (다른 샤드는 영향 없음)"""
+        with self._lock:
+            return self._shards.pop(name, None) is not None
+
+    def shard_names(self):
+        with self._lock:
+            return list(self._shards)
+
+    def stats(self):
+        """샤드별 청크 수"""
+        with self._lock:
+            shards = list(self._shards.values())
+        return {shard.name: len(shard) for shard in shards}
+
+    def search(self, query, top_k=3, shards=None, min_score=0.1):
+        """전체(또는 지정한) 샤드를 병렬 검색해서 top-k 병합"""
+        with self._lock:
+            targets = [s for name, s in self._shards.items() if shards is None or name in shards]
+        if not targets:
+            return []
+
+        query_vector = _normalize(self.encoder.encode([query]))[0]
+        futures = [self._executor.submit(s.search, query_vector, top_k, min_score) for s in targets]
+        per_shard = [f.result() for f in futures]
+
+        # 각 샤드 결과는 이미 내림차순이므로 k-way 병합 후 앞에서 k개만 사용
+        merged = heapq.merge(*per_shard, key=lambda hit: -hit[0])
+        results = []
+        for score, name, doc in itertools.islice(merged, top_k):
+            results.append({**doc, 'score': score, 'shard': name})
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def main():
+    from sentence_transformers import SentenceTransformer
+    from docx import Document
+
+    print("🚀 샤드 검색 테스트 시작!\n")
+    encoder = SentenceTransformer('all-MiniLM-L6-v2')
+    retriever = ShardedRetriever(encoder)
+
+    # 파일마다 하나의 샤드
+    documents = []
+    doc = Document("pstorm_pw.docx")
+    for i, para in enumerate(doc.paragraphs):
+        if para.text.strip():
+            documents.append({'id': f'pw_{i}', 'text': para.text.strip(), 'filename': 'pstorm_pw.docx'})
+    with open("test_passwords.txt", encoding='utf-8') as file:
+        for i, line in enumerate(file):
+            if line.strip():
+                documents.append({'id': f'txt_{i}', 'text': line.strip(), 'filename': 'test_passwords.txt'})
+
+    for name, docs in partition_documents(documents).items():
+        retriever.load_shard(name, docs)
+        print(f"✅ 샤드 로드: {name} ({len(docs)}개)")
+
+    for query in ["와이파이 비번", "구글 계정", "프린터"]:
+        print(f"\n🔍 '{query}' 검색:")
+        for hit in retriever.search(query, top_k=3):
+            print(f"  [{hit['shard']}] {hit['score']:.3f} {hit['text']}")
+
+    retriever.unload_shard('test_passwords.txt')
+    print(f"\n📊 언로드 후 샤드: {retriever.stats()}")
+    retriever.close()
+
+
+if __name__ == "__main__":
+    main()
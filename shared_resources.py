@@ -0,0 +1,181 @@
+# shared_resources.py - 프로세스 전체에서 공유하는 무거운 리소스 (임베딩 모델, Chroma 클라이언트/인덱스)
+# 브라우저 세션마다 모델과 SQLite 클라이언트를 따로 만들지 않도록 참조 카운트로 관리
+import os
+import threading
+import weakref
+
+from versioned_index import VersionedIndex
+
+
+class ResourceRegistry:
+    """스레드 안전한 참조 카운트 리소스 저장소
+
+    acquire()로 처음 요청될 때 생성하고, 마지막 release() 때 closer를 호출하고 제거합니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}         # key -> {'value', 'refs', 'closer'}
+        self._creating = {}        # key -> 생성 중 잠금 (같은 리소스를 두 번 만들지 않도록)
+
+    def acquire(self, key, factory, closer=None):
+        """리소스를 가져오고 참조 수 증가 (없으면 factory()로 생성)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['refs'] += 1
+                return entry['value']
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        # 느린 생성(모델 로드)은 전체 잠금 밖에서, 같은 키끼리만 대기
+        with creating:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry['refs'] += 1
+                    return entry['value']
+            value = factory()
+            with self._lock:
+                self._entries[key] = {'value': value, 'refs': 1, 'closer': closer}
+                self._creating.pop(key, None)
+            return value
+
+    def release(self, key):
+        """참조 수 감소, 0이 되면 정리"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['refs'] -= 1
+            if entry['refs'] > 0:
+                return
+            del self._entries[key]
+        if entry['closer'] is not None:
+            try:
+                entry['closer'](entry['value'])
+            except Exception:
+                pass
+
+    def get(self, key):
+        """현재 값 (참조 수는 바꾸지 않음), 없으면 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry['value'] if entry else None
+
+    def replace(self, key, value):
+        """공유 중인 값을 교체 - 모든 세션이 새 값을 보게 됨"""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]['value'] = value
+
+    def stats(self):
+        with self._lock:
+            return {key: {'refs': entry['refs'], 'type': type(entry['value']).__name__,
+                          'bytes': _estimate_bytes(entry['value'])}
+                    for key, entry in self._entries.items()}
+
+
+def _release_all(registry, keys):
+    for key in reversed(keys):
+        registry.release(key)
+    keys.clear()
+
+
+class SessionLease:
+    """세션 하나가 잡고 있는 리소스 목록
+
+    st.session_state에 보관하면 세션이 끝나 객체가 사라질 때 자동으로 release 됩니다.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or get_registry()
+        self.keys = []
+        self._finalizer = weakref.finalize(self, _release_all, self.registry, self.keys)
+        with _leases_lock:
+            _leases.add(self)
+
+    def acquire(self, key, factory, closer=None):
+        value = self.registry.acquire(key, factory, closer)
+        self.keys.append(key)
+        return value
+
+    def close(self):
+        self._finalizer()
+
+
+def encoder_key(name):
+    return ('encoder', name)
+
+
+def client_key(path):
+    return ('chroma_client', os.path.abspath(path))
+
+
+def index_key(path, alias):
+    return ('versioned_index', os.path.abspath(path), alias)
+
+
+def acquire_rag_resources(lease, path, collection_name, model_name='all-MiniLM-L6-v2'):
+    """RAG 클래스용 (임베딩 모델, Chroma 클라이언트, 버전 인덱스) 공유 핸들 획득
+
+    collection_name은 별칭이며 실제 컬렉션은 VersionedIndex가 버전별로 관리합니다.
+    """
+    def load_encoder():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    def open_client():
+        import chromadb
+        return chromadb.PersistentClient(path=path)
+
+    encoder = lease.acquire(encoder_key(model_name), load_encoder)
+    client = lease.acquire(client_key(path), open_client)
+    index = lease.acquire(index_key(path, collection_name),
+                          lambda: VersionedIndex(client, collection_name, path))
+    return encoder, client, index
+
+
+def _estimate_bytes(value):
+    """모델 파라미터 크기 (torch 모듈이면), 알 수 없으면 None"""
+    parameters = getattr(value, 'parameters', None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return None
+
+
+def process_memory_mb():
+    """현재 프로세스 RSS (MB)"""
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # 최대 RSS로 대체
+
+
+def memory_report(registry=None):
+    """프로세스 단위 메모리 보고 (세션 수와 무관하게 리소스는 한 벌)"""
+    registry = registry or get_registry()
+    with _leases_lock:
+        sessions = sum(1 for lease in _leases if lease.keys)
+    return {
+        'rss_mb': process_memory_mb(),
+        'sessions': sessions,
+        'resources': registry.stats(),
+    }
+
+
+_registry = ResourceRegistry()
+_leases = weakref.WeakSet()
+_leases_lock = threading.Lock()
+
+
+def get_registry():
+    """프로세스 공유 리소스 저장소"""
+    return _registry
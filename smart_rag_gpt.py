@@ -3,8 +3,13 @@ import os
 from sentence_transformers import SentenceTransformer
 import chromadb
 from docx import Document
-from openai import OpenAI
+from llm_client import get_client
+from ollama_generator import OllamaGenerator, DEFAULT_MODEL
+from context_assembler import assemble_context
+from answer_router import AnswerRouter, RouterStats, extractive_answer, estimate_cost
+import time
 from dotenv import load_dotenv
+from semantic_cache import SemanticAnswerCache, chunk_hash, corpus_fingerprint
 
 class SmartRAGWithGPT:
     def __init__(self):
@@ -13,16 +18,24 @@ class SmartRAGWithGPT:
         # 환경변수 로드
         load_dotenv()
         api_key = os.getenv('OPENAI_API_KEY')
+        self.provider = os.getenv('RAG_LLM_PROVIDER', 'openai')
         
-        if not api_key:
+        if self.provider == 'ollama':
+            # 로컬 모델 (네트워크 왕복 없음, 모델을 메모리에 상주시켜 첫 질문 로드 지연 제거)
+            generator = OllamaGenerator(os.getenv('OLLAMA_MODEL', DEFAULT_MODEL),
+                                        parallelism=int(os.getenv('OLLAMA_NUM_PARALLEL', '2')))
+            self.client = generator.client
+            if generator.warmup() is not None:
+                print(f"✅ ollama 모델 로드 완료: {generator.model} ({generator.load_time:.1f}s)")
+        elif not api_key:
             print("❌ OpenAI API 키가 설정되지 않았습니다!")
             print("💡 .env 파일에 OPENAI_API_KEY를 설정해주세요.")
             self.client = None
             return
-        
-        # OpenAI 클라이언트 초기화 (신버전)
-        self.client = OpenAI(api_key=api_key)
-        print("✅ OpenAI API 키 로드 완료")
+        else:
+            # 공유 OpenAI 클라이언트 (연결 풀 재사용, 30초 마감, 일시적 오류 재시도)
+            self.client = get_client('openai', model='gpt-3.5-turbo', api_key=api_key, timeout=30.0, max_retries=3)
+            print("✅ OpenAI API 키 로드 완료")
         
         # 임베딩 모델 로드
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
@@ -32,6 +45,15 @@ class SmartRAGWithGPT:
         self.chroma_client = chromadb.PersistentClient(path="./smart_chroma_db")
         self.collection = self.chroma_client.get_or_create_collection("smart_company_info")
         print("✅ 벡터 데이터베이스 설정 완료")
+        
+        # 의미 기반 답변 캐시 (비슷한 질문이면 GPT 호출 생략)
+        self.answer_cache = SemanticAnswerCache(self.model, threshold=0.92, ttl=3600, max_entries=256)
+        self.chunk_hashes = frozenset()
+        self.corpus_version = None
+        
+        # 단순 조회는 GPT 없이 답변 (경로별 지연/비용 기록)
+        self.router = AnswerRouter()
+        self.router_stats = RouterStats()
     
     def load_word_file(self, file_path):
         """Word 파일을 읽어서 문단별로 분리"""
@@ -98,20 +120,28 @@ class SmartRAGWithGPT:
             ids=ids
         )
         
+        # 바뀐 청크를 참조하던 캐시 답변 무효화
+        new_hashes = frozenset(chunk_hash(doc) for doc in documents)
+        self.answer_cache.invalidate_chunks(self.chunk_hashes - new_hashes)
+        self.chunk_hashes = new_hashes
+        self.corpus_version = corpus_fingerprint(documents)
+        
         print(f"✅ {len(documents)}개 정보 추가 완료")
     
-    def search_documents(self, query, top_k=3):
-        """문서 검색 (GPT 전 단계)"""
+    def search_documents(self, query, top_k=3, with_scores=False):
+        """문서 검색 (GPT 전 단계, with_scores=True면 코사인 유사도도 반환)"""
         results = self.collection.query(
             query_texts=[query],
             n_results=top_k
         )
         
         if results['documents'][0]:
+            if with_scores:
+                return results['documents'][0], [1 - d / 2 for d in results['distances'][0]]
             return results['documents'][0]
-        return []
+        return ([], []) if with_scores else []
     
-    def generate_answer_with_gpt(self, question, context_docs):
+    def generate_answer_with_gpt(self, question, context_docs, token_budget=1500, bypass_cache=False):
         """GPT를 사용해서 자연스러운 답변 생성"""
         
         if not self.client:
@@ -120,8 +150,9 @@ class SmartRAGWithGPT:
         if not context_docs:
             return "죄송합니다. 관련 정보를 찾을 수 없습니다."
         
-        # 컨텍스트 문서들을 하나의 문자열로 합치기
-        context = "\n".join([f"- {doc}" for doc in context_docs])
+        # 중복/포함 청크를 빼고 토큰 예산 안에서 컨텍스트 구성
+        assembled = assemble_context(context_docs, token_budget=token_budget)
+        context = "\n".join([f"- {doc}" for doc in assembled.chunks])
         
         # GPT에게 보낼 프롬프트 구성
         prompt = f"""
@@ -141,16 +172,8 @@ class SmartRAGWithGPT:
 답변:"""
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
+            # 같은 프롬프트는 응답 캐시에서 재사용 (bypass_cache=True면 항상 새로 생성)
+            return self.client.generate_sync(prompt, max_tokens=500, temperature=0.3, bypass_cache=bypass_cache)
             
         except Exception as e:
             print(f"❌ GPT API 오류: {e}")
@@ -160,15 +183,40 @@ class SmartRAGWithGPT:
         """스마트 검색: RAG + GPT"""
         print(f"🔍 스마트 검색: '{query}'")
         
+        # 0단계: 비슷한 질문의 답변이 캐시에 있으면 바로 반환
+        cached = self.answer_cache.lookup(query, corpus=self.chunk_hashes, version=self.corpus_version)
+        if cached:
+            print(f"⚡ 캐시 적중 (적중률 {self.answer_cache.stats()['hit_rate']:.0%})")
+            return cached
+        
         # 1단계: 관련 문서 검색
-        context_docs = self.search_documents(query, top_k=3)
+        started = time.perf_counter()
+        context_docs, scores = self.search_documents(query, top_k=3, with_scores=True)
         print(f"📋 {len(context_docs)}개의 관련 문서 발견")
         
-        # 2단계: GPT로 자연스러운 답변 생성
-        answer = self.generate_answer_with_gpt(query, context_docs)
+        # 2단계: 단순 조회면 추출형 답변, 아니면 GPT로 자연스러운 답변 생성
+        decision = self.router.decide(query, scores)
+        print(f"🧭 답변 경로: {decision.path} ({decision.reason})")
+        answer = extractive_answer(query, context_docs) if decision.path == 'extractive' else None
+        if answer is not None:
+            self.router_stats.record('extractive', time.perf_counter() - started)
+        else:
+            answer = self.generate_answer_with_gpt(query, context_docs)
+            cost = estimate_cost(self.client.model, "\n".join(context_docs) + query, answer)
+            self.router_stats.record('llm', time.perf_counter() - started, cost)
+        
+        if context_docs and not answer.startswith("API 오류가 발생했습니다"):
+            self.answer_cache.store(query, answer, context_docs, version=self.corpus_version)
         
         return answer, context_docs
     
+    def print_route_summary(self):
+        """답변 경로별 지연 시간과 비용 분포 출력"""
+        print("\n📊 답변 경로 통계:")
+        for path, stats in self.router_stats.summary().items():
+            print(f"  {path}: {stats['count']}건, p50 {stats['latency_p50'] * 1000:.0f}ms / "
+                  f"p95 {stats['latency_p95'] * 1000:.0f}ms, 비용 ${stats['total_cost']:.4f}")
+    
     def chat(self):
         """대화형 스마트 검색 시스템"""
         print("\n🤖 GPT 통합 회사 정보 챗봇이 시작되었습니다!")
@@ -180,6 +228,7 @@ class SmartRAGWithGPT:
             query = input("\n❓ 무엇을 도와드릴까요? ").strip()
             
             if query.lower() in ['종료', 'quit', 'exit', '나가기']:
+                self.print_route_summary()
                 print("👋 챗봇을 종료합니다!")
                 break
             
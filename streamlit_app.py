@@ -4,10 +4,16 @@
 
 import streamlit as st
 import os
-from sentence_transformers import SentenceTransformer
-import chromadb
 from docx import Document
 import tempfile
+from reranker import CrossEncoderReranker
+from credential_extractor import CredentialIndex, format_records
+from ollama_generator import OllamaGenerator
+from encrypted_store import get_sealer, seal_documents
+from parent_child import SectionBuilder, index_records, search_parents
+from ingest_jobs import JobRunner, FINISHED, DONE, FAILED, CANCELLED, describe, fraction
+from shared_resources import (SessionLease, acquire_rag_resources, get_registry,
+                              encoder_key, index_key, memory_report)
 
 # =====================================================
 # 🎨 다크모드 CSS 스타일
@@ -193,26 +199,35 @@ def load_css():
 # =====================================================
 
 class ImprovedRAG:
+    DB_PATH = "./improved_chroma_db"
+    COLLECTION_NAME = "company_info"
+    
     def __init__(self):
-        if 'rag_initialized' not in st.session_state:
-            st.session_state.rag_initialized = True
-            
+        # 모델/클라이언트/컬렉션은 프로세스 전체가 공유하고, 세션은 참조만 보관
+        if 'rag_lease' not in st.session_state:
             with st.spinner('🧠 AI 시스템 초기화 중...'):
-                st.session_state.model = SentenceTransformer('all-MiniLM-L6-v2')
-                st.session_state.client = chromadb.PersistentClient(path="./improved_chroma_db")
-                st.session_state.collection = st.session_state.client.get_or_create_collection("company_info")
+                lease = SessionLease()
+                acquire_rag_resources(lease, self.DB_PATH, self.COLLECTION_NAME)
+                st.session_state.rag_lease = lease
             
             st.success('✅ AI 시스템 준비 완료!')
     
+    @property
+    def model(self):
+        return get_registry().get(encoder_key('all-MiniLM-L6-v2'))
+    
+    @property
+    def index(self):
+        # 버전 인덱스: 다른 세션이 문서를 다시 올려도 교체 전까지 기존 버전으로 검색
+        return get_registry().get(index_key(self.DB_PATH, self.COLLECTION_NAME))
+    
     def load_word_file(self, file_path):
-        """Word 파일을 더 정확하게 파싱 - 모든 내용 포함"""
+        """Word 파일을 섹션(부모)과 줄(자식)로 파싱 - 모든 내용 포함, 각 줄은 한 번만 저장"""
         if not os.path.exists(file_path):
-            return []
+            return [], []
         
         doc = Document(file_path)
-        texts = []
-        current_section = ""
-        section_content = []
+        builder = SectionBuilder()
         
         for i, para in enumerate(doc.paragraphs):
             text = para.text.strip()
@@ -225,97 +240,79 @@ class ImprovedRAG:
                 )
                 
                 if is_section_title:
-                    # 이전 섹션의 완전한 내용 저장
-                    if current_section and section_content:
-                        complete_section = current_section + "\n" + "\n".join(section_content)
-                        texts.append({
-                            'id': f'complete_section_{len(texts)}',
-                            'text': complete_section,
-                            'type': 'complete_section'
-                        })
-                    
-                    # 새 섹션 시작
-                    current_section = text.replace('**', '').strip()  # ** 제거
-                    section_content = []
-                    
-                    # 섹션 제목도 검색 가능하게 저장
-                    texts.append({
-                        'id': f'title_{i}',
-                        'text': current_section,
-                        'type': 'title'
-                    })
+                    # 새 섹션 시작 (** 제거, 제목 줄도 자식으로 검색 가능)
+                    builder.section(f'complete_section_{i}', text.replace('**', '').strip())
                 
-                # 섹션 내용 (ID:, PW: 등 모든 내용)
-                elif current_section:
-                    section_content.append(text)
-                    
-                    # 개별 항목도 섹션과 함께 저장
-                    combined_text = f"{current_section}\n{text}"
-                    texts.append({
-                        'id': f'item_{i}',
-                        'text': combined_text,
-                        'type': 'item'
-                    })
+                # 섹션 내용 (ID:, PW: 등 모든 내용) - 섹션 제목과 함께 임베딩
+                elif builder.in_section:
+                    builder.line(text)
                 
                 # 독립적인 내용
                 else:
-                    texts.append({
-                        'id': f'standalone_{i}',
-                        'text': text,
-                        'type': 'standalone'
-                    })
-        
-        # 마지막 섹션의 완전한 내용 저장
-        if current_section and section_content:
-            complete_section = current_section + "\n" + "\n".join(section_content)
-            texts.append({
-                'id': f'complete_final_section',
-                'text': complete_section,
-                'type': 'complete_section'
-            })
+                    builder.standalone(f'standalone_{i}', text)
         
-        return texts
-    
-    def add_documents(self, texts):
-        """문서 추가 with 메타데이터"""
-        try:
-            st.session_state.client.delete_collection("company_info")
-            st.session_state.collection = st.session_state.client.create_collection("company_info")
-        except:
-            pass
+        return builder.build()
+    
+    def build_index(self, parents, children, batch_size=1000, on_batch=None):
+        """새 버전 인덱스 구축 (세션 상태를 쓰지 않으므로 백그라운드 작업에서도 호출 가능)
         
-        if not texts:
+        자식(줄)만 임베딩하고 본문은 부모(섹션)에 한 번만 저장, 암호화가 켜져 있으면 부모 본문을 봉인
+        """
+        if not children:
             return 0
-        
-        documents = [item['text'] for item in texts]
-        ids = [item['id'] for item in texts]
-        metadatas = [{'type': item.get('type', 'unknown')} for item in texts]
-        
-        st.session_state.collection.add(
-            documents=documents,
-            ids=ids,
-            metadatas=metadatas
+        documents, ids, metadatas, embeddings = index_records(
+            parents, children, lambda texts: self.model.encode(texts, normalize_embeddings=True), get_sealer()
         )
-        
-        return len(documents)
+        self.index.build(documents, ids, metadatas, batch_size=batch_size, on_batch=on_batch,
+                         embeddings=embeddings)
+        return len(parents)
     
-    def search(self, query, top_k=10):
-        """더 정확한 검색"""
-        results = st.session_state.collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
+    def add_documents(self, parents, children):
+        """문서 추가 with 메타데이터 (새 버전 컬렉션을 다 채운 뒤 교체하므로 검색 중단 없음)"""
+        count = self.build_index(parents, children)
+        
+        # 계정 정보를 구조화된 레코드로 미리 추출 (질문 시 줄 단위 검사 생략)
+        if count:
+            st.session_state.credential_index = CredentialIndex.from_texts(parents)
+        
+        return count
+    
+    def search(self, query, top_k=10, types=None, reranker=None):
+        """더 정확한 검색 (줄 단위로 찾고 섹션 단위로 중복 없이 반환, types로 검색 대상 유형을 미리 제한)"""
+        query_embedding = self.model.encode([query], normalize_embeddings=True)[0]
+        with self.index.reading() as collection:
+            # 후보로 뽑힌 섹션만 복호화
+            hits = search_parents(collection, query_embedding,
+                                  top_k=max(top_k, reranker.top_n) if reranker else top_k,
+                                  types=types, sealer=get_sealer())
         
-        if results['documents'][0]:
+        if hits:
+            documents = [doc for doc, _, _ in hits]
+            metadatas = [metadata or {} for _, metadata, _ in hits]
+            
+            # 재정렬 (가장 가까운 줄의 L2 거리를 코사인 유사도로 환산해서 1차 점수 차이 판단)
+            if reranker and len(documents) > 1:
+                scores = [1 - distance / 2 for _, _, distance in hits]
+                meta_by_doc = dict(zip(documents, metadatas))
+                documents = reranker.rerank(query, documents, scores)
+                metadatas = [meta_by_doc[doc] for doc in documents]
+            
             # 결과와 메타데이터를 함께 반환
-            return list(zip(
-                results['documents'][0],
-                results['metadatas'][0] if results['metadatas'][0] else [{}] * len(results['documents'][0])
-            ))
+            return list(zip(documents, metadatas))[:top_k]
         return []
     
     def generate_precise_answer(self, question, search_results):
-        """더 정확하고 완전한 답변 생성 - 모든 정보 포함"""
+        """더 정확하고 완전한 답변 생성 - 모든 정보 포함
+
+        수집 시 추출한 계정 레코드가 있으면 사전 조회 + 포맷팅만으로 답변
+        """
+        credential_index = st.session_state.get('credential_index')
+        records = credential_index.lookup(question) if credential_index else []
+        if records:
+            return f"""{format_records(records)}
+
+💡 위 계정 정보로 로그인하세요!"""
+        
         if not search_results:
             return "❌ 관련 정보를 찾을 수 없습니다."
         
@@ -334,54 +331,8 @@ class ImprovedRAG:
         # 가장 완전한 정보 선택
         best_result = complete_sections[0] if complete_sections else other_results[0]
         
-        # Adobe 관련 질문
-        if any(word in q for word in ['adobe', '어도비']):
-            # Adobe 섹션에서 모든 계정 정보 추출
-            lines = best_result.split('\n')
-            account_lines = []
-            
-            for line in lines:
-                line = line.strip()
-                # ID, PW 관련 모든 라인 포함
-                if any(keyword in line for keyword in ['1)', '2)', 'ID:', 'PW:', 'id:', 'pw:', '@', 'perfect']):
-                    account_lines.append(line)
-            
-            # 완전한 계정 정보가 있으면 사용, 없으면 전체 섹션 사용
-            if account_lines:
-                formatted_info = '\n'.join(account_lines)
-            else:
-                # 전체 섹션에서 adobe 관련 부분만 추출
-                formatted_info = best_result
-            
-            return f"""🎨 **Adobe 계정 정보**
-
-{formatted_info}
-
-💡 위 계정으로 Adobe 제품에 로그인하세요!"""
-        
-        # Gmail 관련 질문  
-        elif any(word in q for word in ['gmail', '구글', 'google']):
-            lines = best_result.split('\n')
-            account_lines = []
-            
-            for line in lines:
-                line = line.strip()
-                if any(keyword in line.lower() for keyword in ['1)', '2)', 'id:', 'pw:', '@gmail', 'pstorm']):
-                    account_lines.append(line)
-            
-            if account_lines:
-                formatted_info = '\n'.join(account_lines)
-            else:
-                formatted_info = best_result
-            
-            return f"""📧 **Gmail 계정 정보**
-
-{formatted_info}
-
-💡 위 계정으로 Gmail에 로그인하세요!"""
-        
         # 와이파이 관련 질문
-        elif any(word in q for word in ['와이파이', 'wifi', '무선']):
+        if any(word in q for word in ['와이파이', 'wifi', '무선']):
             return f"""📶 **와이파이 정보**
 
 {best_result}
@@ -394,6 +345,85 @@ class ImprovedRAG:
 
 {best_result}"""
 
+    def stream_local_answer(self, question, search_results, generator):
+        """로컬 LLM으로 자연스러운 답변을 토큰 단위로 생성 (완전한 섹션을 먼저 컨텍스트로 사용)"""
+        complete_sections = [doc for doc, metadata in search_results if metadata.get('type') == 'complete_section']
+        others = [doc for doc, metadata in search_results if metadata.get('type') != 'complete_section']
+        yield from generator.stream(question, complete_sections + others)
+
+@st.cache_resource
+def load_local_generator():
+    """ollama 로컬 생성기 (모델을 한 번 로드해서 상주, 실패는 캐시하지 않도록 예외로 전달)"""
+    generator = OllamaGenerator(parallelism=2, keep_alive='30m')
+    if generator.warmup() is None:
+        raise RuntimeError("ollama 서버에 연결할 수 없습니다")
+    return generator
+
+def ingest_word_file(job, rag, file_path, remove_after=False):
+    """백그라운드 작업: Word 파싱 → 새 버전 인덱스 구축 (그동안 채팅은 기존 버전으로 검색)"""
+    # 세션이 먼저 끝나도 공유 리소스가 해제되지 않도록 작업이 직접 참조를 잡음
+    lease = SessionLease()
+    try:
+        acquire_rag_resources(lease, rag.DB_PATH, rag.COLLECTION_NAME)
+        parents, children = rag.load_word_file(file_path)
+        job.progress(files_parsed=1, chunks_total=len(parents) + len(children))
+        if not children:
+            raise ValueError("문서를 읽을 수 없습니다")
+        
+        def on_batch(done):
+            job.progress(chunks_embedded=done)
+            job.check_cancelled()  # 취소되면 만들던 버전은 삭제되고 기존 버전 유지
+        
+        rag.build_index(parents, children, batch_size=64, on_batch=on_batch)
+        return {'texts': [dict(item) for item in seal_documents(parents)]}  # 결과 파일에도 평문을 남기지 않음
+    finally:
+        lease.close()
+        if remove_after:
+            os.unlink(file_path)
+
+@st.cache_resource
+def load_job_runner():
+    """문서 처리 작업 큐 (모든 세션이 공유, 진행 상황은 ./ingest_jobs에 저장)"""
+    return JobRunner(max_workers=1)  # 인덱스 교체는 한 번에 하나씩
+
+def apply_ingest_job(job):
+    """끝난 문서 처리 작업 결과를 세션에 반영"""
+    if job['status'] == DONE:
+        texts = seal_documents(load_job_runner().result(job['id'])['texts'])
+        st.session_state.credential_index = CredentialIndex.from_texts(texts)
+        st.session_state.docs_loaded = True
+        st.success(f'✅ {len(texts)}개 정보 로드 완료!')
+    elif job['status'] == FAILED:
+        st.error(f"❌ 문서 처리 실패: {job['error']}")
+    elif job['status'] == CANCELLED:
+        st.info("⏹️ 문서 처리를 취소했습니다 (기존 문서로 계속 검색)")
+    else:
+        st.warning("⚠️ 서버 재시작으로 문서 처리가 중단되었습니다. 다시 처리해주세요")
+
+@st.fragment(run_every=1.0)
+def ingest_job_status(job_id):
+    """진행 중인 작업 표시 (이 부분만 1초마다 갱신), 끝나면 전체를 다시 실행해서 결과 반영"""
+    runner = load_job_runner()
+    job = runner.get(job_id)
+    if job is None or job['status'] in FINISHED:
+        st.rerun()
+    
+    st.progress(fraction(job), text=f"📖 문서 처리 중... {describe(job)}")
+    if st.button("⏹️ 취소", key="cancel_ingest_job"):
+        runner.cancel(job_id)
+
+def submit_ingest_job(rag, file_path, remove_after=False):
+    """문서 처리 작업 등록 (작업 ID를 URL에 두어 새로고침해도 진행 상황을 이어서 표시)"""
+    st.query_params["job"] = load_job_runner().submit(
+        'word', ingest_word_file, rag, file_path, remove_after, progress={'files_total': 1}
+    )
+    st.rerun()
+
+@st.cache_resource
+def load_reranker():
+    """Cross-Encoder 재정렬기 로드 (프로세스 전체에서 점수 캐시 공유)"""
+    return CrossEncoderReranker(top_n=10, latency_budget_ms=300, skip_margin=0.15)
+
 # =====================================================
 # 🌐 메인 애플리케이션
 # =====================================================
@@ -428,42 +458,50 @@ def main():
             help="회사 정보가 담긴 .docx 파일을 선택하세요"
         )
         
+        # 진행 중인 문서 처리 작업 (끝났으면 결과 반영)
+        job_id = st.query_params.get("job")
+        if job_id:
+            job = load_job_runner().get(job_id)
+            if job is None:
+                del st.query_params["job"]
+                job_id = None
+            elif job['status'] in FINISHED:
+                apply_ingest_job(job)
+                del st.query_params["job"]
+                job_id = None
+            else:
+                ingest_job_status(job_id)
+        
         if uploaded_file is not None:
-            if st.button("📄 문서 처리하기", type="primary"):
-                with st.spinner('📖 문서 분석 중...'):
-                    # 임시 파일로 저장
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        temp_path = tmp_file.name
-                    
-                    try:
-                        # 문서 처리
-                        texts = rag.load_word_file(temp_path)
-                        if texts:
-                            doc_count = rag.add_documents(texts)
-                            st.success(f'✅ {doc_count}개 정보 로드 완료!')
-                            st.session_state.docs_loaded = True
-                        else:
-                            st.error('❌ 문서를 읽을 수 없습니다')
-                    finally:
-                        # 임시 파일 삭제
-                        os.unlink(temp_path)
+            if st.button("📄 문서 처리하기", type="primary", disabled=bool(job_id)):
+                # 임시 파일로 저장 (작업이 끝나면 삭제)
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
+                    tmp_file.write(uploaded_file.getvalue())
+                submit_ingest_job(rag, tmp_file.name, remove_after=True)
         
         # 기존 파일 로드 (개발용)
         st.markdown("---")
         st.markdown("### 🔧 개발자 옵션")
-        if st.button("📄 기본 파일 로드"):
+        if st.button("📄 기본 파일 로드", disabled=bool(job_id)):
             file_path = "pstorm_pw.docx"
             if os.path.exists(file_path):
-                with st.spinner('📖 문서 분석 중...'):
-                    texts = rag.load_word_file(file_path)
-                    if texts:
-                        doc_count = rag.add_documents(texts)
-                        st.success(f'✅ {doc_count}개 정보 로드 완료!')
-                        st.session_state.docs_loaded = True
+                submit_ingest_job(rag, file_path)
             else:
                 st.error(f'❌ {file_path} 파일을 찾을 수 없습니다')
         
+        # 검색 범위 설정
+        st.markdown("---")
+        st.markdown("### 🎯 검색 범위")
+        st.multiselect(
+            "검색할 정보 유형",
+            options=['complete_section', 'item', 'title', 'standalone'],
+            key='type_filter',
+            help="비워두면 전체를 검색합니다"
+        )
+        st.checkbox("🔀 정밀 재정렬 사용", key='use_reranker', help="상위 후보를 cross-encoder로 다시 정렬합니다")
+        st.checkbox("🖥️ 로컬 LLM 답변 (ollama)", key='use_local_llm',
+                    help="계정 정보가 아닌 질문은 로컬 모델로 답변을 생성합니다 (ollama serve 필요)")
+        
         # 상태 표시
         st.markdown("---")
         st.markdown("### 📊 상태")
@@ -471,6 +509,11 @@ def main():
             st.markdown("🟢 **문서 로드됨**")
         else:
             st.markdown("🔴 **문서 필요**")
+        
+        # 리소스는 프로세스 단위로 공유되므로 메모리도 프로세스 단위로 표시
+        report = memory_report()
+        st.caption(f"🧠 프로세스 메모리 {report['rss_mb']:.0f}MB · 공유 리소스 {len(report['resources'])}개 · "
+                   f"활성 세션 {report['sessions']}개")
     
     # 메인 채팅 영역
     st.markdown("### 💬 AI와 대화하기")
@@ -501,11 +544,39 @@ def main():
         with st.chat_message("assistant"):
             with st.spinner("🔍 검색 중..."):
                 # 검색 및 답변 생성
-                results = rag.search(prompt, top_k=5)
-                response = rag.generate_precise_answer(prompt, results)
+                results = rag.search(
+                    prompt,
+                    top_k=5,
+                    types=st.session_state.get('type_filter'),
+                    reranker=load_reranker() if st.session_state.get('use_reranker') else None
+                )
                 
-                # 답변 표시
-                st.markdown(response)
+                # 계정 정보는 추출된 레코드로 즉시 답변, 그 외 질문은 로컬 LLM이 켜져 있으면 스트리밍 생성
+                credential_index = st.session_state.get('credential_index')
+                generator = None
+                if st.session_state.get('use_local_llm'):
+                    try:
+                        generator = load_local_generator()
+                    except RuntimeError as e:
+                        st.warning(f"⚠️ {e} - 템플릿 답변을 사용합니다")
+                if generator and results and not (credential_index and credential_index.lookup(prompt)):
+                    placeholder = st.empty()
+                    response = ""
+                    try:
+                        for token in rag.stream_local_answer(prompt, results, generator):
+                            response += token
+                            placeholder.markdown(response + " ▌")
+                    except Exception as e:
+                        # 워밍업 후 ollama가 죽었으면 템플릿 답변으로 대체 (다음 질문에서 다시 연결 시도)
+                        load_local_generator.clear()
+                        st.warning(f"⚠️ 로컬 LLM 답변 생성 실패 ({e}) - 템플릿 답변을 사용합니다")
+                        response = rag.generate_precise_answer(prompt, results)
+                    placeholder.markdown(response)
+                else:
+                    response = rag.generate_precise_answer(prompt, results)
+                    
+                    # 답변 표시
+                    st.markdown(response)
         
         # 응답을 히스토리에 추가
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -0,0 +1,35 @@
+# test_conversation_memory.py - 후속 질문 재작성 테스트 (python -m pytest test_conversation_memory.py)
+from conversation_memory import ConversationMemory, is_follow_up
+
+
+def ask(memory, query):
+    rewritten = memory.rewrite(query)
+    memory.add('user', query)
+    memory.add('assistant', '...')
+    return rewritten
+
+
+def test_independent_questions_are_not_rewritten():
+    memory = ConversationMemory()
+    assert ask(memory, 'adobe 계정 정보') == 'adobe 계정 정보'
+    assert ask(memory, 'gmail 비밀번호는?') == 'gmail 비밀번호는?'
+    assert ask(memory, '노션 비밀번호는?') == '노션 비밀번호는?'
+    assert ask(memory, '슬랙 계정은?') == '슬랙 계정은?'
+
+
+def test_follow_up_uses_last_question_with_topic():
+    memory = ConversationMemory()
+    ask(memory, 'adobe 계정 정보')
+    assert ask(memory, '그럼 비밀번호는?') == 'adobe 계정 정보 그럼 비밀번호는?'
+    # 후속 질문이 이어져도 주제는 한 번만 붙음
+    assert ask(memory, '아이디는?') == 'adobe 계정 정보 아이디는?'
+    ask(memory, 'gmail 계정')
+    assert ask(memory, '비번은?') == 'gmail 계정 비번은?'
+
+
+def test_is_follow_up():
+    assert is_follow_up('그럼 비밀번호는?')
+    assert is_follow_up('what about it?')
+    assert not is_follow_up('그럼 gmail 비밀번호는?')
+    assert not is_follow_up('와이파이는?')
+    assert not is_follow_up('adobe 계정 정보')
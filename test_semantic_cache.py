@@ -0,0 +1,39 @@
+# test_semantic_cache.py - 의미 기반 답변 캐시 적중 조건 테스트 (python -m pytest test_semantic_cache.py)
+import numpy as np
+
+from conversation_memory import ConversationMemory
+from semantic_cache import SemanticAnswerCache
+
+
+class SameVectorEncoder:
+    """모든 질문을 같은 벡터로 (유사도만으로는 구분되지 않는 최악의 경우)"""
+
+    def encode(self, texts):
+        return np.ones((len(texts), 8), dtype=np.float32)
+
+
+def make_cache():
+    return SemanticAnswerCache(SameVectorEncoder(), threshold=0.92)
+
+
+def test_different_service_is_a_miss():
+    cache = make_cache()
+    cache.store('슬랙 비밀번호', 'slack-pw', version='v1')
+    assert cache.lookup('줌 비밀번호', version='v1') is None
+    assert cache.lookup('슬랙 비밀번호 알려줘', version='v1') == ('slack-pw', [])
+
+
+def test_follow_up_needs_same_conversation_topic():
+    cache = make_cache()
+    memory = ConversationMemory()
+    memory.add('user', '슬랙 계정')
+    context = memory.context_for('그럼 비밀번호는?')
+    assert context == '슬랙 계정'
+    cache.store('그럼 비밀번호는?', 'slack-pw', version='v1', context=context)
+
+    other = ConversationMemory()
+    other.add('user', '줌 계정')
+    assert cache.lookup('그럼 비밀번호는?', version='v1', context=other.context_for('그럼 비밀번호는?')) is None
+    assert cache.lookup('그럼 비밀번호는?', version='v1', context=context) == ('slack-pw', [])
+    # 주제어가 있는 질문은 앞 대화와 상관없이 같은 맥락
+    assert memory.context_for('줌 비밀번호는?') == ''
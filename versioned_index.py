@@ -0,0 +1,219 @@
+# versioned_index.py - 블루/그린 방식 Chroma 인덱스 (새 버전을 다 만든 뒤 별칭을 원자적으로 교체)
+# 문서를 다시 올리는 동안에도 기존 버전으로 계속 검색되므로 중단 시간이 없음
+# 적재는 ingest_log에 먼저 기록하므로 빌드 도중 죽어도 재시작 시 남은 배치만 마저 적용
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from ingest_log import LOG_FILE, IngestLog
+
+ALIAS_FILE = "aliases.json"
+
+
+class VersionedIndex:
+    """별칭(alias) → 실제 컬렉션 이름 포인터로 관리하는 인덱스
+
+    - 새 버전은 '<alias>-v<타임스탬프>' 컬렉션으로 만들고, 다 채운 뒤 별칭 파일을 os.replace로 교체
+    - 이전 버전은 진행 중인 검색이 끝나고 grace초가 지나면 삭제 (다른 프로세스가 별칭을 다시 읽을 시간)
+    - 별칭 파일이 없으면 기존 이름(alias) 컬렉션을 그대로 현재 버전으로 사용
+    - 시작할 때 적재 로그를 확인해서 중단된 빌드를 마저 끝내고 교체하거나 되돌림
+    """
+
+    def __init__(self, client, alias, path, grace=5.0):
+        self.client = client
+        self.alias = alias
+        self.alias_path = os.path.join(path, ALIAS_FILE)
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._retiring = set()
+        self._alias_mtime = None
+        self.current_name = None
+        self._current = None
+        self.log = IngestLog(os.path.join(path, LOG_FILE))
+        self._load_alias()
+        self.recovered = self.recover()
+
+    # ----- 별칭 파일 -----
+
+    def _read_aliases(self):
+        try:
+            with open(self.alias_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_alias(self, name):
+        aliases = self._read_aliases()
+        aliases[self.alias] = name
+        tmp_path = f"{self.alias_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(aliases, file, ensure_ascii=False, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.alias_path)
+        self._alias_mtime = os.stat(self.alias_path).st_mtime_ns
+
+    def _alias_file_mtime(self):
+        try:
+            return os.stat(self.alias_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_alias(self):
+        name = self._read_aliases().get(self.alias)
+        if name is None:
+            collection = self.client.get_or_create_collection(self.alias)
+            name = self.alias
+        else:
+            collection = self.client.get_collection(name)
+        with self._lock:
+            self.current_name = name
+            self._current = collection
+            self._alias_mtime = self._alias_file_mtime()
+
+    def refresh(self):
+        """다른 프로세스가 별칭을 바꿨으면 새 버전으로 전환"""
+        mtime = self._alias_file_mtime()
+        if mtime is not None and mtime != self._alias_mtime:
+            name = self._read_aliases().get(self.alias)
+            if name and name != self.current_name:
+                collection = self.client.get_collection(name)
+                with self._lock:
+                    self.current_name = name
+                    self._current = collection
+            self._alias_mtime = mtime
+
+    # ----- 검색 -----
+
+    @contextmanager
+    def reading(self):
+        """현재 버전 컬렉션을 빌려서 사용 (사용 중에는 삭제되지 않음)"""
+        self.refresh()
+        with self._lock:
+            name, collection = self.current_name, self._current
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+        try:
+            yield collection
+        finally:
+            with self._lock:
+                self._in_flight[name] -= 1
+                idle_retiring = name in self._retiring and self._in_flight[name] == 0
+            if idle_retiring:
+                self._schedule_retire(name)
+
+    def count(self):
+        with self.reading() as collection:
+            return collection.count()
+
+    # ----- 빌드 / 교체 -----
+
+    def build(self, documents, ids, metadatas=None, batch_size=1000, on_batch=None, embeddings=None):
+        """새 이름의 컬렉션을 다 채운 뒤 별칭 교체, 새 버전 이름 반환 (실패하면 기존 버전 유지)
+
+        on_batch(추가된 개수)는 배치마다 호출되며, 예외를 던지면 (예: 취소) 빌드를 중단합니다.
+        embeddings를 주면 컬렉션 임베딩 함수로 documents를 임베딩하지 않고 그대로 사용합니다.
+        """
+        name = f"{self.alias}-v{time.time_ns() // 1_000_000}"
+        collection = self.client.create_collection(name)
+        try:
+            self.log.write(collection, 'add', ids, documents, metadatas, batch_size=batch_size,
+                           on_batch=on_batch, before_commit=lambda: self.swap(name, collection),
+                           embeddings=embeddings)
+        except Exception:
+            # 별칭 교체 뒤 commit 기록만 실패했으면 이미 현재 버전이므로 지우지 않음 (다음 recover가 마저 기록)
+            with self._lock:
+                current = self.current_name == name
+            if not current:
+                self.client.delete_collection(name)
+            raise
+        return name
+
+    def _owns(self, name):
+        return name.startswith(f"{self.alias}-v")
+
+    @staticmethod
+    def _built_at(name):
+        version = name.rsplit('-v', 1)[-1]
+        return int(version) if version.isdigit() else 0
+
+    def recover(self):
+        """중단된 빌드 복구: 모든 배치가 기록됐으면 마저 적용 후 (더 새 버전이면) 교체, 아니면 삭제"""
+        def finish(begin, collection):
+            if self._built_at(collection.name) > self._built_at(self.current_name):
+                self.swap(collection.name, collection)
+
+        results = self.log.recover(self.client, on_finished=finish,
+                                   match=lambda begin: self._owns(begin['collection']))
+        for _, name, action, _ in results:
+            if action == 'rolled_back' and name != self.current_name:
+                try:
+                    self.client.delete_collection(name)
+                except Exception:
+                    pass
+        return results
+
+    def build_async(self, documents, ids, metadatas=None, on_done=None):
+        """백그라운드 스레드에서 빌드 (검색은 그동안 기존 버전으로 계속 처리)"""
+        def run():
+            error = None
+            try:
+                self.build(documents, ids, metadatas)
+            except Exception as e:
+                error = e
+            if on_done:
+                on_done(error)
+
+        thread = threading.Thread(target=run, name=f'index-build-{self.alias}', daemon=True)
+        thread.start()
+        return thread
+
+    def swap(self, name, collection):
+        """별칭을 새 버전으로 교체하고 이전 버전은 은퇴 예약"""
+        with self._lock:
+            old = self.current_name
+            self.current_name = name
+            self._current = collection
+            self._write_alias(name)
+            if old and old != name:
+                self._retiring.add(old)
+        if old and old != name:
+            self._schedule_retire(old)
+
+    def _schedule_retire(self, name):
+        timer = threading.Timer(self.grace, self._try_retire, args=(name,))
+        timer.daemon = True
+        timer.start()
+
+    def _try_retire(self, name):
+        with self._lock:
+            if name not in self._retiring or name == self.current_name:
+                self._retiring.discard(name)
+                return
+            if self._in_flight.get(name, 0) > 0:
+                return  # 마지막 검색이 끝날 때 다시 예약됨
+            self._retiring.discard(name)
+            self._in_flight.pop(name, None)
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            pass  # 다른 프로세스가 이미 삭제
+
+    def versions(self):
+        """이 별칭에 속한 컬렉션 이름 목록 (현재 버전 포함)"""
+        names = [collection.name for collection in self.client.list_collections()]
+        return sorted(name for name in names if name == self.alias or name.startswith(f"{self.alias}-v"))
+
+    def cleanup(self):
+        """중단된 빌드 등으로 남은 이전 버전 삭제 (현재 버전과 은퇴 대기 중인 버전 제외)"""
+        removed = []
+        for name in self.versions():
+            if name != self.current_name and name not in self._retiring:
+                try:
+                    self.client.delete_collection(name)
+                    removed.append(name)
+                except Exception:
+                    pass
+        return removed